@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+"""Helpers shared by the benchmarks."""
+
+import random
+import string
+
+LETTERS = string.ascii_lowercase + 'éèàç'
+
+
+def random_rows(n, cols_nb, max_words=1):
+    """
+    Return n rows of cols_nb cells, looking like vocabulary: each cell holds
+    from 1 to max_words words, separated by commas.
+    """
+    def word():
+        return ''.join(random.choices(LETTERS, k=random.randint(3, 12)))
+
+    def cell():
+        if max_words == 1:
+            return word()
+        return ', '.join(word() for _ in range(random.randint(1, max_words)))
+    return [tuple(cell() for _ in range(cols_nb)) for _ in range(n)]
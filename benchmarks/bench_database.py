@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+"""
+Time the main database operations on synthetic tables of growing sizes, and
+compare the results with a previous run to spot regressions.
+
+Run from the project's root directory:
+python -m benchmarks.bench_database --output results.json
+python -m benchmarks.bench_database --compare results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+from collections import deque
+
+from memini.core import database, shared, sweepstakes
+from memini.core.env import __version__
+from memini.core.prefs import DEFAULT_Q_NB
+
+from benchmarks._util import random_rows
+
+COLS = ['Word', 'Translation', 'Notes']
+# Operations' names, in the order they are run
+OPERATIONS = ['insert_rows', 'get_table', 'draw_rows',
+              'draw_rows_oldest_prevail', 'sort_table', 'copy_table',
+              'snapshot_table', 'draw_rows_snapshot',
+              'merge_tables', 'merge_50_tables', 'remove_rows',
+              'export_table']
+# Tables merged at once by merge_50_tables (they share the rows of a table)
+PARTS = [f'part{i}' for i in range(50)]
+
+
+def _operations(n, rows):
+    """
+    Return the operations to time on tables of n rows, as {name: function}.
+    rows are the rows inserted by insert_rows.
+    """
+    middle = n // 2
+    return {
+        'insert_rows': lambda: (database.create_table('inserted', COLS),
+                                database.insert_rows('inserted', rows)),
+        'get_table': lambda: database.get_table('bench'),
+        'draw_rows': lambda: database.draw_rows('bench', DEFAULT_Q_NB),
+        'draw_rows_oldest_prevail': lambda: database.draw_rows(
+            'bench', DEFAULT_Q_NB, oldest_prevail=True),
+        'sort_table': lambda: database.sort_table('bench', 2),
+        'copy_table': lambda: database.copy_table('bench', 'copied'),
+        'snapshot_table': lambda: database.snapshot_table('bench', 'copied'),
+        # The first change of a snapshot copies the table
+        'draw_rows_snapshot': lambda: (
+            database.snapshot_table('bench', 'copied'),
+            database.draw_rows('copied', DEFAULT_Q_NB)),
+        'merge_tables': lambda: database.merge_tables('other', 'bench'),
+        'merge_50_tables': lambda: database.merge_tables(PARTS, 'bench'),
+        'remove_rows': lambda: database.remove_rows(
+            'bench', f'{middle}-{middle + min(99, n - middle)}'),
+        'export_table': lambda: deque(database.export_table(
+            'bench', ' : '.join(f'<{c}>' for c in COLS)), maxlen=0)
+    }
+
+
+def _measure(db, function, repeat):
+    """
+    Return the best time taken by function, each run being rolled back so
+    that all of them start from the same tables.
+    """
+    best = None
+    for _ in range(repeat):
+        db.execute('SAVEPOINT bench;')
+        start = time.perf_counter()
+        function()
+        duration = time.perf_counter() - start
+        db.execute('ROLLBACK TO SAVEPOINT bench;')
+        db.execute('RELEASE SAVEPOINT bench;')
+        database.clear_caches()
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def run(sizes, repeat, operations=None):
+    """
+    Return the measures, as a list of {"operation", "rows", "seconds"}
+    dicts, for each number of rows in sizes.
+    """
+    if operations is None:
+        operations = OPERATIONS
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Do not fill the user's sweepstakes with the drawn rows
+        sweepstakes.USER_SWEEPSTAKES_PATH = os.path.join(tmpdir, 'sw')
+        for n in sizes:
+            path = os.path.join(tmpdir, f'bench_{n}.db')
+            with database.Manager(path) as db, shared.using(db):
+                rows = random_rows(n, len(COLS))
+                database.create_table('bench', COLS, content=rows)
+                database.create_table('other', COLS,
+                                      content=random_rows(n, len(COLS)))
+                part_rows_nb = max(n // len(PARTS), 1)
+                for part in PARTS:
+                    database.create_table(
+                        part, COLS,
+                        content=random_rows(part_rows_nb, len(COLS)))
+                db.connection.commit()
+                funcs = _operations(n, rows)
+                for name in operations:
+                    results.append({'operation': name, 'rows': n,
+                                    'seconds': _measure(db, funcs[name],
+                                                        repeat)})
+            os.remove(path)
+    return results
+
+
+def compare(results, baseline, threshold, min_ms):
+    """
+    Return the results along with the matching baseline's times and ratios,
+    and whether they are regressions: slower than the baseline by more than
+    threshold (a ratio) and by at least min_ms milliseconds.
+    """
+    previous = {(r['operation'], r['rows']): r['seconds']
+                for r in baseline['results']}
+    compared = []
+    for r in results:
+        old = previous.get((r['operation'], r['rows']))
+        ratio = None if not old else r['seconds'] / old
+        regression = ratio is not None and ratio > threshold \
+            and (r['seconds'] - old) * 1000 >= min_ms
+        compared.append(dict(r, baseline=old, ratio=ratio,
+                             regression=regression))
+    return compared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000, 1000000],
+                        help='numbers of rows of the tables')
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS,
+                        default=OPERATIONS, help='operations to time')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of measures (the best one is kept)')
+    parser.add_argument('--output', default=None,
+                        help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, metavar='BASELINE',
+                        help='compare with the results of a previous run '
+                        '(a JSON file written with --output), and exit with '
+                        'an error if there are regressions')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='ratio to the baseline above which a result is '
+                        'a regression')
+    parser.add_argument('--min-ms', type=float, default=1,
+                        help='slowdowns shorter than this are not '
+                        'regressions (noise)')
+    args = parser.parse_args()
+    random.seed(0)
+    results = run(args.sizes, args.repeat, operations=args.operations)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'memini': __version__,
+                       'python': platform.python_version(),
+                       'sqlite': sqlite3.sqlite_version,
+                       'repeat': args.repeat,
+                       'results': results}, f, indent=2)
+            f.write('\n')
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        results = compare(results, baseline, args.threshold, args.min_ms)
+    print(f'{"operation":<24} | {"rows":>7} | {"time":>11}'
+          + (f' | {"baseline":>11} | {"ratio":>5}' if baseline else ''))
+    for r in results:
+        line = f'{r["operation"]:<24} | {r["rows"]:>7} | '\
+            f'{r["seconds"] * 1000:>8.2f} ms'
+        if baseline and r['baseline'] is not None:
+            line += f' | {r["baseline"] * 1000:>8.2f} ms | '\
+                f'{r["ratio"]:>5.2f}'
+            if r['regression']:
+                line += '  REGRESSION'
+        print(line)
+    if baseline and any(r['regression'] for r in results):
+        sys.exit(f'Regressions found (more than {args.threshold:.2f} times '
+                 f'slower than {args.compare})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+"""
+Measure how fast documents are generated, end to end, and how much memory
+it takes, for the test templates and synthetic large ones, and compare the
+results with a previous run.
+
+Each template is benchmarked in two modes: "single" generates one document
+with a cold templates' cache (like a memini generate command) and "batch"
+generates several documents in a row, in the same process (like memini
+batch, shell or serve).
+
+Run from the project's root directory:
+python -m benchmarks.bench_generate --output results.json
+python -m benchmarks.bench_generate --compare results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+from memini.core import database, document, profiling, shared, sweepstakes
+from memini.core import template
+from memini.core.env import __version__, TESTS_DATADIR
+
+from benchmarks._util import random_rows
+
+TEMPLATES = ['template1', 'template3', 'template4']
+ROWS_NB = 1000  # Rows of the tables the questions are drawn from
+# Measures compared with the baseline's ones
+MEASURES = ['ms_per_doc', 'tracemalloc_peak_kb']
+
+
+def _large_template(src, dest, paragraphs):
+    """
+    Copy the template src as dest, adding it paragraphs of static text, to
+    make it bigger.
+    """
+    text = ''.join(f'<text:p text:style-name="Standard">{i}. '
+                   f'{" ".join(["lorem ipsum dolor sit amet"] * 4)}</text:p>'
+                   for i in range(paragraphs))
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dest, 'w') as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename)
+            if item.filename == 'content.xml':
+                data = data.replace(b'</office:text>',
+                                    text.encode() + b'</office:text>')
+            zout.writestr(item, data)
+
+
+def _peak_rss_kb():
+    """Return the peak resident memory of the process, in kB, if known."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _reset_peak_rss():
+    """Reset the peak resident memory, where possible (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _generate(table_name, tpl, nb, output, documents, cold):
+    """Generate documents documents, emptying the templates' cache first."""
+    for _ in range(documents):
+        if cold:
+            document._templates.clear()
+        document.generate(table_name, nb=nb, output=output, force=True,
+                          tpl=tpl, edit_after=False)
+
+
+def _measure(table_name, tpl, nb, output, documents, cold, repeat):
+    """
+    Return the best time taken to generate the documents, the mean time
+    per document of each stage during that run, and the peak memory used.
+    """
+    best = None
+    for _ in range(repeat):
+        with profiling.recording() as records:
+            start = time.perf_counter()
+            _generate(table_name, tpl, nb, output, documents, cold)
+            duration = time.perf_counter() - start
+        if best is None or duration < best[0]:
+            best = (duration, list(records))
+    records = best[1]
+    stages = {}
+    for name, _, seconds in records:
+        stages[name] = stages.get(name, 0) + seconds * 1000 / documents
+    # Stages that contain other ones (their time is partly the others')
+    parents = {records[i][0] for i in range(len(records) - 1)
+               if records[i + 1][1] > records[i][1]}
+    # Memory is measured apart, as tracemalloc slows everything down
+    if not cold:
+        _generate(table_name, tpl, nb, output, 1, cold=False)
+    _reset_peak_rss()
+    tracemalloc.start()
+    _generate(table_name, tpl, nb, output, documents, cold)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best[0], 'docs_per_s': documents / best[0],
+            'ms_per_doc': best[0] * 1000 / documents,
+            'stages_ms': {name: round(ms, 3) for name, ms in stages.items()},
+            'inner_stages': sorted(set(stages) - parents),
+            'tracemalloc_peak_kb': peak // 1024,
+            'rss_peak_kb': _peak_rss_kb()}
+
+
+def run(questions, batch, repeat, large):
+    """
+    Return the measures, for each template (test ones, plus large ones made
+    of paragraphs' numbers in large), number of questions and mode.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Keep the user's directories out of it
+        template.USER_TEMPLATES_PATH = os.path.join(tmpdir, 'templates')
+        sweepstakes.USER_SWEEPSTAKES_PATH = os.path.join(tmpdir, 'sw')
+        os.makedirs(template.USER_TEMPLATES_PATH)
+        templates = []
+        for name in TEMPLATES:
+            shutil.copy(os.path.join(TESTS_DATADIR, f'{name}.odt'),
+                        template.path(name))
+            templates.append(name)
+        for paragraphs in large:
+            name = f'template1_large{paragraphs}'
+            _large_template(template.path('template1'), template.path(name),
+                            paragraphs)
+            templates.append(name)
+        output = os.path.join(tmpdir, 'output.odt')
+        # Keep relatorio's import (lazy, see document) out of the measures
+        import relatorio.templates.opendocument  # noqa: F401
+        with database.Manager(os.path.join(tmpdir, 'bench.db')) as db, \
+                shared.using(db):
+            for name in templates:
+                cols_nb = template.get_cols_nb(template.path(name))
+                table_name = f'table{cols_nb}'
+                if not database.table_exists(table_name):
+                    database.create_table(
+                        table_name, [f'col{i + 1}' for i in range(cols_nb)],
+                        content=random_rows(ROWS_NB, cols_nb))
+                for nb in questions:
+                    for mode, documents, cold in [('single', 1, True),
+                                                  ('batch', batch, False)]:
+                        measures = _measure(table_name, name, nb, output,
+                                            documents, cold, repeat)
+                        results.append(dict({'template': name,
+                                             'questions': nb, 'mode': mode,
+                                             'documents': documents},
+                                            **measures))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the results along with the ratios of their measures to the
+    baseline's ones, and whether they are regressions (a ratio above
+    threshold).
+    """
+    previous = {(r['template'], r['questions'], r['mode']): r
+                for r in baseline['results']}
+    compared = []
+    for r in results:
+        old = previous.get((r['template'], r['questions'], r['mode']))
+        ratios = {m: r[m] / old[m] for m in MEASURES
+                  if old is not None and old.get(m)}
+        compared.append(dict(r, ratios=ratios, regression=any(
+            ratio > threshold for ratio in ratios.values())))
+    return compared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--questions', type=int, nargs='+',
+                        default=[20, 100, 500],
+                        help='numbers of questions of the documents')
+    parser.add_argument('--batch', type=int, default=10,
+                        help='number of documents generated in batch mode')
+    parser.add_argument('--large', type=int, nargs='*', default=[500, 5000],
+                        help='numbers of paragraphs of the large templates')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of measures (the best one is kept)')
+    parser.add_argument('--output', default=None,
+                        help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, metavar='BASELINE',
+                        help='compare with the results of a previous run '
+                        '(a JSON file written with --output), and exit with '
+                        'an error if there are regressions')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='ratio to the baseline (of time or memory) '
+                        'above which a result is a regression')
+    args = parser.parse_args()
+    if max(args.questions) > ROWS_NB:
+        parser.error(f'at most {ROWS_NB} questions can be asked')
+    random.seed(0)
+    results = run(args.questions, args.batch, args.repeat, args.large)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'memini': __version__,
+                       'python': platform.python_version(),
+                       'repeat': args.repeat,
+                       'results': results}, f, indent=2)
+            f.write('\n')
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        results = compare(results, baseline, args.threshold)
+    print(f'{"template":<24} | {"q.":>4} | {"mode":<6} | {"docs/s":>7} | '
+          f'{"peak (tracemalloc)":>18} | {"peak RSS":>10} | slowest stages')
+    for r in results:
+        stages = sorted(((name, r['stages_ms'][name])
+                         for name in r['inner_stages']),
+                        key=lambda s: s[1], reverse=True)[:3]
+        rss = '-' if r['rss_peak_kb'] is None else f'{r["rss_peak_kb"]} kB'
+        line = f'{r["template"]:<24} | {r["questions"]:>4} | ' \
+            f'{r["mode"]:<6} | {r["docs_per_s"]:>7.1f} | ' \
+            f'{r["tracemalloc_peak_kb"]:>15} kB | {rss:>10} | ' \
+            + ', '.join(f'{name} {ms:.1f} ms' for name, ms in stages)
+        if baseline:
+            line += ' | ' + ', '.join(f'{m} x{ratio:.2f}'
+                                      for m, ratio in r['ratios'].items())
+            if r['regression']:
+                line += '  REGRESSION'
+        print(line)
+    if baseline and any(r['regression'] for r in results):
+        sys.exit(f'Regressions found (more than {args.threshold:.2f} times '
+                 f'the time or memory of {args.compare})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+"""
+Measure the parser's throughput (lines/s and MB/s) on generated corpora,
+for each way of parsing a file: "reference" (the regex rebuilt for each
+line by parse_line()), "regex" (parse_file() with the compiled regex) and
+"fast" (parse_file() splitting lines with str.find() when it can).
+
+Run from the project's root directory:
+python -m benchmarks.bench_parser
+The corpora can also be written to files, e.g. to test other tools:
+python -m benchmarks.bench_parser --write-corpora DIRECTORY
+"""
+
+import os
+import random
+import timeit
+import argparse
+import tempfile
+
+from memini.core.prefs import ENCODING
+from memini.core.parser import parse_file, parse_line
+from memini.core.errors import LineDoesNotMatchError
+
+LATIN = 'abcdefghilmnopqrstuvx'
+ACCENTED = 'àâçéèêëîïôùûüœæ'
+CYRILLIC = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+GREEK = 'αβγδεζηθικλμνξοπρστυφχψω'
+CJK = '的一是不了人我在有他这中大来上个国到说们为子和你地出道也时年'
+
+
+def _words(rnd, letters, nb, length=(2, 10)):
+    return ' '.join(''.join(rnd.choices(letters, k=rnd.randint(*length)))
+                    for _ in range(nb))
+
+
+# name: (pattern, function returning one line of the corpus)
+CORPORA = {
+    'latin': ('<Latin> : <Français>',
+              lambda rnd: f'{_words(rnd, LATIN, 3)}, is, ere : '
+              f'{_words(rnd, LATIN + ACCENTED, rnd.randint(1, 4))}'),
+    'unicode': ('<Mot> — <Слово> — <詞>',
+                lambda rnd: f'{_words(rnd, ACCENTED + LATIN, 2)} — '
+                f'{_words(rnd, CYRILLIC + GREEK, 2)} — '
+                f'{_words(rnd, CJK, 1, (1, 4))}'),
+    'four_columns': ('<a> / <b> / <c> / <d>',
+                     lambda rnd: ' / '.join(_words(rnd, LATIN, 2)
+                                            for _ in range(4))),
+    'long_lines': ('<Question> ; <Answer>',
+                   lambda rnd: f'{_words(rnd, LATIN + ACCENTED, 150)} ; '
+                   f'{_words(rnd, LATIN + CYRILLIC, 150)}'),
+    # Half the lines lack the separator
+    'errors': ('<Latin> : <Français>',
+               lambda rnd: f'{_words(rnd, LATIN, 3)}'
+               f'{rnd.choice([" : ", " "])}{_words(rnd, LATIN, 2)}'),
+    # A regex character in the separator: no fast path
+    'regex_separator': ('<Latin>.<Français>',
+                        lambda rnd: f'{_words(rnd, LATIN, 3)}.'
+                        f'{_words(rnd, LATIN, 2)}'),
+}
+
+
+def write_corpus(path, name, lines_nb, seed=0):
+    """Write lines_nb lines of the corpus name to path."""
+    rnd = random.Random(seed)
+    line = CORPORA[name][1]
+    with open(path, 'w', encoding=ENCODING) as f:
+        for i in range(lines_nb):
+            f.write(line(rnd) + '\n')
+            if i % 50 == 49:
+                f.write('\n')
+
+
+def _parse_file_reference(filename, pattern):
+    """parse_file(), as it was before being given a compiled parser."""
+    result = []
+    nomatch = []
+    with open(filename, encoding=ENCODING) as f:
+        for line in f.readlines():
+            if line.strip():
+                try:
+                    to_add = parse_line(pattern, line.strip())
+                except LineDoesNotMatchError:
+                    nomatch.append(line.strip())
+                else:
+                    result.append(to_add)
+    return (result, nomatch)
+
+
+PATHS = {
+    'reference': _parse_file_reference,
+    'regex': lambda filename, pattern: parse_file(filename, pattern,
+                                                  fast=False),
+    'fast': parse_file,
+}
+
+
+def run(corpora, lines_nb, repeat):
+    """
+    Return the measures for each corpus and path, after checking all paths
+    parse the corpus the same way.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in corpora:
+            pattern = CORPORA[name][0]
+            path = os.path.join(tmpdir, f'{name}.txt')
+            write_corpus(path, name, lines_nb)
+            size = os.path.getsize(path)
+            expected = _parse_file_reference(path, pattern)
+            for path_name, parse in PATHS.items():
+                if parse(path, pattern) != expected:
+                    raise AssertionError(f'{path_name} parses {name} '
+                                         f'differently')
+                seconds = min(timeit.repeat(lambda: parse(path, pattern),
+                                            number=1, repeat=repeat))
+                results.append({'corpus': name, 'path': path_name,
+                                'lines': lines_nb, 'bytes': size,
+                                'errors': len(expected[1]),
+                                'seconds': seconds,
+                                'lines_per_s': lines_nb / seconds,
+                                'mb_per_s': size / seconds / 1e6})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--corpora', nargs='+', choices=list(CORPORA),
+                        default=list(CORPORA), help='corpora to parse')
+    parser.add_argument('--lines', type=int, default=20000,
+                        help='number of lines of each corpus')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of measures (the best one is kept)')
+    parser.add_argument('--write-corpora', metavar='DIRECTORY', default=None,
+                        help='only write the corpora to DIRECTORY')
+    args = parser.parse_args()
+    if args.write_corpora is not None:
+        os.makedirs(args.write_corpora, exist_ok=True)
+        for name in args.corpora:
+            write_corpus(os.path.join(args.write_corpora, f'{name}.txt'),
+                         name, args.lines)
+            print(f'{name}.txt: {CORPORA[name][0]}')
+        return
+    print(f'{"corpus":<16} | {"path":<9} | {"errors":>6} | '
+          f'{"lines/s":>10} | {"MB/s":>6}')
+    for r in run(args.corpora, args.lines, args.repeat):
+        print(f'{r["corpus"]:<16} | {r["path"]:<9} | {r["errors"]:>6} | '
+              f'{r["lines_per_s"]:>10.0f} | {r["mb_per_s"]:>6.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+"""
+Measure the time spent importing memini, as the memini command does before
+running any subcommand, using python's -X importtime option.
+
+Run from the project's root directory:
+python -m benchmarks.bench_startup
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+ROOTDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module='memini'):
+    """
+    Import module in a fresh interpreter and return the import times (in
+    µs) of all imported modules, as a {name: (self µs, cumulative µs)} dict.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOTDIR)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             f'import {module}'],
+                            env=env, capture_output=True, text=True,
+                            check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_), int(cumulative))
+    return times
+
+
+def run(repeat, top):
+    """
+    Return the best total import time of memini and the top modules taking
+    the most time by themselves (as sorted (name, µs) tuples) in this run.
+    """
+    best = None
+    for _ in range(repeat):
+        times = import_times()
+        if best is None or times['memini'][1] < best['memini'][1]:
+            best = times
+    slowest = sorted(((name, t[0]) for name, t in best.items()),
+                     key=lambda item: item[1], reverse=True)[:top]
+    return best['memini'][1], slowest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='number of measures (the best one is kept)')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of slowest imports to display')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='exit with an error if importing memini takes '
+                        'longer than this')
+    args = parser.parse_args()
+    total, slowest = run(args.repeat, args.top)
+    print(f'import memini: {total / 1000:.1f} ms')
+    for name, t in slowest:
+        print(f'{t / 1000:>9.1f} ms  {name}')
+    if args.max_ms is not None and total / 1000 > args.max_ms:
+        sys.exit(f'Importing memini took more than {args.max_ms} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+"""
+Compare the size and the loading time of sweepstakes stored in the legacy
+format (indented, index-keyed JSON dicts) and in the compact one.
+
+Run from the project's root directory:
+python -m benchmarks.bench_sweepstakes
+"""
+
+import os
+import json
+import random
+import timeit
+import argparse
+import tempfile
+
+from memini.core.sweepstakes import _serialize, _deserialize
+from memini.core.sweepstakes import _deserialize_legacy
+
+from benchmarks._util import random_rows
+
+
+def _write_legacy(path, table_name, rows):
+    data = {i: list(row) for i, row in enumerate([(table_name, )] + rows)}
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+        f.write('\n')
+
+
+def _load_legacy(path):
+    with open(path, 'r') as f:
+        return _deserialize_legacy(json.load(f))
+
+
+def _write_compact(path, table_name, rows):
+    with open(path, 'wb') as f:
+        f.write(_serialize(table_name, rows))
+
+
+def _load_compact(path):
+    with open(path, 'rb') as f:
+        return _deserialize(f.read())
+
+
+def run(sizes, repeat):
+    """Return the measures, for each number of rows in sizes."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        legacy = os.path.join(tmpdir, 'legacy.json')
+        compact = os.path.join(tmpdir, 'compact.json.gz')
+        for n in sizes:
+            rows = random_rows(n, 3, max_words=3)
+            _write_legacy(legacy, 'table', rows)
+            _write_compact(compact, 'table', rows)
+            assert _load_legacy(legacy) == _load_compact(compact)
+            results.append({
+                'rows': n,
+                'legacy_bytes': os.path.getsize(legacy),
+                'compact_bytes': os.path.getsize(compact),
+                'legacy_load_s': min(timeit.repeat(
+                    lambda: _load_legacy(legacy), number=1, repeat=repeat)),
+                'compact_load_s': min(timeit.repeat(
+                    lambda: _load_compact(compact), number=1, repeat=repeat))
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[20, 100, 1000, 10000],
+                        help='numbers of drawn rows to benchmark')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='number of measures (the best one is kept)')
+    args = parser.parse_args()
+    random.seed(0)
+    print(f'{"rows":>7} | {"legacy size":>11} | {"compact size":>12} | '
+          f'{"legacy load":>11} | {"compact load":>12}')
+    for r in run(args.sizes, args.repeat):
+        print(f'{r["rows"]:>7} | {r["legacy_bytes"]:>11} | '
+              f'{r["compact_bytes"]:>12} | '
+              f'{r["legacy_load_s"] * 1000:>8.3f} ms | '
+              f'{r["compact_load_s"] * 1000:>9.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
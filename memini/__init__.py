@@ -19,16 +19,20 @@
 # along with Memini; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import sys
+from contextlib import contextmanager
+
 import click
-import blessed
 
-from memini.core.prefs import DEFAULT_Q_NB
+from memini.core.prefs import DEFAULT_Q_NB, SERVER_PORT, SERVER_RENDER_WORKERS
+from memini.core.prefs import SERVER_DB_CONNECTIONS, SEARCH_LIMIT
 from memini.core.env import USER_DB_PATH, __version__, PROG_NAME, MESSAGE
 from memini.core.env import MAXCOL_NB
 from memini.core.errors import MeminiError, CommandCancelledError
 from memini.core import shared
 from memini.core import database
 from memini.core import commands
+from memini.core import sqltrace
 
 
 shared.init()
@@ -37,32 +41,76 @@ __all__ = ['run']
 
 
 def echo_info(s):
+    import blessed
     term = blessed.Terminal()
     click.echo(term.lightskyblue('Info: ') + str(s))
 
 
 def echo_warning(s):
+    import blessed
     term = blessed.Terminal()
     click.echo(term.darkorange('Warning: ') + str(s))
 
 
 def echo_error(s):
+    import blessed
     term = blessed.Terminal()
     click.echo(term.color_rgb(197, 0, 11) + 'Error: ' + term.normal + str(s))
-    exit(1)
+    sys.exit(1)
 
 
 @click.group()
 @click.version_option(version=__version__, prog_name=PROG_NAME,
                       message=MESSAGE)
-def run():
+@click.option('--profile', is_flag=True, default=False,
+              help='print how long the main stages of the command took')
+@click.option('--profile-output', type=click.Path(dir_okay=False),
+              default=None,
+              help='also save cProfile statistics of the command to this '
+              'file (implies --profile)')
+@click.option('--trace-sql', is_flag=True, default=False,
+              help='record the SQL statements run by the command (see '
+              'debug sql)')
+@click.pass_context
+def run(ctx, profile, profile_output, trace_sql):
     """Manage vocabulary tables and generate training or test sheets."""
+    if profile or profile_output is not None:
+        from memini.core import profiling
+        ctx.call_on_close(profiling.start(dump_path=profile_output))
+    # Inside the shell (or a batch), --trace-sql applies to all commands
+    if trace_sql or sqltrace.enabled():
+        sqltrace.enable(ctx.invoked_subcommand)
+    if trace_sql:
+        ctx.call_on_close(sqltrace.disable)
+
+
+@contextmanager
+def _db():
+    """
+    Make the database available to the commands: open the user's database,
+    or reuse the connection kept open by the shell (or batch).
+    """
+    if shared.shell:
+        try:
+            yield shared.get_db()
+        except BaseException:
+            # Reported errors exit through SystemExit. The batch rolls back
+            # the failed command itself.
+            if not shared.batch:
+                shared.get_db().connection.rollback()
+                database.clear_caches()
+            raise
+        else:
+            if not shared.batch:
+                shared.get_db().connection.commit()
+    else:
+        with database.Manager(USER_DB_PATH) as db, shared.using(db):
+            yield db
 
 
 def _cmd(cmd, *args, do_click_echo=echo_error):
     """Generic command"""
-    with database.Manager(USER_DB_PATH) as db:
-        shared.db = db
+    with _db():
         try:
             cmd(*args)
         except MeminiError as e:
@@ -70,15 +118,17 @@ def _cmd(cmd, *args, do_click_echo=echo_error):
 
 
 @run.command('list')
+@click.option('-s', '--sizes', is_flag=True, default=False,
+              help='also show the numbers of rows of the tables')
 @click.argument('what')
-def list_(what):
+def list_(what, sizes):
     """
     List known tables, templates or sweepstakes.
 
     List known tables, templates or sweepstakes. What to list exactly is set
     by argument WHAT (that may be "tables", "templates" or "sweepstakes").
     """
-    _cmd(commands.list_, what)
+    _cmd(commands.list_, what, sizes)
 
 
 @run.command('parse')
@@ -126,6 +176,20 @@ def remove(name, span):
     _cmd(commands.remove, name, span)
 
 
+@run.command('forgot')
+@click.argument('name')
+@click.argument('span')
+def forgot(name, span):
+    """
+    Mark rows of a table as forgotten.
+
+    Mark rows from the table NAME as forgotten, so that they will be due at
+    next review (see option --review of command generate). SPAN is the list
+    of lines' numbers, like in command remove.
+    """
+    _cmd(commands.forgot, name, span)
+
+
 @run.command('create')
 @click.argument('name')
 @click.argument('filename', type=click.Path())
@@ -154,18 +218,67 @@ def add(name, filename, pattern):
     _cmd(commands.add, name, filename, pattern)
 
 
+@run.command('export')
+@click.argument('name')
+@click.argument('pattern')
+@click.argument('filename', required=False, type=click.Path(dir_okay=False))
+@click.option('-f', '--force', default=False, is_flag=True, show_default=True,
+              help='overwrite already existing file without asking')
+def export(name, pattern, filename, force):
+    """
+    Write a table's rows to a text file.
+
+    Write the rows of the table NAME to file FILENAME (or to the standard
+    output if FILENAME is missing), one line per row, formatted according
+    to the provided PATTERN.
+    """
+    with _db():
+        try:
+            commands.export(name, pattern, filename, force=force)
+        except CommandCancelledError as e:
+            echo_info(str(e))
+        except MeminiError as e:
+            echo_error(str(e))
+
+
 @run.command('show')
 @click.argument('name')
 @click.option('-s', '--sort', default=0, show_default=True,
               type=click.IntRange(0, MAXCOL_NB),
               help='sort output according to column')
-def show(name, sort):
+@click.option('-l', '--limit', default=None, type=click.IntRange(0, None),
+              help='maximum number of rows to show')
+@click.option('-o', '--offset', default=None, type=click.IntRange(0, None),
+              help='number of rows to skip')
+@click.option('--pager/--no-pager', default=None,
+              help='use a pager to display the rows  [default: only if they '
+              'do not fit in the terminal]')
+@click.option('-w', '--where', multiple=True,
+              help='only show rows matching the condition (may be repeated)')
+@click.option('-c', '--cols', default=None,
+              help='comma separated list of the columns to show')
+@click.option('--collate', default=None,
+              type=click.Choice(['binary', 'nocase', 'unicode']),
+              help='how to compare texts when sorting')
+def show(name, sort, limit, offset, pager, where, cols, collate):
     """
     Show content of a table.
 
     Display content of table NAME in standard output.
+
+    A condition (option --where) is written COLUMN=TEXT (the cell is exactly
+    TEXT), COLUMN~TEXT (the cell contains TEXT) or COLUMN=~REGEX (the cell
+    matches the regular expression REGEX). Columns are given by their titles
+    or numbers.
+
+    The --collate option tells how texts are compared when sorting: binary
+    (default, character by character), nocase (ignoring case of latin
+    letters) or unicode (ignoring case and accents).
     """
-    _cmd(commands.show, name, int(sort))
+    if cols is not None:
+        cols = [c.strip() for c in cols.split(',')]
+    _cmd(commands.show, name, int(sort), limit, offset, pager,
+         list(where) or None, cols, collate)
 
 
 @run.command('sort')
@@ -181,6 +294,50 @@ def sort(name, col_nb):
     _cmd(commands.sort, name, int(col_nb))
 
 
+@run.command('search')
+@click.argument('term')
+@click.option('-t', '--table', 'tables', multiple=True,
+              help='only search this table (may be used several times)')
+@click.option('-l', '--limit', default=SEARCH_LIMIT, type=click.IntRange(1),
+              show_default=True, help='maximum number of rows to show')
+@click.option('--rebuild', is_flag=True, default=False,
+              help='rebuild the search index first')
+def search(term, tables, limit, rebuild):
+    """
+    Search all tables for words.
+
+    Show the rows, of all tables, that contain words starting like each word
+    of TERM, ignoring case and accents: for instance, "amb" finds
+    "ambitio, onis, f." and "ete" finds "été". The best matches are shown
+    first.
+
+    The search index is built the first time, and then kept up to date. Use
+    --rebuild if the database has been changed by other programs.
+    """
+    _cmd(commands.search, term, list(tables), limit, rebuild)
+
+
+@run.command('similar')
+@click.argument('term', required=False)
+@click.option('-t', '--table', 'tables', multiple=True,
+              help='only search this table (may be used several times)')
+@click.option('-l', '--limit', default=SEARCH_LIMIT, type=click.IntRange(1),
+              show_default=True, help='maximum number of rows to show')
+@click.option('--rebuild', is_flag=True, default=False,
+              help='rebuild the search index first')
+def similar(term, tables, limit, rebuild):
+    """
+    Search all tables for similar words or rows.
+
+    Show the rows, of all tables, containing cells or words that look like
+    TERM, even if one of them is mistyped, ignoring case: for instance,
+    "amictia" finds "amicitia, ae, f.". The most similar are shown first.
+
+    Without TERM, show the pairs of rows that look alike (near duplicates).
+    """
+    _cmd(commands.similar, term, list(tables), limit, rebuild)
+
+
 @run.command('update')
 @click.argument('name')
 @click.argument('row')
@@ -210,6 +367,22 @@ def dump(sw_id):
     _cmd(commands.dump, sw_id)
 
 
+@run.command('history')
+@click.argument('name', required=False)
+@click.option('-l', '--last', default=None, type=click.IntRange(1, None),
+              help='only take the last draws into account')
+def history(name, last):
+    """
+    Show statistics about the draws.
+
+    Without argument, show for each table how many of its rows have been
+    drawn at least once (coverage), how many draws have been done and when
+    the last one occurred. If a table NAME is given, show how many times and
+    when each of its rows has last been drawn.
+    """
+    _cmd(commands.history, name, last)
+
+
 @run.command('rename')
 @click.argument('name1')
 @click.argument('name2')
@@ -274,8 +447,12 @@ def edit(name):
               help='edit document as soon as it has been generated')
 @click.option('--use-previous', is_flag=True, default=False, show_default=True,
               help='use a previous sweepstake')
+@click.option('-r', '--review', is_flag=True, default=False, show_default=True,
+              help='draw the rows that are the most due for review')
+@click.option('--oldest-first', is_flag=True, default=False,
+              show_default=True, help='draw the least recently drawn rows')
 def generate(name, questions_number, scheme, output, force, template, edit,
-             use_previous):
+             use_previous, review, oldest_first):
     """
     Generate a new document.
 
@@ -303,6 +480,15 @@ def generate(name, questions_number, scheme, output, force, template, edit,
 
     - if you have 2 columns and you wish the first one to be always blank and
     the second one always filled, then use _*1.
+
+    The --review option draws the rows that are the most due for review,
+    instead of random ones: each drawn row will be due again later and later
+    (spaced repetition), unless it is marked as forgotten (see command
+    forgot).
+
+    The --oldest-first option draws, randomly, among the rows that have not
+    been drawn yet, or, once they all have been, the least recently drawn
+    ones.
     """
     if name is None:
         if use_previous:
@@ -311,13 +497,138 @@ def generate(name, questions_number, scheme, output, force, template, edit,
             echo_error('Missing argument \'NAME\'. It is required unless '
                        'option --use-previous is turned on. '
                        'Try \'vosh generate --help\' for help.')
-    with database.Manager(USER_DB_PATH) as db:
-        shared.db = db
+    if review and oldest_first:
+        echo_error('Options --review and --oldest-first cannot be used '
+                   'together.')
+    with _db():
         try:
             commands.generate(name, nb=questions_number, scheme=scheme,
                               output=output, force=force, tpl=template,
-                              edit=edit, use_previous=use_previous)
+                              edit=edit, use_previous=use_previous,
+                              review=review, oldest_prevail=oldest_first)
         except CommandCancelledError as e:
             echo_info(str(e))
         except MeminiError as e:
             echo_error(str(e))
+
+
+@run.group()
+def debug():
+    """Find out what makes commands slow."""
+
+
+@debug.command('sql')
+@click.option('-t', '--top', default=10, type=click.IntRange(1),
+              show_default=True,
+              help='number of statements to show for each command')
+@click.option('-c', '--command', default=None,
+              help='only show the statements of this command')
+@click.option('--clear', is_flag=True, default=False,
+              help='delete the recorded statements')
+def debug_sql(top, command, clear):
+    """
+    Show the hottest SQL statements.
+
+    Show, for each command run with the --trace-sql global option (e.g.
+    memini --trace-sql show TABLE), the SQL statements that took the longest
+    in total, how many times they have been run, how many rows they returned
+    or changed and how many steps sqlite needed to run them. The query plans
+    of the slow ones are shown too. Statements that only differ by their
+    values are counted together.
+    """
+    _cmd(commands.debug_sql, top, command, clear)
+
+
+@run.command()
+def shell():
+    """
+    Run commands interactively.
+
+    Read and run commands (typed without "memini") one after the other, in
+    the same process, keeping the database open: this is faster than running
+    memini again for each command. Table names are completed when hitting
+    tab and the commands history is kept from one session to the next.
+    Type "exit", "quit" or Ctrl-D to quit.
+    """
+    if shared.shell:
+        echo_warning('The shell cannot be started from the shell or a batch.')
+        return
+    from memini.core import shell as interactive
+    with database.Manager(USER_DB_PATH) as db, shared.using(db):
+        shared.shell = True
+        try:
+            interactive.loop(run)
+        finally:
+            shared.shell = False
+
+
+@run.command()
+@click.argument('filename', type=click.File('r'))
+@click.option('--stop-on-error/--continue', default=True,
+              help='if a command fails, cancel all changes and stop, or '
+              'only cancel the failed command\'s changes and continue  '
+              '[default: stop on error]')
+def batch(filename, stop_on_error):
+    """
+    Run the commands of a file.
+
+    Run the commands of FILENAME (one per line, written like in a terminal,
+    "memini" being optional), in one process and one transaction, then print
+    how long each command took. Empty lines and lines starting with # are
+    ignored. Use "-" as FILENAME to read the commands from standard input.
+
+    By default, if a command fails, the changes of all commands are cancelled
+    and no further command is run. With --continue, only the changes of the
+    failed command are cancelled, and the next commands are run. Note that
+    templates' files and sweepstakes are not part of the transaction.
+    """
+    if shared.shell:
+        echo_warning('A batch cannot be run from the shell or a batch.')
+        return
+    from memini.core import shell as interactive
+    with database.Manager(USER_DB_PATH) as db, shared.using(db):
+        shared.shell = shared.batch = True
+        try:
+            results = interactive.batch(run, filename,
+                                        stop_on_error=stop_on_error)
+        finally:
+            shared.shell = shared.batch = False
+    click.echo(interactive.batch_summary(results,
+                                         stop_on_error=stop_on_error))
+    if not all(r[2] for r in results):
+        sys.exit(1)
+
+
+@run.command()
+@click.option('-p', '--port', default=SERVER_PORT,
+              type=click.IntRange(0, 65535), show_default=True,
+              help='port to listen to')
+@click.option('-w', '--workers', default=SERVER_RENDER_WORKERS,
+              type=click.IntRange(1), show_default=True,
+              help='maximum number of documents generated at the same time')
+@click.option('-c', '--connections', default=SERVER_DB_CONNECTIONS,
+              type=click.IntRange(1), show_default=True,
+              help='maximum number of database connections')
+def serve(port, workers, connections):
+    """
+    Serve tables and documents over HTTP.
+
+    Run a HTTP server, only reachable from this computer (127.0.0.1), that
+    answers in JSON. It lists the tables (GET /tables), shows a table
+    (GET /tables/NAME, accepting the sort, limit, offset, cols, where and
+    collate parameters of the show command), draws rows
+    (POST /tables/NAME/draw) and generates documents
+    (POST /tables/NAME/generate). The JSON body of POST requests may contain
+    nb, review and oldest_first, and also scheme and template for documents.
+    Stop it with Ctrl-C.
+    """
+    from memini.core import server
+
+    def ready(address):
+        echo_info(f'Serving on http://{address[0]}:{address[1]}/ '
+                  f'(Ctrl-C to stop)')
+    try:
+        server.serve(port=port, workers=workers, connections=connections,
+                     ready=ready)
+    except OSError as e:
+        echo_error(f'Cannot serve on port {port}: {e.strerror}')
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+"""
+Asynchronous access to Memini's tables and documents, for asyncio programs.
+
+Example:
+
+    async with Memini() as memini:
+        rows = await memini.draw_rows('table1', 5)
+        content = await memini.generate('table1', nb=10)
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from memini.core import database, document, template
+from memini.core.env import USER_DB_PATH
+from memini.core.errors import NotFoundError
+from memini.core.prefs import DEFAULT_Q_NB, SERVER_RENDER_WORKERS
+from memini.core.prefs import SERVER_DB_CONNECTIONS
+
+__all__ = ['Memini']
+
+
+class Memini:
+    """
+    Awaitable equivalents of the database and document functions.
+
+    Database functions run in dedicated threads, each one using its own
+    connection from a pool (the module-level cursor is left untouched), so
+    that reading functions run in parallel. Documents are rendered by a pool
+    of worker threads. The event loop is never blocked.
+    """
+    def __init__(self, db_path=USER_DB_PATH, workers=SERVER_RENDER_WORKERS,
+                 connections=SERVER_DB_CONNECTIONS):
+        self.db_path = db_path
+        self._pool = database.Pool(db_path, size=connections)
+        self._db_threads = ThreadPoolExecutor(
+            max_workers=connections, thread_name_prefix='memini-db')
+        self._renderers = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='memini-render')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_class, exc, traceback):
+        await self.aclose()
+
+    def _call(self, func, write, *args, **kwargs):
+        """Run func in a session of the pool (in a database thread)."""
+        with self._pool.session(write=write):
+            return func(*args, **kwargs)
+
+    async def _in(self, executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, functools.partial(func, *args, **kwargs))
+
+    async def run(self, func, *args, write=True, **kwargs):
+        """
+        Run func(*args, **kwargs), that may be any function using the
+        database, in a database thread, and return its result. Changes are
+        committed if it succeeds. Use write=False if func only reads the
+        database.
+        """
+        return await self._in(self._db_threads, self._call, func, write,
+                              *args, **kwargs)
+
+    async def list_tables(self):
+        return await self.run(database.list_tables, write=False)
+
+    async def get_table(self, name, include_headers=False, sort=False):
+        return await self.run(database.get_table, name, write=False,
+                              include_headers=include_headers, sort=sort)
+
+    async def draw_rows(self, table_name, n, oldest_prevail=False,
+                        review=False):
+        return await self.run(database.draw_rows, table_name, n,
+                              oldest_prevail=oldest_prevail, review=review)
+
+    async def generate(self, table_name, nb=DEFAULT_Q_NB, scheme=None,
+                       tpl=None, oldest_prevail=False, review=False):
+        """
+        Draw nb rows from the table and return the content (bytes) of the
+        document generated from them, using the template tpl (by default,
+        the table's one).
+        """
+        tpl_name = table_name if tpl is None else tpl
+        if not template.exists(tpl_name):
+            raise NotFoundError(f'Cannot find template file: {tpl_name}')
+        rows = await self.draw_rows(table_name, nb,
+                                    oldest_prevail=oldest_prevail,
+                                    review=review)
+        doc = await self._in(self._renderers, document.render, rows,
+                             tpl_name, scheme=scheme)
+        return doc.getvalue()
+
+    async def aclose(self):
+        """Stop the threads and close the connections."""
+        self._db_threads.shutdown()
+        self._renderers.shutdown()
+        self._pool.close()
@@ -19,18 +19,23 @@
 # along with Memini; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import os
+import re
 import sys
 import shutil
+from itertools import chain
 
-import blessed
-
-from .prefs import DEFAULT_Q_NB
+from .prefs import DEFAULT_Q_NB, SEARCH_LIMIT, ENCODING
 from . import database, template, terminal, parser, document, sweepstakes
+from . import sqltrace
+from . import history as draws_history
 from .errors import NoSuchTableError, DestinationExistsError, NotFoundError
 from .errors import CommandError, ColumnsDoNotMatchError, MergeError
+from .errors import CommandCancelledError
 
 
 def _print_lines_not_matching_pattern(errors, pattern, decorate=True):
+    import blessed
     term = blessed.Terminal()
     msg_start = ''
     msg_prepend_lines = ''
@@ -59,6 +64,7 @@ def parse(filename, pattern, errors_only=False):
         _print_lines_not_matching_pattern(errors, pattern,
                                           decorate=not errors_only)
     elif errors_only:
+        import blessed
         term = blessed.Terminal()
         sys.stderr.write(term.chartreuse3('No parsing errors ☺\n'))
 
@@ -119,6 +125,34 @@ def delete(name):
                             f'found to be deleted.')
 
 
+def export(name, pattern, file_name=None, force=False):
+    """
+    Write the content of table name, using provided pattern, to file_name
+    (or to standard output if it is None). Reading it back with the same
+    pattern would fill a table with the same rows. Ask before overwriting an
+    existing file, unless force is True.
+    """
+    chunks = database.export_table(name, pattern)
+    if file_name is None:
+        sys.stdout.writelines(chunks)
+    else:
+        if os.path.exists(file_name) and not force:
+            overwrite = terminal.ask_yes_no(f'Output file {file_name} '
+                                            f'already exists, overwrite it?')
+            if not overwrite:
+                raise CommandCancelledError('export')
+        with open(file_name, 'w', encoding=ENCODING) as f:
+            f.writelines(chunks)
+
+
+def forgot(name, id_span):
+    """
+    Mark the rows identified by the given id_span, from the table identified
+    by its name, as forgotten: they will be due at next review.
+    """
+    database.forget_rows(name, id_span)
+
+
 def remove(name, id_span):
     """
     Remove the rows identified by the given id_span from the table identified
@@ -127,10 +161,21 @@ def remove(name, id_span):
     database.remove_rows(name, id_span)
 
 
-def list_(kind):
-    """Print the listing of all known tables' or templates' names."""
+def list_(kind, sizes=False):
+    """
+    Print the listing of all known tables' or templates' names. If sizes is
+    True, the numbers of rows (all of them, and the free ones, i.e. not drawn
+    yet) of the tables are printed too.
+    """
     if kind == 'tables':
-        print('\n'.join(database.list_tables()))
+        if sizes:
+            rows = [('table', 'rows', 'free rows')]
+            for name in database.list_tables():
+                rows_nb, free_nb, _ = database.get_stats(name, widths=False)
+                rows.append((name, str(rows_nb), str(free_nb)))
+            print(terminal.tabulate(rows))
+        else:
+            print('\n'.join(database.list_tables()))
     elif kind == 'templates':
         print('\n'.join(template.list_()))
     elif kind == 'sweepstakes':
@@ -141,10 +186,57 @@ def list_(kind):
                            f'keywords. I will not try to list "{kind}".')
 
 
-def show(name, sort=False):
-    """Print the content of the table matching name."""
-    print(terminal.tabulate(database.get_table(name, include_headers=True,
-                                               sort=sort)))
+def parse_condition(condition):
+    """
+    Turn a condition like "col2~text" into a (column, operator, value) tuple.
+    Operators are = (equality), ~ (substring) and =~ (regular expression).
+    """
+    match = re.fullmatch(r'(\w+)(=~|~|=)(.*)', condition)
+    if match is None:
+        raise CommandError(f'Cannot understand the condition "{condition}". '
+                           f'A condition should look like COLUMN=TEXT, '
+                           f'COLUMN~TEXT or COLUMN=~REGEX.')
+    col, operator, value = match.groups()
+    if operator == '=~':
+        try:
+            re.compile(value)
+        except re.error as e:
+            raise CommandError(f'Invalid regular expression "{value}" in '
+                               f'the condition "{condition}": {e}.')
+    return (col, operator, value)
+
+
+def show(name, sort=False, limit=None, offset=None, pager=None, where=None,
+         cols=None, collation=None):
+    """
+    Print the content of the table matching name, possibly only the rows
+    matching the where conditions (like "col2~text"), only the columns cols
+    (titles or numbers), only limit rows starting from offset. The rows are
+    streamed, possibly through a pager (pager=None lets use a pager only if
+    the terminal is too small).
+    """
+    if where is not None:
+        where = [parse_condition(c) for c in where]
+    selection = {'cols': cols, 'where': where, 'sort': sort,
+                 'collation': collation, 'limit': limit, 'offset': offset}
+    # iter_table() returns the shared cursor, so query everything else first
+    widths = database.get_widths(name, **selection)
+    if pager is None:
+        if where:
+            rows_nb = None
+        else:
+            rows_nb = max(database.get_rows_nb(name) - (offset or 0), 0)
+            if limit is not None:
+                rows_nb = min(rows_nb, limit)
+        pager = sys.stdout.isatty() \
+            and (rows_nb is None or not terminal.fits(rows_nb + 2))
+    cursor = database.iter_table(name, **selection)
+    headers = tuple(d[0] for d in cursor.description)
+    widths = [max(len(header), width)
+              for header, width in zip(headers, widths)]
+    rows = ((str(row[0]), ) + row[1:] for row in cursor)
+    terminal.echo_lines(terminal.tabulate_lines(chain([headers], rows),
+                                                widths), pager=pager)
 
 
 def sort(name, col_nb=1):
@@ -152,6 +244,65 @@ def sort(name, col_nb=1):
     database.sort_table(name, col_nb)
 
 
+def _suggestions(term, tables=None, nb=3):
+    """Return ' Did you mean "x" or "y"?' if cells similar to term exist."""
+    parts = []
+    for row in database.similar_rows(term, tables=tables):
+        if row[1].casefold() not in [p.casefold() for p in parts]:
+            parts.append(row[1])
+    if not parts:
+        return ''
+    quoted = [f'"{part}"' for part in parts[:nb]]
+    if len(quoted) > 1:
+        quoted = [', '.join(quoted[:-1]), quoted[-1]]
+    return f' Did you mean {" or ".join(quoted)}?'
+
+
+def search(term, tables=None, limit=SEARCH_LIMIT, rebuild=False):
+    """
+    Print the rows of all tables (or of the given tables) containing words
+    that start like the words of term, ignoring accents and case. If rebuild
+    is True, the full-text index is rebuilt first.
+    """
+    rows = database.search_rows(term, tables=tables, limit=limit,
+                                rebuild=rebuild)
+    if not rows:
+        raise NotFoundError(f'No row matches "{term}".'
+                            + _suggestions(term, tables=tables))
+    print(terminal.tabulate([('table', 'id', 'row')]
+                            + [(row[0], str(row[1]), ' | '.join(row[2:]))
+                               for row in rows]))
+
+
+def _format_row(row):
+    return f'{row[0]} {row[1]}: {" | ".join(row[2:])}'
+
+
+def similar(term=None, tables=None, limit=SEARCH_LIMIT, rebuild=False):
+    """
+    Print the rows of all tables (or of the given tables) containing cells,
+    or words, similar to term. Without term, print the pairs of rows that
+    look alike. If rebuild is True, the full-text index is rebuilt first.
+    """
+    if term is None:
+        pairs = database.near_duplicates(tables=tables, rebuild=rebuild)
+        if not pairs:
+            raise NotFoundError('No rows look alike.')
+        print(terminal.tabulate(
+            [('similarity', 'row', 'looks like')]
+            + [(f'{100 * ratio:.0f} %', _format_row(row1), _format_row(row2))
+               for ratio, row1, row2 in pairs[:limit]]))
+        return
+    rows = database.similar_rows(term, tables=tables, limit=limit,
+                                 rebuild=rebuild)
+    if not rows:
+        raise NotFoundError(f'No row looks like "{term}".')
+    print(terminal.tabulate(
+        [('similarity', 'table', 'id', 'row')]
+        + [(f'{100 * row[0]:.0f} %', row[2], str(row[3]), ' | '.join(row[4:]))
+           for row in rows]))
+
+
 def update(name, rowstr):
     """Update a row."""
     cells = rowstr.split('|')
@@ -165,6 +316,43 @@ def dump(sw_id):
     print('\n'.join(str(row) for row in sweepstakes.load_sweepstake(sw_id)))
 
 
+def _format_date(drawn_at):
+    """Format a draw's date for display (down to the second)."""
+    return '-' if drawn_at is None else drawn_at[:19]
+
+
+def _format_coverage(seen_nb, rows_nb):
+    """Format the percentage of rows that have been drawn at least once."""
+    return '-' if not rows_nb else f'{100 * seen_nb / rows_nb:.1f} %'
+
+
+def history(name=None, last=None):
+    """
+    Print statistics about the draws: coverage per table if name is None,
+    otherwise how many times and when each row of the table matching name has
+    been drawn. If last is not None, only the last draws are taken into
+    account.
+    """
+    if name is None:
+        rows = [('table', 'rows', 'drawn rows', 'coverage', 'draws',
+                 'last drawn')]
+        for table_name in database.list_tables():
+            rows_nb = database.get_rows_nb(table_name)
+            seen_nb, draws_nb, last_drawn = \
+                draws_history.summary(table_name, last=last)
+            rows.append((table_name, str(rows_nb), str(seen_nb),
+                         _format_coverage(seen_nb, rows_nb), str(draws_nb),
+                         _format_date(last_drawn)))
+    else:
+        database._assert_table_exists(name)
+        col_titles = database.get_cols(name)
+        rows = [tuple(['id'] + col_titles + ['drawn', 'last drawn'])]
+        for row in draws_history.rows_stats(name, col_titles, last=last):
+            rows.append(tuple(str(cell) for cell in row[:-1])
+                        + (_format_date(row[-1]), ))
+    print(terminal.tabulate(rows))
+
+
 def _check_moveable(name1, name2):
     """
     Check table name1 does exist, but not name2. Check no template name2
@@ -191,11 +379,13 @@ def rename(name1, name2):
 
 def duplicate(name1, name2):
     """
-    Rename table name1 as name2. Duplicate the associated default template.
+    Duplicate table name1 as name2 (as a snapshot, that is only actually
+    copied when one of the tables changes). Duplicate the associated default
+    template.
     """
     _check_moveable(name1, name2)
     shutil.copy(template.path(name1), template.path(name2))
-    database.copy_table(name1, name2)
+    database.snapshot_table(name1, name2)
 
 
 def merge(src, dest):
@@ -208,16 +398,12 @@ def merge(src, dest):
     # Check sources first
     if not src:
         raise MergeError('At least one table must be provided as source.')
-    nonexisting_tables = []
-    for table in src:
-        try:
-            database._assert_table_exists(table)
-        except NoSuchTableError:
-            nonexisting_tables.append(table)
+    cols = database.get_tables_cols(list(src) + [dest])
+    nonexisting_tables = [table for table in src if table not in cols]
     if nonexisting_tables:
         raise MergeError(f"One or more tables cannot be found: "
                          f"{', '.join(nonexisting_tables)}")
-    src_cols_nb = [len(database.get_cols(table)) for table in src]
+    src_cols_nb = [len(cols[table]) for table in src]
     if not all(n == src_cols_nb[0] for n in src_cols_nb):
         raise MergeError(f'All tables used as sources must have the same '
                          f'number of columns. Found {src_cols_nb} instead.')
@@ -226,8 +412,8 @@ def merge(src, dest):
 
     # Now check dest
     do_create_dest_template = False
-    if database.table_exists(dest):
-        dest_cols_nb = len(database.get_cols(dest))
+    if dest in cols:
+        dest_cols_nb = len(cols[dest])
         if src_cols_nb != dest_cols_nb:
             raise MergeError(f'Number of columns mismatch: destination table '
                              f'{dest} has {dest_cols_nb} columns, while '
@@ -240,13 +426,12 @@ def merge(src, dest):
                              f'already exists, but not the matching table. '
                              f'Please rename or remove it before using this '
                              f'name.')
-        database.create_table(dest, database.get_cols(src[0]))
+        database.create_table(dest, cols[src[0]])
         do_create_dest_template = True
 
     if do_create_dest_template:
         template.create(dest)
-    for table in src:
-        database.merge_tables(table, dest)
+    database.merge_tables(list(src), dest)
 
 
 def edit(name):
@@ -259,10 +444,49 @@ def edit(name):
 
 
 def generate(name, nb=DEFAULT_Q_NB, scheme=None, output=None, force=False,
-             tpl=None, edit=True, use_previous=False):
+             tpl=None, edit=True, use_previous=False, review=False,
+             oldest_prevail=False):
     """
     Create a new document using default template and drawing data from the
     table matching name.
     """
     document.generate(name, nb=nb, scheme=scheme, output=output, force=force,
-                      tpl=tpl, edit_after=edit, use_previous=use_previous)
+                      tpl=tpl, edit_after=edit, use_previous=use_previous,
+                      review=review, oldest_prevail=oldest_prevail)
+
+
+def debug_sql(top=10, command=None, clear=False):
+    """
+    Print, for each command traced with --trace-sql (or only for command),
+    its top hottest statements (the ones that took the longest in total) and
+    the query plans of the slow ones. If clear is True, delete the trace
+    instead.
+    """
+    if clear:
+        sqltrace.clear()
+        return
+    try:
+        summary = sqltrace.summary(command=command)
+    except FileNotFoundError:
+        raise NotFoundError('No SQL statement has been traced yet. Use the '
+                            '--trace-sql option first, like in: '
+                            'memini --trace-sql show TABLE')
+    if not summary:
+        raise NotFoundError(f'No SQL statement has been traced for command '
+                            f'"{command}".')
+    for cmd in summary:
+        print(f"{cmd['command']}: {cmd['runs']} run(s), "
+              f"{cmd['statements']} statements, {cmd['ms']:.1f} ms")
+        rows = [('#', 'statement', 'calls', 'total ms', 'max ms', 'rows',
+                 'steps')]
+        plans = []
+        for i, stats in enumerate(cmd['stats'][:top], start=1):
+            rows.append((str(i), stats['sql'], str(stats['calls']),
+                         f"{stats['ms']:.1f}", f"{stats['max_ms']:.1f}",
+                         str(stats['rows']), str(stats['steps'])))
+            if stats['plan']:
+                plans.append(f"#{i} query plan: {'; '.join(stats['plan'])}")
+        print(terminal.tabulate(rows))
+        for plan in plans:
+            print(plan)
+        print()
@@ -19,20 +19,113 @@
 # along with Memini; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import os
+import re
+import queue
 import sqlite3
-from itertools import zip_longest, chain
-
-from intspan import intspan
-
-from . import shared
+import threading
+from contextlib import contextmanager
+import unicodedata
+
+from . import shared, history, schedule, profiling, sqltrace, search
+from . import stats
+from .shared import INTERNAL_PREFIX, SIDE_TABLES, SNAPSHOTS_TABLE
+from .shared import MAIN_DB, split_name
+from .env import USER_DATABASES_PATH
 from .errors import NoSuchTableError, ColumnsDoNotMatchError, NoSuchRowError
 from .errors import TooManyRowsRequiredError, DestinationExistsError
-from .errors import NoSuchColumnError
+from .errors import NoSuchColumnError, CannotAttachError, CommandError
+from .errors import InvalidTableNameError
 from .parser import parse_pattern
 from .sweepstakes import store_sweepstake
 
+# SQLite's default maximum number of terms in a compound SELECT
+_MAX_COMPOUND_SELECT = 500
+# Number of rows formatted and written at once by export_table()
+_EXPORT_CHUNK_SIZE = 1000
+# Names of the databases that can be attached ("main" and "temp" are
+# SQLite's own)
+_DB_NAME = re.compile(r'[A-Za-z_]\w*')
+
 
 # Inspiration from: https://gist.github.com/miku/6522074
+def connect(path, **kwargs):
+    """
+    Open the database at path (sqlite3 creates the file if it is missing,
+    but not its directory). kwargs are passed to sqlite3.connect(). While
+    --trace-sql is on, the connection records its statements (see sqltrace).
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), mode=0o770, exist_ok=True)
+    if sqltrace.enabled():
+        kwargs.setdefault('factory', sqltrace.TracingConnection)
+    return sqlite3.connect(path, **kwargs)
+
+
+class Pool:
+    """
+    A bounded pool of connections to the database at path, shared by
+    threads. Each session uses one connection, that no other thread uses
+    meanwhile. Connections use WAL journaling, so that readers do not wait
+    for a writer.
+    """
+    def __init__(self, path, size=4):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = connect(self.path, check_same_thread=False)
+                conn.execute('PRAGMA journal_mode=WAL;')
+            except BaseException:
+                # The connection could not be made: give its slot back
+                self._slots.release()
+                raise
+            with self._lock:
+                self._all.append(conn)
+            return conn
+
+    def _release(self, conn):
+        self._idle.put(conn)
+        self._slots.release()
+
+    @contextmanager
+    def session(self, write=False):
+        """
+        Make database functions use a connection of the pool inside the with
+        block (see shared.using()), and commit at the end (or roll back if
+        an exception is raised). write=True takes the write lock at once,
+        waiting for other writers to finish, rather than failing later.
+        """
+        conn = self._acquire()
+        try:
+            if write:
+                conn.execute('BEGIN IMMEDIATE;')
+            with shared.using(conn.cursor()):
+                yield
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Close all connections."""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+
+
 class Manager:
     """
     Simple CM for sqlite3 databases. Commits AND closes everything at exit.
@@ -43,7 +136,7 @@ class Manager:
         self.cursor = None
 
     def __enter__(self):
-        self.conn = sqlite3.connect(self.path)
+        self.conn = connect(self.path)
         self.cursor = self.conn.cursor()
         return self.cursor
 
@@ -52,16 +145,130 @@ class Manager:
         self.conn.close()
 
 
+def _db_path(db_name):
+    """Return the path to the file of the database db_name."""
+    return os.path.join(USER_DATABASES_PATH, f'{db_name}.db')
+
+
+def list_databases():
+    """List the databases that can be attached to the main one."""
+    if not os.path.isdir(USER_DATABASES_PATH):
+        return []
+    return sorted(os.path.splitext(f)[0]
+                  for f in os.listdir(USER_DATABASES_PATH)
+                  if f.endswith('.db')
+                  and _DB_NAME.fullmatch(os.path.splitext(f)[0]))
+
+
+def _attach(db_name, create=False):
+    """
+    Attach the database db_name to the main one, if not done yet. Return
+    False if it does not exist, unless create is True: then its file is
+    created.
+    """
+    if db_name == MAIN_DB:
+        return True
+    if not _DB_NAME.fullmatch(db_name) or db_name.lower() == 'temp':
+        if create:
+            raise CannotAttachError(db_name, 'this is not a valid name')
+        return False
+    db = shared.get_db()
+    # SQLite's databases' names are case insensitive
+    if db_name.lower() in [_[1].lower()
+                           for _ in db.execute('PRAGMA database_list;')]:
+        return True
+    if not create and not os.path.isfile(_db_path(db_name)):
+        return False
+    os.makedirs(USER_DATABASES_PATH, mode=0o770, exist_ok=True)
+    try:
+        db.execute(f'ATTACH DATABASE ? AS {db_name};', (_db_path(db_name), ))
+    except sqlite3.OperationalError as excinfo:  # too many attached databases
+        raise CannotAttachError(db_name, str(excinfo))
+    return True
+
+
+def _assert_valid_name(name):
+    """
+    Raise InvalidTableNameError if the statements, that do not quote the
+    tables' names, cannot use name (an SQL keyword, for instance).
+    """
+    probe = sqlite3.connect(':memory:')
+    try:
+        probe.execute(f'CREATE TABLE {split_name(name)[1]} (id INTEGER);')
+    except sqlite3.OperationalError as excinfo:
+        raise InvalidTableNameError(name, f'SQLite rejects it ({excinfo})')
+    finally:
+        probe.close()
+
+
 def list_tables():
-    """List all available tables."""
-    results = shared.db.execute(
-        'SELECT name FROM sqlite_master WHERE type=\'table\';')
+    """
+    List all available tables (except the ones used internally), snapshots
+    included. The tables of the attached databases come after the main
+    database's ones, their names being qualified, like class5b.verbs.
+    """
+    db = shared.get_db()
+    prefix_len = len(INTERNAL_PREFIX)
+    tables = []
+    for db_name in [MAIN_DB] + list_databases():
+        _attach(db_name)
+        prefix = '' if db_name == MAIN_DB else f'{db_name}.'
+        results = db.execute(
+            f'SELECT name FROM {db_name}.sqlite_master '
+            f'WHERE type IN (\'table\', \'view\') '
+            f'AND substr(name, 1, {prefix_len}) != \'{INTERNAL_PREFIX}\';')
+        tables += [prefix + _[0] for _ in results.fetchall()]
+    return tables
+
+
+def _side_tables():
+    """List the existing side tables, referring to users' tables' rows."""
+    db = shared.get_db()
+    names = ', '.join(f"'{t}'" for t in SIDE_TABLES)
+    results = db.execute(
+        f'SELECT name FROM sqlite_master WHERE type=\'table\' '
+        f'AND name IN ({names});')
     return [_[0] for _ in results.fetchall()]
 
 
+def _renumber_side_tables(name, order_by='id'):
+    """
+    Report, in the side tables, the new ids the rows of table name will get
+    once copied, in the order_by order, to a new table. References to rows
+    that do not exist anymore are deleted.
+    """
+    db = shared.get_db()
+    side_tables = _side_tables()
+    if not side_tables:
+        return
+    mapping = f'{INTERNAL_PREFIX}renumbering'
+    db.execute(f'CREATE TEMP TABLE {mapping} '
+               f'(new_id INTEGER PRIMARY KEY, old_id INTEGER UNIQUE);')
+    db.execute(f'INSERT INTO {mapping} (old_id) '
+               f'SELECT id FROM {name} ORDER BY {order_by};')
+    for side in side_tables:
+        db.execute(f'DELETE FROM {side} WHERE table_name = ? '
+                   f'AND row_id NOT IN (SELECT old_id FROM {mapping});',
+                   (name, ))
+        # Negative ids first, to avoid transient duplicates in unique keys
+        db.execute(f'UPDATE {side} SET row_id = -(SELECT new_id '
+                   f'FROM {mapping} WHERE old_id = row_id) '
+                   f'WHERE table_name = ?;', (name, ))
+        db.execute(f'UPDATE {side} SET row_id = -row_id '
+                   f'WHERE table_name = ?;', (name, ))
+    db.execute(f'DROP TABLE temp.{mapping};')
+
+
 def table_exists(name):
     """True if a table of this name does exist in the database."""
-    return name in list_tables()
+    db = shared.get_db()
+    db_name, table_name = split_name(name)
+    if table_name.startswith(INTERNAL_PREFIX) or not _attach(db_name):
+        return False
+    return db.execute(
+        f'SELECT EXISTS(SELECT 1 FROM {db_name}.sqlite_master '
+        f'WHERE type IN (\'table\', \'view\') AND name = ?);',
+        (table_name, )).fetchone()[0] == 1
 
 
 def _assert_table_exists(name):
@@ -73,8 +280,9 @@ def _assert_table_exists(name):
 
 def _assert_row_exists(table_name, id_):
     """Raise an exception if no such row in the table exists."""
+    db = shared.get_db()
     cmd = f'SELECT EXISTS(SELECT 1 FROM {table_name} WHERE id={id_});'
-    row_exists = shared.db.execute(cmd).fetchall()[0][0]
+    row_exists = db.execute(cmd).fetchall()[0][0]
     if not row_exists:
         raise NoSuchRowError(id_, table_name)
     return True
@@ -87,22 +295,67 @@ def _exec(table_name, cmd, id_=None):
     command. If table_name is provided as None, then no check is run, the
     command is simply directly executed.
     """
+    db = shared.get_db()
     if table_name is not None:
         _assert_table_exists(table_name)
         if id_ is not None:
             _assert_row_exists(table_name, id_)
-    return shared.db.execute(cmd)
+    return db.execute(cmd)
+
+
+def _timestamp_index(name):
+    """
+    Return the name of the index on the timestamps of table name (qualified
+    like the table's name).
+    """
+    db_name, table_name = split_name(name)
+    index = f'{INTERNAL_PREFIX}{table_name}_timestamp'
+    return index if db_name == MAIN_DB else f'{db_name}.{index}'
+
+
+def _index_timestamps(name):
+    """Create the index on the timestamps of table name, if missing."""
+    _exec(None, f'CREATE INDEX IF NOT EXISTS {_timestamp_index(name)} '
+                f'ON {split_name(name)[1]} (timestamp, id);')
+
+
+def _rename(name, new_name):
+    """
+    Change a table's name, and its index's name accordingly. The table stays
+    in its database.
+    """
+    _assert_valid_name(new_name)
+    db_name, table_name = split_name(name)
+    _exec(name, f'DROP INDEX IF EXISTS {_timestamp_index(name)};')
+    _exec(name, f'ALTER TABLE {db_name}.`{table_name}` '
+                f'RENAME TO `{split_name(new_name)[1]}`;')
+    _index_timestamps(new_name)
+    search.renamed(name, new_name, get_cols(new_name))
+    stats.renamed(name, new_name, get_cols(new_name))
 
 
 def rename_table(name, new_name):
     """Change a table's name."""
-    _exec(name, f'ALTER TABLE `{name}` RENAME TO `{new_name}`;')
+    db = shared.get_db()
+    _writable(name)
+    if split_name(name)[0] == split_name(new_name)[0]:
+        _rename(name, new_name)
+    else:
+        # SQLite cannot move a table to another database
+        copy_table(name, new_name)
+        _exec(name, f'DROP TABLE {name};')
+        search.dropped(name)
+        stats.dropped(name)
+    for side in _side_tables():
+        db.execute(f'UPDATE {side} SET table_name = ? '
+                   f'WHERE table_name = ?;', (new_name, name))
 
 
 def update_table(name, id_, content):
     """Change a table's name."""
     col_titles = get_cols(name)
     _assert_row_exists(name, id_)
+    _writable(name)
     if len(content) != len(col_titles):
         raise ColumnsDoNotMatchError(len(col_titles), len(content), name,
                                      col_titles, content)
@@ -111,19 +364,30 @@ def update_table(name, id_, content):
     _exec(name, f'UPDATE {name} SET {col_values} WHERE id={id_};')
 
 
+def _order_by(name, sort, collation=None):
+    """
+    Return the ORDER BY clause's content to sort name by column sort, possibly
+    using the given collation.
+    """
+    if sort not in [n + 1 for n in range(len(get_cols(name)))]:
+        raise NoSuchColumnError(sort, name)
+    collate = '' if collation is None else f' COLLATE {collation}'
+    return f'{get_cols(name, include_id=True)[sort]}{collate}, id'
+
+
 def copy_table(name1, name2, sort=False):
     """Copy table name1 as name2."""
     if table_exists(name2):
         raise DestinationExistsError(name2)
     orderby = ''
     if sort:
-        if sort not in [n + 1 for n in range(len(get_cols(name1)))]:
-            raise NoSuchColumnError(sort, name1)
-        orderby = f' ORDER BY {get_cols(name1, include_id=True)[sort]}'
+        orderby = f' ORDER BY {_order_by(name1, sort)}'
     create_table(name2, get_cols(name1))
-    titles = ', '.join(get_cols(name1))
-    _exec(None, f'INSERT INTO {name2} ({titles}) '
-                f'SELECT {titles} FROM {name1}{orderby};')
+    titles = ', '.join(get_cols(name1) + ['timestamp'])
+    with stats.appending(name2, get_cols(name1),
+                         get_stats(name1, widths=False)):
+        _exec(None, f'INSERT INTO {name2} ({titles}) '
+                    f'SELECT {titles} FROM {name1}{orderby};')
 
 
 def _original_name(name):
@@ -136,46 +400,319 @@ def _original_name(name):
     return new_name
 
 
+def _replace_table(name, sort=False):
+    """
+    Replace table name by a copy of itself, possibly sorted. The ids of the
+    rows are renumbered, without gaps, and the side tables are updated
+    accordingly.
+    """
+    order_by = _order_by(name, sort) if sort else 'id'
+    temp_name = _original_name(name)
+    _renumber_side_tables(name, order_by=order_by)
+    copy_table(name, temp_name, sort=sort)
+    _exec(name, f'DROP TABLE {name};')
+    search.dropped(name)
+    stats.dropped(name)
+    _rename(temp_name, name)
+
+
 def sort_table(name, n):
     """Sort table "name" using column number n"""
-    temp_name = _original_name(name)
-    copy_table(name, temp_name, sort=n)
-    remove_table(name)
-    rename_table(temp_name, name)
+    _writable(name)
+    _replace_table(name, sort=n)
+
+
+def _snapshots(name):
+    """
+    Return the (snapshot, source) pairs where name is the snapshot, or the
+    source.
+    """
+    db = shared.get_db()
+    if db.execute('SELECT 1 FROM sqlite_master WHERE type=\'table\' '
+                  'AND name = ?;', (SNAPSHOTS_TABLE, )).fetchone() is None:
+        return []
+    return db.execute(f'SELECT name, source FROM {SNAPSHOTS_TABLE} '
+                      f'WHERE name = ? OR source = ?;', (name, name))\
+        .fetchall()
+
+
+def snapshot_table(name1, name2):
+    """
+    Create name2 as a snapshot of table name1: a view showing the rows of
+    name1, that is turned into a real copy of name1 only when one of them is
+    about to change (see _writable()). A snapshot of a snapshot shows the
+    same table. As a view cannot show a table of another database, name2 is
+    a plain copy if it belongs to another database than its source.
+    """
+    db = shared.get_db()
+    if table_exists(name2):
+        raise DestinationExistsError(name2)
+    _assert_table_exists(name1)
+    source = dict(_snapshots(name1)).get(name1, name1)
+    db_name, table_name = split_name(source)
+    if split_name(name2)[0] != db_name:
+        copy_table(name1, name2)
+        return
+    _assert_valid_name(name2)
+    db.execute(f'CREATE TABLE IF NOT EXISTS {SNAPSHOTS_TABLE} '
+               f'(name TEXT PRIMARY KEY, source TEXT NOT NULL);')
+    db.execute(f'CREATE VIEW {name2} AS SELECT * FROM {table_name};')
+    db.execute(f'INSERT INTO {SNAPSHOTS_TABLE} (name, source) '
+               f'VALUES (?, ?);', (name2, source))
+    search.created(name2, get_cols(name2))
+
+
+def _materialize(name, source):
+    """Turn the snapshot name into a real copy of its source table."""
+    db = shared.get_db()
+    col_titles = get_cols(source)
+    db.execute(f'DROP VIEW {name};')
+    db.execute(f'DELETE FROM {SNAPSHOTS_TABLE} WHERE name = ?;', (name, ))
+    _create(name, col_titles)
+    _index_timestamps(name)
+    stats.created(name, col_titles)
+    with stats.appending(name, col_titles, get_stats(source, widths=False)):
+        db.execute(f'INSERT INTO {name} SELECT * FROM {source};')
+    search.materialized(name, col_titles)
+
+
+def _writable(name):
+    """
+    Prepare table name to be changed: if it is a snapshot, turn it into a
+    real table; if it has snapshots, turn them into real tables, so that
+    they do not show the change.
+    """
+    for snapshot, source in _snapshots(name):
+        _materialize(snapshot, source)
+
+
+class _ColsCache(threading.local):
+    """
+    Columns' titles of the tables, valid as long as the connection and the
+    schema of their database (its version number) remain the same. Each
+    thread has its own.
+    """
+    def __init__(self):
+        self.connection = None
+        self.schema_versions = {}
+        self.tables = {}
+
+
+_cols_cache = _ColsCache()
+
+
+def clear_caches():
+    """
+    Forget the cached columns' titles. Required after rolling back changes
+    of the schema, that also roll back its version number.
+    """
+    _cols_cache.__init__()
 
 
 def get_cols(table_name, include_id=False):
     """List all columns of a given table."""
-    cursor = _exec(table_name, f'SELECT * from {table_name};')
+    db = shared.get_db()
+    db_name = split_name(table_name)[0]
+    if _cols_cache.connection is not db.connection:
+        clear_caches()
+        _cols_cache.connection = db.connection
+    if not _attach(db_name):
+        raise NoSuchTableError(table_name)
+    version = db.execute(f'PRAGMA {db_name}.schema_version;').fetchone()[0]
+    if _cols_cache.schema_versions.get(db_name) != version:
+        _cols_cache.tables = {name: titles
+                              for name, titles in _cols_cache.tables.items()
+                              if split_name(name)[0] != db_name}
+        _cols_cache.schema_versions[db_name] = version
+    if table_name not in _cols_cache.tables:
+        cursor = _exec(table_name, f'SELECT * from {table_name} LIMIT 0;')
+        _cols_cache.tables[table_name] = \
+            [_[0] for _ in cursor.description][:-1]
     start = 0 if include_id else 1
-    return [_[0] for _ in cursor.description][start:-1]
+    return _cols_cache.tables[table_name][start:]
+
+
+def get_tables_cols(names):
+    """
+    Return the columns' titles of the tables listed in names, as a
+    {name: titles} dict, all fetched by one query per database. The tables
+    that do not exist are left out.
+    """
+    db = shared.get_db()
+    by_db = {}
+    for name in names:
+        db_name, table_name = split_name(name)
+        by_db.setdefault(db_name, []).append(table_name)
+    tables = {}
+    for db_name, table_names in by_db.items():
+        if not _attach(db_name):
+            continue
+        prefix = '' if db_name == MAIN_DB else f'{db_name}.'
+        for name, title in db.execute(
+                f'SELECT m.name, p.name FROM {db_name}.sqlite_master AS m '
+                f'JOIN pragma_table_info(m.name, \'{db_name}\') AS p '
+                f'WHERE m.type IN (\'table\', \'view\') '
+                f'AND m.name IN ({", ".join("?" * len(table_names))}) '
+                f'ORDER BY m.name, p.cid;', table_names):
+            tables.setdefault(prefix + name, []).append(title)
+    # Leave out the ids and timestamps
+    return {name: titles[1:-1] for name, titles in tables.items()}
+
+
+def get_stats(name, widths=True):
+    """
+    Return the number of rows, the number of free rows (never drawn, or
+    reset) and the lengths of the longest cells of each column of table
+    name, read from the statistics catalog (see stats.py). A snapshot has
+    the statistics of its source. If widths is False, the lengths that are
+    not known yet are not computed (they are None).
+    """
+    _assert_table_exists(name)
+    source = dict(_snapshots(name)).get(name, name)
+    return stats.get(source, get_cols(source), compute=widths)
 
 
 def get_rows_nb(table_name):
     """Return rows' number of a given table."""
-    cmd = f'SELECT COUNT(*) FROM {table_name};'
-    return tuple(_exec(table_name, cmd))[0][0]
+    return get_stats(table_name, widths=False)[0]
+
+
+def _col_title(name, col):
+    """
+    Return the title of the column col of table name. col may be a title, or
+    a number (0 being the ids' column).
+    """
+    titles = get_cols(name, include_id=True)
+    if isinstance(col, str) and col.isdigit():
+        col = int(col)
+    if isinstance(col, int):
+        if col not in range(len(titles)):
+            raise NoSuchColumnError(col, name)
+        return titles[col]
+    if col not in titles:
+        raise NoSuchColumnError(col, name)
+    return col
+
+
+def _regexp(pattern, text):
+    """Implementation of SQLite's REGEXP operator."""
+    return text is not None and re.search(pattern, str(text)) is not None
+
+
+def _unicode_key(text):
+    """Return a case and accents insensitive version of text."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed
+                   if not unicodedata.combining(c)).casefold()
+
+
+def _unicode_collation(text1, text2):
+    """Compare two texts, ignoring case and accents."""
+    key1, key2 = _unicode_key(text1), _unicode_key(text2)
+    return (key1 > key2) - (key1 < key2)
+
+
+def _register_functions():
+    """Make the REGEXP operator and the unicode collation available."""
+    db = shared.get_db()
+    # Redefining them would fail while a statement is pending
+    if db.execute('SELECT 1 FROM pragma_collation_list '
+                  'WHERE name=\'unicode\';').fetchone() is not None:
+        return
+    db.connection.create_function('regexp', 2, _regexp)
+    db.connection.create_collation('unicode', _unicode_collation)
+
+
+def _select(name, cols=None, where=None, sort=False, collation=None,
+            limit=None, offset=None, id_as_text=False):
+    """
+    Return the SELECT statement, and its parameters, of the rows of table
+    name: their ids and the columns cols (all by default), possibly filtered
+    by the where conditions, sorted along column number sort (using
+    collation) and restricted to limit rows starting from offset.
+
+    Columns are given as titles or numbers. where conditions are
+    (column, operator, value) tuples, operator being = (equality), ~ (value
+    is a substring) or =~ (value is a regular expression).
+    """
+    _assert_table_exists(name)
+    if cols is None:
+        cols = get_cols(name)
+    titles = [_col_title(name, c) for c in cols]
+    id_ = 'CAST(id AS TEXT) AS id' if id_as_text else 'id'
+    cmd = f'SELECT {", ".join([id_] + titles)} FROM {name}'
+    params = []
+    if where:
+        _register_functions()
+        templates = {'=': '{} = ?', '~': 'instr({}, ?) > 0',
+                     '=~': '{} REGEXP ?'}
+        conditions = []
+        for col, operator, value in where:
+            conditions.append(templates[operator]
+                              .format(_col_title(name, col)))
+            params.append(value)
+        cmd += ' WHERE ' + ' AND '.join(conditions)
+    if sort:
+        if collation is not None:
+            _register_functions()
+        cmd += f' ORDER BY {_order_by(name, sort, collation=collation)}'
+    if limit is not None or offset is not None:
+        limit = -1 if limit is None else limit
+        cmd += f' LIMIT {limit} OFFSET {offset or 0}'
+    return cmd, params
+
+
+def iter_table(name, cols=None, where=None, sort=False, collation=None,
+               limit=None, offset=None, id_as_text=False):
+    """
+    Return a cursor over the table's rows (ids first). See _select() about
+    the rows and columns selection.
+    """
+    db = shared.get_db()
+    cmd, params = _select(name, cols=cols, where=where, sort=sort,
+                          collation=collation, limit=limit, offset=offset,
+                          id_as_text=id_as_text)
+    return db.execute(cmd + ';', params)
+
+
+def get_widths(name, cols=None, where=None, sort=False, collation=None,
+               limit=None, offset=None):
+    """
+    Return the lengths of the longest texts of each column (ids first) of the
+    table's rows, selected like in iter_table().
+    """
+    db = shared.get_db()
+    cmd, params = _select(name, cols=cols, where=where, sort=sort,
+                          collation=collation, limit=limit, offset=offset)
+    if cols is None:
+        cols = get_cols(name)
+    titles = ['id'] + [_col_title(name, c) for c in cols]
+    if where is None and limit is None and offset is None:
+        # All rows are selected: the statistics give the widths
+        widths = dict(zip(get_cols(name), get_stats(name)[2]))
+        widths['id'] = db.execute(f'SELECT LENGTH(MAX(id)) '
+                                  f'FROM {name};').fetchone()[0]
+        return [widths[title] or 0 for title in titles]
+    lengths = ', '.join(f'MAX(LENGTH({t}))' for t in titles)
+    widths = db.execute(f'SELECT {lengths} FROM ({cmd});',
+                        params).fetchone()
+    return [w or 0 for w in widths]
 
 
 def get_table(name, include_headers=False, sort=False):
     """Return a list of all table's lines."""
     headers = []
-    cols = ','.join(get_cols(name, include_id=True))
-    content = _exec(name, f'SELECT {cols} FROM {name};').fetchall()
-    content = [(str(t[0]), ) + t[1:] for t in content]
-    if sort:
-        if sort not in [n for n in range(len(content[0]))]:
-            raise NoSuchColumnError(sort, name)
-        content = sorted(content, key=lambda row: row[sort])
+    content = iter_table(name, sort=sort, id_as_text=True).fetchall()
     if include_headers:
         headers = [tuple(get_cols(name, include_id=True))]
     return headers + content
 
 
-def table_to_text(name, pattern):
-    """Return table's content using provided pattern."""
-    content = get_table(name)
-    content = [c[1:] for c in content]
+def _text_layout(name, pattern):
+    """
+    Return the format string turning a row of table name (id first) into a
+    line of text, its cells being separated like the tags of pattern.
+    """
     col_titles = get_cols(name)
     cols_nb = len(col_titles)
     sep_list, tags = parse_pattern(pattern, sep_list=True)
@@ -183,30 +720,118 @@ def table_to_text(name, pattern):
     if cols_nb != tags_nb:
         raise ColumnsDoNotMatchError(cols_nb, tags_nb,
                                      name, col_titles, pattern)
-    lines = [list(zip_longest(c, sep_list)) for c in content]
-    lines = [list(chain(*z))[:-1] for z in lines]
-    lines = [''.join(line) for line in lines]
-    output = '\n'.join(lines)
-    return output
+    seps = [sep.replace('{', '{{').replace('}', '}}') for sep in sep_list]
+    return '{1}' + ''.join(f'{sep}{{{i + 2}}}' for i, sep in enumerate(seps))
 
 
-def remove_table(name):
-    """Remove table name."""
-    _exec(name, f'DROP TABLE {name};')
+def export_table(name, pattern, chunk_size=_EXPORT_CHUNK_SIZE):
+    """
+    Return an iterator over the content of table name, as lines of text
+    using provided pattern (each one ending with a newline), joined by
+    chunk_size lines. The rows are read from a cursor, chunk_size at a time,
+    so that memory use does not depend on the table's size.
+    """
+    layout = _text_layout(name, pattern) + '\n'
+    cursor = iter_table(name)
 
+    return (''.join([layout.format(*row) for row in rows])
+            for rows in iter(lambda: cursor.fetchmany(chunk_size), []))
 
-def create_table(name, col_titles, content=None):
-    """Create table name using given col_titles and content."""
+
+def table_to_text(name, pattern):
+    """Return table's content using provided pattern."""
+    return ''.join(export_table(name, pattern))[:-1]
+
+
+def _search_index(tables=None, rebuild=False):
+    """
+    Check the listed tables exist and build the full-text index, if it does
+    not exist yet or if rebuild is True. Tables of attached databases are not
+    indexed, hence cannot be searched.
+    """
+    for name in tables or []:
+        _assert_table_exists(name)
+        if split_name(name)[0] != MAIN_DB:
+            raise CommandError(f'Tables of attached databases ("{name}") '
+                               f'cannot be searched.')
+    if rebuild or not search.exists():
+        search.build([(name, get_cols(name)) for name in list_tables()])
+
+
+def search_rows(term, tables=None, limit=None, rebuild=False):
+    """
+    Return the rows of all tables (or of the listed tables) matching term,
+    as (table name, row id, cells...) tuples, the best matches first. The
+    full-text index is built first, if it does not exist yet or if rebuild
+    is True.
+    """
+    _search_index(tables, rebuild)
+    return search.find(term, tables=tables, limit=limit)
+
+
+def similar_rows(term, tables=None, limit=None, rebuild=False):
+    """
+    Return the rows of all tables (or of the listed tables) having cells, or
+    words, similar to term, as (similarity, similar part, table name, row
+    id, cells...) tuples, the most similar first.
+    """
+    _search_index(tables, rebuild)
+    return search.similar(term, tables=tables, limit=limit)
+
+
+def near_duplicates(tables=None, rebuild=False):
+    """
+    Return the pairs of rows, of all tables (or of the listed tables), that
+    look alike, as (similarity, row1, row2) tuples, the most similar first.
+    """
+    _search_index(tables, rebuild)
+    return search.near_duplicates(tables=tables)
+
+
+def remove_table(name):
+    """Remove table name."""
+    db = shared.get_db()
+    if name in dict(_snapshots(name)):
+        _exec(name, f'DROP VIEW {name};')
+        db.execute(f'DELETE FROM {SNAPSHOTS_TABLE} WHERE name = ?;',
+                   (name, ))
+    else:
+        _writable(name)
+        _exec(name, f'DROP TABLE {name};')
+        stats.dropped(name)
+    search.dropped(name)
+    for side in _side_tables():
+        db.execute(f'DELETE FROM {side} WHERE table_name = ?;',
+                   (name, ))
+
+
+def _create(name, col_titles):
+    """
+    Create the table name, without its index (and its database, if it is a
+    new one).
+    """
+    _assert_valid_name(name)
+    _attach(split_name(name)[0], create=True)
     titles = ' TEXT, '.join(col_titles) + ' TEXT, '
     cmd = f'CREATE TABLE {name} (id INTEGER PRIMARY KEY, '\
         f'{titles}timestamp INTEGER)'
     _exec(None, cmd)
+
+
+def create_table(name, col_titles, content=None):
+    """Create table name using given col_titles and content."""
+    _create(name, col_titles)
+    _index_timestamps(name)
+    search.created(name, col_titles)
+    stats.created(name, col_titles)
     if content is not None:
         insert_rows(name, content, col_titles=col_titles)
 
 
 def insert_rows(table_name, rows, col_titles=None):
     """Insert rows to the table."""
+    db = shared.get_db()
+    _writable(table_name)
     if col_titles is None:
         col_titles = get_cols(table_name)
     for row in rows:
@@ -219,47 +844,88 @@ def insert_rows(table_name, rows, col_titles=None):
     qmarks = '?, ' * len(col_titles) + '?'
     cmd = f'INSERT INTO {table_name}({titles}) VALUES({qmarks})'
     content = [item + (0, ) for item in rows]
-    shared.db.executemany(cmd, content)
+    widths = [max((len(str(row[i])) for row in rows), default=0)
+              for i in range(len(col_titles))]
+    # The inserted rows are free (never drawn)
+    with stats.appending(table_name, col_titles,
+                         (len(rows), len(rows), widths)):
+        db.executemany(cmd, content)
 
 
-def merge_tables(name1, name2):
-    """Insert rows of table name1 table into name2."""
-    if len(get_cols(name1)) != len(get_cols(name2)):
-        raise ColumnsDoNotMatchError(len(get_cols(name2)),
-                                     len(get_cols(name1)), name2,
-                                     get_cols(name2), name1)
-    titles1 = ', '.join(get_cols(name1))
-    titles2 = ', '.join(get_cols(name2))
-    _exec(None, f'INSERT INTO {name2} ({titles2}) '
-                f'SELECT {titles1} FROM {name1};')
+def merge_tables(sources, dest):
+    """
+    Insert the rows of the tables listed in sources (or of the table
+    sources, if it is a name) into dest. Rows are inserted by one INSERT ...
+    SELECT ... UNION ALL statement per _MAX_COMPOUND_SELECT tables.
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    cols = get_tables_cols(list(sources) + [dest])
+    for name in list(sources) + [dest]:
+        if name not in cols:
+            raise NoSuchTableError(name)
+    for name in sources:
+        if len(cols[name]) != len(cols[dest]):
+            raise ColumnsDoNotMatchError(len(cols[dest]), len(cols[name]),
+                                         dest, cols[dest], name)
+    _writable(dest)
+    sources_stats = [get_stats(name, widths=False) for name in sources]
+    widths = [None if None in w else max(w)
+              for w in zip(*(s[2] for s in sources_stats))]
+    # The merged rows have never been drawn from dest, hence are free
+    rows_nb = sum(s[0] for s in sources_stats)
+    with stats.appending(dest, cols[dest], (rows_nb, rows_nb, widths)):
+        for i in range(0, len(sources), _MAX_COMPOUND_SELECT):
+            selects = ' UNION ALL '.join(
+                f'SELECT {", ".join(cols[name])}, 0 FROM {name}'
+                for name in sources[i:i + _MAX_COMPOUND_SELECT])
+            _exec(None, f'INSERT INTO {dest} '
+                        f'({", ".join(cols[dest])}, timestamp) {selects};')
 
 
 def _reset_table_ids(name):
     """Reset the ids of a table to remove gaps created by rows removals."""
-    temp_name = _original_name(name)
-    copy_table(name, temp_name)
-    remove_table(name)
-    rename_table(temp_name, name)
+    _replace_table(name)
 
 
 def remove_row(table_name, id_):
     """Remove row matching id_ in the table."""
+    _writable(table_name)
     cmd = f'DELETE FROM {table_name} WHERE id = {id_};'
     _exec(table_name, cmd, id_=id_)
     _reset_table_ids(table_name)
 
 
+def _span_ids(s):
+    """Turn an ints' span (given as str, like "1-3,7") to a list of ints."""
+    from intspan import intspan  # only a few commands need it
+    return list(intspan(s))
+
+
 def _intspan2sqllist(s):
     """Turn an ints' span (given as str) to a SQLite list of values."""
-    values = ', '.join([str(n) for n in list(intspan(s))])
+    values = ', '.join([str(n) for n in _span_ids(s)])
     return f'({values})'
 
 
+def forget_rows(table_name, id_span):
+    """
+    Mark the rows matching the ids from id_span as forgotten, so that they
+    are due for review again.
+    """
+    _assert_table_exists(table_name)
+    ids = _span_ids(id_span)
+    for id_ in ids:
+        _assert_row_exists(table_name, id_)
+    schedule.forgotten(table_name, ids)
+
+
 def remove_rows(table_name, id_span):
     """Remove rows matching the ids from id_span from the table."""
     _assert_table_exists(table_name)
-    for id_ in list(intspan(id_span)):
+    for id_ in _span_ids(id_span):
         _assert_row_exists(table_name, id_)
+    _writable(table_name)
     values = _intspan2sqllist(id_span)
     cmd = f'DELETE FROM {table_name} WHERE id IN {values};'
     _exec(table_name, cmd)
@@ -273,6 +939,15 @@ WHERE id = {id_};"""
     _exec(table_name, cmd, id_=id_)
 
 
+def _timestamp_rows(table_name, ids):
+    """Set the same timestamp to all entries matching ids in the table."""
+    db = shared.get_db()
+    qmarks = ', '.join('?' * len(ids))
+    cmd = f"""UPDATE {table_name} SET timestamp = strftime('%Y-%m-%d %H:%M:%f')
+WHERE id IN ({qmarks});"""
+    db.execute(cmd, list(ids))
+
+
 def _reset(table_name, n):
     """Reset the n oldest timestamped entries."""
     cmd = f"""UPDATE {table_name} SET timestamp=0
@@ -286,21 +961,38 @@ def _full_reset(table_name):
     _reset(table_name, get_rows_nb(table_name))
 
 
-def draw_rows(table_name, n, oldest_prevail=False):
-    """Return n rows, randomly chosen."""
-    rows_nb = get_rows_nb(table_name)
+@profiling.span('draw_rows')
+def draw_rows(table_name, n, oldest_prevail=False, review=False):
+    """
+    Return n rows, randomly chosen, or, if review is True, the n rows that
+    are the most due for review.
+    """
+    rows_nb, free_nb, _ = get_stats(table_name, widths=False)
     if n > rows_nb:
         raise TooManyRowsRequiredError(n, rows_nb, table_name)
-    timestamps_clause = ''
-    if oldest_prevail:  # If timestamps must be taken into account
-        cmd = f'SELECT COUNT(*) FROM {table_name} WHERE timestamp=0;'
-        free_nb = tuple(_exec(table_name, cmd))[0][0]
-        if n > free_nb:
-            _reset(table_name, n - free_nb)
-        timestamps_clause = 'WHERE timestamp=0 '
-    cols_list = ','.join(get_cols(table_name))
-    cmd = f'SELECT {cols_list} FROM {table_name} {timestamps_clause}'\
-        f'ORDER BY random() LIMIT {n};'
-    rows = _exec(table_name, cmd).fetchall()
+    _writable(table_name)
+    if review:
+        drawn = schedule.draw_due(table_name, get_cols(table_name), n)
+    else:
+        timestamps_clause = ''
+        if oldest_prevail:  # If timestamps must be taken into account
+            _index_timestamps(table_name)
+            # Rows copied or merged by former versions got no timestamp:
+            # they have never been drawn
+            _exec(None, f'UPDATE {table_name} SET timestamp=0 '
+                        f'WHERE timestamp IS NULL;')
+            free_nb = get_stats(table_name, widths=False)[1]
+            if n > free_nb:
+                _reset(table_name, n - free_nb)
+            timestamps_clause = 'WHERE timestamp=0 '
+        cols_list = ','.join(get_cols(table_name, include_id=True))
+        cmd = f'SELECT {cols_list} FROM {table_name} {timestamps_clause}'\
+            f'ORDER BY random() LIMIT {n};'
+        drawn = _exec(table_name, cmd).fetchall()
+    if len(drawn) < n:
+        raise TooManyRowsRequiredError(n, len(drawn), table_name)
+    rows = [r[1:] for r in drawn]
+    _timestamp_rows(table_name, [r[0] for r in drawn])
     store_sweepstake(table_name, rows)
+    history.record(table_name, [r[0] for r in drawn])
     return rows
@@ -22,12 +22,11 @@
 import os
 import re
 import random
+import threading
 import subprocess
 
-from relatorio.templates.opendocument import Template
-
-
 from memini.core import database, template, terminal, sweepstakes
+from memini.core import profiling
 from memini.core.env import TEMPLATE_EXT
 from memini.core.prefs import BLANK_CHAR, FILLED_CHAR, EDITOR, DEFAULT_Q_NB
 from memini.core.errors import SchemeSyntaxError, SchemeLogicalError
@@ -102,10 +101,10 @@ def _process_data(data, scheme=None):
 
 def generate(table_name, nb=DEFAULT_Q_NB, scheme=None, oldest_prevail=False,
              output=None, force=False, tpl=None, edit_after=True,
-             use_previous=False):
+             use_previous=False, review=False):
     """
     Generate a new document using n data from the table and the matching
-    template.
+    template. If review is True, the data are the ones most due for review.
     """
     if use_previous:
         sw_data = sweepstakes.load_sweepstake(int(table_name))
@@ -131,17 +130,48 @@ def generate(table_name, nb=DEFAULT_Q_NB, scheme=None, oldest_prevail=False,
             raise CommandCancelledError('generate')
     if not use_previous:
         rows = database.draw_rows(table_name, nb,
-                                  oldest_prevail=oldest_prevail)
-    data = _process_data(rows, scheme=scheme)
-    template.sanitize(template.path(tpl_name))
-    basic = Template(source='', filepath=template.path(tpl_name))
-    basic_generated = basic.generate(o=data).render()
-    with open(output, 'wb') as f:
-        f.write(basic_generated.getvalue())
+                                  oldest_prevail=oldest_prevail,
+                                  review=review)
+    document = render(rows, tpl_name, scheme=scheme)
+    with profiling.span('write'), open(output, 'wb') as f:
+        f.write(document.getvalue())
     if edit_after:
         edit(output)
 
 
+def render(rows, tpl_name, scheme=None):
+    """
+    Return the document (as a BytesIO object) built from the rows, using the
+    template tpl_name. Does not use the database, so may run in any thread.
+    """
+    with profiling.span('render'):
+        data = _process_data(rows, scheme=scheme)
+        tpl = _load_template(template.path(tpl_name))
+        with profiling.span('relatorio.render'):
+            return tpl.generate(o=data).render()
+
+
+# Compiled templates, by path, along with the modification time and size of
+# the file they have been compiled from
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def _load_template(path):
+    """Return the compiled template, reusing it if the file did not change."""
+    with _templates_lock:  # sanitize() may rewrite the file
+        with profiling.span('template.sanitize'):
+            template.sanitize(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        if path not in _templates or _templates[path][0] != key:
+            # relatorio is slow to import and only needed here
+            with profiling.span('template.compile'):
+                from relatorio.templates.opendocument import Template
+                _templates[path] = (key, Template(source='', filepath=path))
+        return _templates[path][1]
+
+
 def edit(name):
     """Run the editor on provided file, if it exists."""
     if not os.path.isfile(name):
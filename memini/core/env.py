@@ -21,10 +21,9 @@
 
 import os
 import sys
+from ast import literal_eval
 from pathlib import Path
 
-import toml
-
 PROG_NAME = 'Memini'
 MAXCOL_NB = 4
 
@@ -36,8 +35,22 @@ CORE_DIRNAME = 'core/'
 ROOTDIR = __abspath[:__l2 - __l1][:-(len(CORE_DIRNAME) + 1)]
 DATADIR = os.path.join(ROOTDIR, 'data')
 
-with open(os.path.join(DATADIR, 'metadata.toml'), 'r') as f:
-    pp = toml.load(f)
+
+def _read_metadata(path):
+    """
+    Read the metadata file, that only contains "key = value" lines with
+    python compatible values, without importing a toml parser.
+    """
+    metadata = {}
+    with open(path, 'r') as f:
+        for line in f:
+            if '=' in line:
+                key, value = line.split('=', maxsplit=1)
+                metadata[key.strip()] = literal_eval(value.strip())
+    return metadata
+
+
+pp = _read_metadata(os.path.join(DATADIR, 'metadata.toml'))
 
 __myname__ = pp['__myname__']
 __authors__ = pp['__authors__']
@@ -60,13 +73,16 @@ USER_DB_PATH = os.path.join(USER_LOCAL_SHARE, USER_DB_NAME)
 USER_TEMPLATES_DIRNAME = 'templates'
 USER_TEMPLATES_PATH = os.path.join(USER_LOCAL_SHARE, USER_TEMPLATES_DIRNAME)
 TEMPLATE_EXT = 'odt'
-if not os.path.exists(USER_TEMPLATES_PATH):
-    Path(USER_TEMPLATES_PATH).mkdir(parents=True, exist_ok=True)
 USER_SWEEPSTAKES_DIRNAME = 'sweepstakes'
 USER_SWEEPSTAKES_PATH = os.path.join(USER_LOCAL_SHARE,
                                      USER_SWEEPSTAKES_DIRNAME)
-if not os.path.exists(USER_SWEEPSTAKES_PATH):
-    Path(USER_SWEEPSTAKES_PATH).mkdir(parents=True, exist_ok=True)
+# Other databases, attached to the main one, their tables' names being
+# qualified by the database's name (like class5b.verbs)
+USER_DATABASES_DIRNAME = 'databases'
+USER_DATABASES_PATH = os.path.join(USER_LOCAL_SHARE, USER_DATABASES_DIRNAME)
+USER_SHELL_HISTORY_PATH = os.path.join(USER_LOCAL_SHARE, 'shell_history')
+USER_SQL_TRACE_PATH = os.path.join(USER_LOCAL_SHARE, 'sql_trace.jsonl')
+# User's directories are created when they are first written to
 
 TESTS_DIR = os.path.join(ROOTDIR[:-len(__myname__) - 1], 'tests')
 TESTS_DATADIR = os.path.join(TESTS_DIR, 'data')
@@ -78,6 +78,20 @@ class NoSuchTableError(MeminiError):
         super().__init__(msg)
 
 
+class CannotAttachError(MeminiError):
+    """When a database cannot be attached to the main one."""
+    def __init__(self, name, reason):
+        msg = f'Cannot use the database "{name}": {reason}'
+        super().__init__(msg)
+
+
+class InvalidTableNameError(MeminiError):
+    """When a name cannot be given to a table."""
+    def __init__(self, name, reason):
+        msg = f'Cannot name a table "{name}": {reason}'
+        super().__init__(msg)
+
+
 class NoSuchRowError(MeminiError):
     """When the provided id_ does not match any row."""
     def __init__(self, id_, name):
@@ -86,9 +100,12 @@ class NoSuchRowError(MeminiError):
 
 
 class NoSuchColumnError(MeminiError):
-    """When the provided number does not match any row."""
+    """When the provided number, or title, does not match any column."""
     def __init__(self, n, name):
-        msg = f'Cannot find a column number {n} in "{name}"'
+        if isinstance(n, int):
+            msg = f'Cannot find a column number {n} in "{name}"'
+        else:
+            msg = f'Cannot find a column named "{n}" in "{name}"'
         super().__init__(msg)
 
 
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+from . import shared, profiling
+from .shared import HISTORY_TABLE
+
+
+def _create():
+    """Create the history table and its indexes, if not already done."""
+    db = shared.get_db()
+    db.execute(f'CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} '
+               f'(table_name TEXT NOT NULL, row_id INTEGER NOT NULL, '
+               f'drawn_at TEXT NOT NULL);')
+    db.execute(f'CREATE INDEX IF NOT EXISTS {HISTORY_TABLE}_rows '
+               f'ON {HISTORY_TABLE} (table_name, row_id, drawn_at);')
+    db.execute(f'CREATE INDEX IF NOT EXISTS {HISTORY_TABLE}_dates '
+               f'ON {HISTORY_TABLE} (table_name, drawn_at);')
+
+
+@profiling.span('history.record')
+def record(table_name, ids):
+    """Record that the rows matching ids have just been drawn from table."""
+    db = shared.get_db()
+    _create()
+    drawn_at = db.execute(
+        "SELECT strftime('%Y-%m-%d %H:%M:%f');").fetchone()[0]
+    db.executemany(f'INSERT INTO {HISTORY_TABLE} '
+                   f'(table_name, row_id, drawn_at) VALUES (?, ?, ?);',
+                   [(table_name, id_, drawn_at) for id_ in ids])
+
+
+def _since(table_name, last=None):
+    """
+    Return the date of the oldest of the last draws from table_name, or the
+    empty string (that is older than any date) if last is None or greater
+    than the number of draws.
+    """
+    db = shared.get_db()
+    if last is None:
+        return ''
+    cmd = f'SELECT DISTINCT drawn_at FROM {HISTORY_TABLE} '\
+        f'WHERE table_name = ? ORDER BY drawn_at DESC LIMIT 1 OFFSET ?;'
+    result = db.execute(cmd, (table_name, last - 1)).fetchone()
+    return '' if result is None else result[0]
+
+
+def summary(table_name, last=None):
+    """
+    Return the number of distinct rows drawn from table_name, the number of
+    draws and the date of the most recent draw (None if it's never been
+    drawn). Only the last draws are taken into account, if last is not None.
+    """
+    db = shared.get_db()
+    _create()
+    cmd = f'SELECT COUNT(DISTINCT row_id), COUNT(DISTINCT drawn_at), '\
+        f'MAX(drawn_at) FROM {HISTORY_TABLE} '\
+        f'WHERE table_name = ? AND drawn_at >= ?;'
+    return db.execute(cmd, (table_name,
+                            _since(table_name, last))).fetchone()
+
+
+def rows_stats(table_name, col_titles, last=None):
+    """
+    Return, for each row of table_name, its id, its content, how many times
+    it has been drawn and the date it has last been drawn (None if never).
+    Only the last draws are taken into account, if last is not None.
+    """
+    db = shared.get_db()
+    _create()
+    cols = ', '.join(f't.{c}' for c in col_titles)
+    cmd = f'SELECT t.id, {cols}, COUNT(h.row_id), MAX(h.drawn_at) '\
+        f'FROM {table_name} AS t LEFT JOIN {HISTORY_TABLE} AS h '\
+        f'ON h.table_name = ? AND h.row_id = t.id AND h.drawn_at >= ? '\
+        f'GROUP BY t.id ORDER BY t.id;'
+    return db.execute(cmd, (table_name, _since(table_name, last)))
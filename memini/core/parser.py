@@ -57,19 +57,79 @@ def parse_line(pattern, line):
     return result
 
 
-def parse_file(filename, pattern):
-    """Parse one entire file of data lines, according to pattern"""
+# Characters having a special meaning in the regexes built by parse_pattern()
+# (plus the newline, that the groups do not match, unlike the separators)
+_REGEX_CHARS = set('.^$*+?{}[]\\|()\n')
+
+
+def _find_fields(texts):
+    """
+    Return a function splitting a line around the plain texts (the text
+    before the first tag, then the separators, then the text after the last
+    tag) with str.find(). As the regex's lazy groups do, each field ends at
+    the first occurrence of the next separator.
+    """
+    prefix, seps, suffix = texts[0], texts[1:-1], texts[-1]
+
+    def parse(line):
+        end = len(line) - len(suffix)
+        if end < len(prefix) or '\n' in line \
+                or not line.startswith(prefix) or not line.endswith(suffix):
+            return None
+        fields = []
+        start = len(prefix)
+        for sep in seps:
+            i = line.find(sep, start, end)
+            if i == -1:
+                return None
+            fields.append(line[start:i].strip())
+            start = i + len(sep)
+        fields.append(line[start:end].strip())
+        return tuple(fields)
+
+    return parse
+
+
+def line_parser(pattern, fast=True):
+    """
+    Return a function parsing one line according to pattern, that returns
+    the tuple of stripped fields, or None if the line does not match. If
+    fast is True and the pattern's separators are plain text, the line is
+    split with str.find() rather than matched against the regex (same
+    results, faster).
+    """
+    regex, tags = parse_pattern(pattern)
+    texts = regex.split('(.*?)')
+    if fast and tags and len(texts) == len(tags) + 1 \
+            and not any(_REGEX_CHARS.intersection(t) for t in texts):
+        return _find_fields(texts)
+    compiled = re.compile(regex)
+
+    def parse(line):
+        match = compiled.fullmatch(line)
+        return None if match is None \
+            else tuple(g.strip() for g in match.groups())
+
+    return parse
+
+
+def parse_file(filename, pattern, fast=True):
+    """
+    Parse one entire file of data lines, according to pattern (see
+    line_parser() about fast)
+    """
+    parse = line_parser(pattern, fast=fast)
     result = []
     nomatch = []
     with open(filename, encoding=ENCODING) as f:
-        for line in f.readlines():
-            if line.strip():
-                try:
-                    to_add = parse_line(pattern, line.strip())
-                except LineDoesNotMatchError:
-                    nomatch.append(line.strip())
+        for line in f:
+            line = line.strip()
+            if line:
+                fields = parse(line)
+                if fields is None:
+                    nomatch.append(line)
                 else:
-                    result.append(to_add)
+                    result.append(fields)
     if not result and not nomatch:
         raise EmptyFileError('The provided file seems empty, could not find '
                              'a single line to parse.')
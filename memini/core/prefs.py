@@ -23,6 +23,27 @@ EDITOR = 'soffice'
 DEFAULT_Q_NB = 20
 ENCODING = 'utf8'
 SWEEPSTAKES_MAX = 9
+SHELL_HISTORY_LENGTH = 1000
+# memini serve: default port and number of documents rendered concurrently
+SERVER_PORT = 8383
+SERVER_RENDER_WORKERS = 2
+# memini serve and memini.aio: maximum number of database connections
+SERVER_DB_CONNECTIONS = 4
+# memini --trace-sql: statements taking at least SQL_SLOW_MS milliseconds get
+# their query plan recorded; steps are counted by SQL_PROGRESS_STEPS
+SQL_SLOW_MS = 10
+SQL_PROGRESS_STEPS = 100
+# memini search: default maximum number of rows shown
+SEARCH_LIMIT = 50
+# Cells at least this similar (from 0 to 1) are suggested or reported as
+# near duplicates
+SIMILARITY_THRESHOLD = 0.75
+# Spaced repetition: interval (in days) after the first review, default ease
+# (interval's multiplier at each review) and its minimal value
+REVIEW_FIRST_INTERVAL = 1
+REVIEW_EASE = 2.5
+REVIEW_MIN_EASE = 1.3
+REVIEW_EASE_PENALTY = 0.2
 
 
 BLANK_CHAR = '_'
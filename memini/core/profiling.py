@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+"""
+Lightweight timing of the main stages ("spans") of the commands.
+
+Spans are only measured while profiling is on (global option --profile) or
+when the MEMINI_TIMINGS environment variable is set: then a JSON line is
+written for each span, to standard error if MEMINI_TIMINGS is "-", else
+appended to the file it names. Otherwise span() costs next to nothing.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+TIMINGS_ENV_VAR = 'MEMINI_TIMINGS'
+
+_timings_target = os.environ.get(TIMINGS_ENV_VAR) or None
+_recording = False
+_records = []  # [name, depth, duration], in the order the spans started
+_lock = threading.Lock()
+_depth = contextvars.ContextVar('memini_span_depth', default=0)
+
+
+@contextmanager
+def span(name):
+    """Time the with block (or decorated function) as the stage name."""
+    if not _recording and _timings_target is None:
+        yield
+        return
+    depth = _depth.get()
+    record = [name, depth, None]
+    if _recording:
+        _records.append(record)
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record[2] = time.perf_counter() - start
+        _depth.reset(token)
+        if _timings_target is not None:
+            _emit(name, depth, record[2])
+
+
+def _emit(name, depth, duration):
+    """Write the JSON timing line of a span."""
+    line = json.dumps({'span': name, 'depth': depth,
+                       'ms': round(duration * 1000, 3),
+                       'pid': os.getpid(), 'time': round(time.time(), 6)})
+    with _lock:
+        if _timings_target == '-':
+            sys.stderr.write(line + '\n')
+        else:
+            with open(_timings_target, 'a') as f:
+                f.write(line + '\n')
+
+
+def start(dump_path=None):
+    """
+    Start recording the spans, and, if dump_path is given, profiling with
+    cProfile too. Return the function that stops it all, writes the cProfile
+    statistics to dump_path and prints the per-stage breakdown.
+    """
+    global _recording, _records
+    _records, _recording = [], True
+    profiler = None
+    if dump_path is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    begin = time.perf_counter()
+
+    def stop():
+        global _recording
+        total = time.perf_counter() - begin
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(dump_path)
+        _recording = False
+        sys.stderr.write(breakdown(_records, total))
+        if dump_path is not None:
+            sys.stderr.write(f'cProfile statistics written to {dump_path}\n')
+
+    return stop
+
+
+@contextmanager
+def recording():
+    """
+    Record the spans of the with block (without printing anything) into the
+    yielded list of [name, depth, duration] records.
+    """
+    global _recording, _records
+    _records, _recording = [], True
+    try:
+        yield _records
+    finally:
+        _recording = False
+
+
+def breakdown(records, total):
+    """Return the per-stage breakdown of the records, as text."""
+    # Spans still running (e.g. in another thread) are left out
+    records = [r for r in records if r[2] is not None]
+    width = max([len(name) + 2 * depth for name, depth, _ in records]
+                + [len('total')])
+    lines = ['Stage'.ljust(width) + '        ms      %']
+    for name, depth, duration in records:
+        share = 100 * duration / total if total else 0
+        label = ('  ' * depth + name).ljust(width)
+        lines.append(f'{label} {duration * 1000:9.1f} {share:6.1f}')
+    lines.append(f"{'total'.ljust(width)} {total * 1000:9.1f} {100:6.1f}")
+    return '\n'.join(lines) + '\n'
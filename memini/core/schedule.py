@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+import random
+
+from . import shared
+from .shared import SCHEDULE_TABLE
+from .prefs import REVIEW_FIRST_INTERVAL, REVIEW_EASE, REVIEW_MIN_EASE
+from .prefs import REVIEW_EASE_PENALTY
+
+
+def _create():
+    """Create the schedule table and its index, if not already done."""
+    db = shared.get_db()
+    db.execute(f'CREATE TABLE IF NOT EXISTS {SCHEDULE_TABLE} '
+               f'(table_name TEXT NOT NULL, row_id INTEGER NOT NULL, '
+               f'due REAL NOT NULL, interval REAL NOT NULL, '
+               f'ease REAL NOT NULL, reviews INTEGER NOT NULL, '
+               f'PRIMARY KEY (table_name, row_id));')
+    db.execute(f'CREATE INDEX IF NOT EXISTS {SCHEDULE_TABLE}_due '
+               f'ON {SCHEDULE_TABLE} (table_name, due);')
+
+
+def _schedule(table_name, ids):
+    """Add the rows matching ids to the schedule, if not already in it."""
+    db = shared.get_db()
+    cmd = f'INSERT OR IGNORE INTO {SCHEDULE_TABLE} '\
+        f'(table_name, row_id, due, interval, ease, reviews) '\
+        f'VALUES (?, ?, julianday(\'now\'), 0, ?, 0);'
+    db.executemany(cmd, [(table_name, id_, REVIEW_EASE) for id_ in ids])
+
+
+def _due_ids(table_name, n, overdue=True):
+    """
+    Return the ids of the n rows whose due date is the oldest, among the
+    ones whose due date is passed (overdue=True) or not (overdue=False).
+    """
+    db = shared.get_db()
+    comparison = '<=' if overdue else '>'
+    cmd = f'SELECT row_id FROM {SCHEDULE_TABLE} WHERE table_name = ? '\
+        f'AND due {comparison} julianday(\'now\') ORDER BY due LIMIT ?;'
+    return [r[0] for r in db.execute(cmd, (table_name, n))]
+
+
+def _new_ids(table_name, n):
+    """Return the ids of n random rows that have never been reviewed."""
+    db = shared.get_db()
+    cmd = f'SELECT id FROM {table_name} AS t WHERE NOT EXISTS '\
+        f'(SELECT 1 FROM {SCHEDULE_TABLE} WHERE table_name = ? '\
+        f'AND row_id = t.id) ORDER BY random() LIMIT ?;'
+    return [r[0] for r in db.execute(cmd, (table_name, n))]
+
+
+def draw_due(table_name, col_titles, n):
+    """
+    Return the ids and contents of the n rows of table_name that are the most
+    due for review: first the rows whose due date is passed, the oldest
+    first, then the rows never reviewed, then the rows due soon.
+    Their schedule is updated as if they were successfully reviewed.
+    """
+    db = shared.get_db()
+    _create()
+    ids = _due_ids(table_name, n)
+    if len(ids) < n:
+        ids += _new_ids(table_name, n - len(ids))
+    if len(ids) < n:
+        ids += _due_ids(table_name, n - len(ids), overdue=False)
+    random.shuffle(ids)
+    cols = ', '.join(['id'] + list(col_titles))
+    qmarks = ', '.join('?' * len(ids))
+    rows = dict((r[0], r) for r in db.execute(
+        f'SELECT {cols} FROM {table_name} WHERE id IN ({qmarks});', ids))
+    reviewed(table_name, ids)
+    return [rows[id_] for id_ in ids]
+
+
+def reviewed(table_name, ids):
+    """
+    Update the schedule of the rows matching ids, as successfully reviewed:
+    their interval grows according to their ease.
+    """
+    db = shared.get_db()
+    _create()
+    _schedule(table_name, ids)
+    qmarks = ', '.join('?' * len(ids))
+    new_interval = f'(CASE WHEN interval = 0 THEN {REVIEW_FIRST_INTERVAL} '\
+        f'ELSE interval * ease END)'
+    db.execute(f'UPDATE {SCHEDULE_TABLE} SET '
+               f'interval = {new_interval}, '
+               f'due = julianday(\'now\') + {new_interval}, '
+               f'reviews = reviews + 1 '
+               f'WHERE table_name = ? AND row_id IN ({qmarks});',
+               [table_name] + list(ids))
+
+
+def forgotten(table_name, ids):
+    """
+    Update the schedule of the rows matching ids, as forgotten: they are due
+    right now, their interval is reset and their ease lowered.
+    """
+    db = shared.get_db()
+    _create()
+    _schedule(table_name, ids)
+    qmarks = ', '.join('?' * len(ids))
+    db.execute(f'UPDATE {SCHEDULE_TABLE} SET interval = 0, '
+               f'due = julianday(\'now\'), '
+               f'ease = max({REVIEW_MIN_EASE}, '
+               f'ease - {REVIEW_EASE_PENALTY}) '
+               f'WHERE table_name = ? AND row_id IN ({qmarks});',
+               [table_name] + list(ids))
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+Full-text index (FTS5) of the rows of all users' tables.
+
+The index is only built when it is first needed (see
+database.search_rows()). From then on, triggers on each table report the
+changes of its rows to the index. Each table gets a number, and a row's
+rowid in the index is this number times 2**32 plus the row's id, so that a
+row is found directly, and all rows of a table are removed at once.
+Words are matched without accents and case (unicode61 remove_diacritics 2).
+
+A second index, using the trigram tokenizer, finds the rows sharing the most
+trigrams with a (possibly mistyped) term. Only these candidates are then
+compared to the term, to suggest similar cells. To spot near duplicates,
+each row is only compared to the rows containing one of its rarest trigrams
+(their frequencies are read through a fts5vocab table).
+"""
+
+import re
+import sqlite3
+import unicodedata
+from difflib import SequenceMatcher
+
+from . import shared
+from .prefs import SIMILARITY_THRESHOLD
+from .shared import SEARCH_TABLE, SEARCH_TABLES_TABLE, TRIGRAM_TABLE
+from .shared import INTERNAL_PREFIX, MAXI_COL_NB
+from .shared import MAIN_DB, split_name
+
+ROW_BITS = 32
+ROW_MASK = (1 << ROW_BITS) - 1
+_INDEX_COLS = [f'c{i + 1}' for i in range(MAXI_COL_NB)]
+_EVENTS = ['insert', 'delete', 'update']
+# The trigram tokenizer requires SQLite 3.34, and ignores accents from 3.45
+TRIGRAM = sqlite3.sqlite_version_info >= (3, 34, 0)
+_TRIGRAM_TOKENIZER = 'trigram remove_diacritics 1' \
+    if sqlite3.sqlite_version_info >= (3, 45, 0) else 'trigram'
+# How many rows, sharing the most trigrams with a term, are compared to it
+CANDIDATES_NB = 100
+TRIGRAM_VOCAB = f'{INTERNAL_PREFIX}fts_trigram_vocab'
+
+
+def _indexes():
+    return [SEARCH_TABLE] + ([TRIGRAM_TABLE] if TRIGRAM else [])
+
+
+def _table_exists(name):
+    db = shared.get_db()
+    return db.execute('SELECT 1 FROM sqlite_master WHERE type=\'table\' '
+                      'AND name = ?;', (name, )).fetchone() is not None
+
+
+def exists():
+    """True if the index has been built."""
+    return all(_table_exists(index) for index in _indexes())
+
+
+def _trigger(name, event):
+    return f'{INTERNAL_PREFIX}fts_{name}_{event}'
+
+
+def _number(name):
+    """Return the number of table name in the index, if any."""
+    db = shared.get_db()
+    row = db.execute(f'SELECT id FROM {SEARCH_TABLES_TABLE} '
+                     f'WHERE name = ?;', (name, )).fetchone()
+    return None if row is None else row[0]
+
+
+def _add_triggers(name, col_titles, number):
+    """Make the changes of the rows of table name update the index."""
+    db = shared.get_db()
+    base = number << ROW_BITS
+    index_cols = ', '.join(_INDEX_COLS[:len(col_titles)])
+    new = ', '.join(f'new.{title}' for title in col_titles)
+    insert = ' '.join(f'INSERT INTO {index} (rowid, {index_cols}) '
+                      f'VALUES ({base} + new.id, {new});'
+                      for index in _indexes())
+    delete = ' '.join(f'DELETE FROM {index} WHERE rowid = {base} + old.id;'
+                      for index in _indexes())
+    db.execute(f'CREATE TRIGGER {_trigger(name, "insert")} '
+               f'AFTER INSERT ON {name} BEGIN {insert} END;')
+    db.execute(f'CREATE TRIGGER {_trigger(name, "delete")} '
+               f'AFTER DELETE ON {name} BEGIN {delete} END;')
+    # Drawing rows only updates their timestamps
+    db.execute(f'CREATE TRIGGER {_trigger(name, "update")} '
+               f'AFTER UPDATE OF {", ".join(col_titles)} ON {name} '
+               f'BEGIN {delete} {insert} END;')
+
+
+def _drop_triggers(name):
+    db = shared.get_db()
+    for event in _EVENTS:
+        db.execute(f'DROP TRIGGER IF EXISTS {_trigger(name, event)};')
+
+
+def created(name, col_titles):
+    """
+    Index the rows of the new table name, if the index exists. Tables of
+    attached databases are not indexed: triggers cannot write to another
+    database.
+    """
+    if split_name(name)[0] != MAIN_DB or not exists():
+        return
+    db = shared.get_db()
+    number = db.execute(f'INSERT INTO {SEARCH_TABLES_TABLE} (name) '
+                        f'VALUES (?);', (name, )).lastrowid
+    # Snapshots are views, and become tables before they change
+    if _table_exists(name):
+        _add_triggers(name, col_titles, number)
+    for index in _indexes():
+        db.execute(f'INSERT INTO {index} '
+                   f'(rowid, {", ".join(_INDEX_COLS[:len(col_titles)])}) '
+                   f'SELECT {number << ROW_BITS} + id, '
+                   f'{", ".join(col_titles)} FROM {name};')
+
+
+def materialized(name, col_titles):
+    """
+    Make the changes of the rows of name, a snapshot that has just become a
+    table, update the index (its rows are already indexed).
+    """
+    number = _number(name) if exists() else None
+    if number is not None:
+        _add_triggers(name, col_titles, number)
+
+
+def dropped(name):
+    """Remove the rows of the dropped table name from the index."""
+    number = _number(name) if exists() else None
+    if number is None:
+        return
+    db = shared.get_db()
+    _drop_triggers(name)
+    for index in _indexes():
+        db.execute(f'DELETE FROM {index} WHERE rowid >= ? AND rowid < ?;',
+                   (number << ROW_BITS, (number + 1) << ROW_BITS))
+    db.execute(f'DELETE FROM {SEARCH_TABLES_TABLE} WHERE id = ?;',
+               (number, ))
+
+
+def renamed(name, new_name, col_titles):
+    """Report the new name of table name (renamed as new_name)."""
+    number = _number(name) if exists() else None
+    if number is None:
+        return
+    db = shared.get_db()
+    _drop_triggers(name)
+    db.execute(f'UPDATE {SEARCH_TABLES_TABLE} SET name = ? WHERE id = ?;',
+               (new_name, number))
+    _add_triggers(new_name, col_titles, number)
+
+
+def build(tables):
+    """
+    (Re)build the index of the tables, given as (name, col_titles) pairs.
+    """
+    db = shared.get_db()
+    if _table_exists(SEARCH_TABLES_TABLE):
+        for (name, ) in db.execute(f'SELECT name FROM {SEARCH_TABLES_TABLE};')\
+                .fetchall():
+            _drop_triggers(name)
+    for table in [SEARCH_TABLE, TRIGRAM_TABLE, SEARCH_TABLES_TABLE]:
+        db.execute(f'DROP TABLE IF EXISTS {table};')
+    db.execute(f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING '
+               f'fts5({", ".join(_INDEX_COLS)}, '
+               f'tokenize=\'unicode61 remove_diacritics 2\', '
+               f'prefix=\'2 3\');')
+    if TRIGRAM:
+        db.execute(f'CREATE VIRTUAL TABLE {TRIGRAM_TABLE} USING '
+                   f'fts5({", ".join(_INDEX_COLS)}, '
+                   f'tokenize=\'{_TRIGRAM_TOKENIZER}\');')
+    db.execute(f'CREATE TABLE {SEARCH_TABLES_TABLE} '
+               f'(id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);')
+    for name, col_titles in tables:
+        created(name, col_titles)
+
+
+def _query(term):
+    """
+    Turn term into a FTS5 query matching the rows containing words that
+    start like each of term's words.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', term))
+
+
+def _select(index, query, tables=None, limit=None, ranked=True):
+    """
+    Return the rows of index matching query (all rows if query is None), as
+    (table name, row id, cells...) tuples, the best matches first if ranked
+    is True. Only keep the tables whose names are listed in tables, if it
+    is not None.
+    """
+    db = shared.get_db()
+    params = []
+    clauses = []
+    if query is not None:
+        clauses.append(f'{index} MATCH ?')
+        params.append(query)
+    if tables:
+        clauses.append(f't.name IN ({", ".join("?" * len(tables))})')
+        params += list(tables)
+    where_clause = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+    order_clause = ' ORDER BY rank' if ranked and query is not None else ''
+    limit_clause = ''
+    if limit is not None:
+        limit_clause = ' LIMIT ?'
+        params.append(limit)
+    cmd = f'SELECT t.name, {index}.rowid & {ROW_MASK}, '\
+        f'{", ".join(_INDEX_COLS)} FROM {index} '\
+        f'JOIN {SEARCH_TABLES_TABLE} AS t '\
+        f'ON t.id = {index}.rowid >> {ROW_BITS}'\
+        f'{where_clause}{order_clause}{limit_clause};'
+    return [tuple(cell for cell in row if cell is not None)
+            for row in db.execute(cmd, params)]
+
+
+def find(term, tables=None, limit=None):
+    """
+    Return the rows matching term (see _query()), the best matches first,
+    as (table name, row id, cells...) tuples. Only search the tables whose
+    names are listed in tables, if it is not None.
+    """
+    query = _query(term)
+    if not query:
+        return []
+    return _select(SEARCH_TABLE, query, tables=tables, limit=limit)
+
+
+def fold(text):
+    """Return text without accents nor case."""
+    return ''.join(c for c in unicodedata.normalize('NFKD', text)
+                   if not unicodedata.combining(c)).casefold()
+
+
+def similarity(text1, text2):
+    """Return how similar text1 and text2 are, from 0 to 1."""
+    return SequenceMatcher(None, fold(text1), fold(text2)).ratio()
+
+
+def _trigrams(text):
+    """Return the trigrams of text, and of text without accents."""
+    return {variant[i:i + 3] for variant in {text.lower(), fold(text)}
+            for i in range(len(variant) - 2)}
+
+
+def _trigram_query(trigrams):
+    """
+    Turn trigrams into a FTS5 query matching the rows containing at least
+    one of them.
+    """
+    return ' OR '.join('"' + trigram.replace('"', '""') + '"'
+                       for trigram in sorted(trigrams)
+                       if not trigram.isspace())
+
+
+def _frequencies():
+    """Return the number of rows containing each trigram of the index."""
+    db = shared.get_db()
+    db.execute(f'CREATE VIRTUAL TABLE temp.{TRIGRAM_VOCAB} USING '
+               f'fts5vocab(main, {TRIGRAM_TABLE}, row);')
+    try:
+        return dict(db.execute(f'SELECT term, doc FROM temp.{TRIGRAM_VOCAB};'))
+    finally:
+        db.execute(f'DROP TABLE temp.{TRIGRAM_VOCAB};')
+
+
+def _candidates(text, tables=None, nb=CANDIDATES_NB):
+    """Return the nb rows sharing the most trigrams with text."""
+    query = _trigram_query(_trigrams(text)) if TRIGRAM else ''
+    if not query:
+        return []
+    return _select(TRIGRAM_TABLE, query, tables=tables, limit=nb)
+
+
+def _best_part(term, cell):
+    """
+    Return the similarity of term with cell, or with the part of cell
+    having as many words as term that is the most similar to it, and this
+    part.
+    """
+    words_nb = max(len(re.findall(r'\w+', term)), 1)
+    spans = [m.span() for m in re.finditer(r'\w+', cell)]
+    parts = {cell.strip()} | {cell[spans[i][0]:spans[i + words_nb - 1][1]]
+                              for i in range(len(spans) - words_nb + 1)}
+    return max((similarity(term, part), part) for part in parts)
+
+
+def similar(term, tables=None, limit=None, threshold=SIMILARITY_THRESHOLD):
+    """
+    Return the rows having a cell, or words in a cell, similar to term, the
+    most similar first, as (similarity, similar part, table name, row id,
+    cells...) tuples. Only search the tables whose names are listed in
+    tables, if it is not None.
+    """
+    term = term.strip()
+    found = []
+    for row in _candidates(term, tables=tables):
+        ratio, part = max(_best_part(term, cell) for cell in row[2:])
+        if ratio >= threshold:
+            found.append((ratio, part) + row)
+    found.sort(key=lambda row: -row[0])
+    return found[:limit]
+
+
+def near_duplicates(tables=None, threshold=SIMILARITY_THRESHOLD):
+    """
+    Return the pairs of rows that look alike, the most similar first, as
+    (similarity, row1, row2) tuples, where rows are (table name, row id,
+    cells...) tuples. Only search the tables whose names are listed in
+    tables, if it is not None.
+    """
+    if not TRIGRAM:
+        return []
+    db = shared.get_db()
+    frequencies = _frequencies()
+    overlap = 2 * threshold - 1
+    numbers = dict(db.execute(f'SELECT name, id FROM {SEARCH_TABLES_TABLE};'))
+    rows = {(numbers[row[0]] << ROW_BITS) + row[1]: row
+            for row in _select(TRIGRAM_TABLE, None, tables=tables)}
+    texts = {rowid: fold(' | '.join(row[2:])) for rowid, row in rows.items()}
+    pairs = []
+    for rowid, text in texts.items():
+        trigrams = sorted((frequencies[trigram], trigram)
+                          for trigram in set().union(*map(_trigrams,
+                                                          rows[rowid][2:]))
+                          if trigram in frequencies)
+        # Rows looking alike share at least (about) half of their trigrams,
+        # hence one of the rarest ones: only the rows containing these are
+        # compared
+        rarest = [trigram for _, trigram in
+                  trigrams[:len(trigrams) - int(overlap * len(trigrams))
+                           + 1]]
+        query = _trigram_query(rarest)
+        if not query:
+            continue
+        matcher = SequenceMatcher(None, b=text)
+        for (other, ) in db.execute(f'SELECT rowid FROM {TRIGRAM_TABLE} '
+                                    f'WHERE {TRIGRAM_TABLE} MATCH ? '
+                                    f'AND rowid > ?;', (query, rowid)):
+            if other not in texts:
+                continue
+            matcher.set_seq1(texts[other])
+            # The quick ratios are cheaper, and never lower than ratio()
+            if matcher.real_quick_ratio() < threshold \
+                    or matcher.quick_ratio() < threshold:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= threshold:
+                pairs.append((ratio, rows[rowid], rows[other]))
+    return sorted(pairs, key=lambda pair: -pair[0])
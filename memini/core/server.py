@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+"""
+Local HTTP server giving access to the tables and generating documents.
+
+Routes (all answers are JSON, except generated documents):
+
+GET  /tables                   list the tables
+GET  /tables/NAME              rows of a table; query parameters sort, limit,
+                               offset, cols (comma separated), where (may be
+                               repeated) and collate, like the show command
+POST /tables/NAME/draw         draw rows; JSON body may contain nb, review and
+                               oldest_first
+POST /tables/NAME/generate     generate a document (sent as an .odt file);
+                               JSON body may contain nb, scheme, template,
+                               review and oldest_first
+"""
+
+import json
+import traceback
+import shutil
+from urllib.parse import urlsplit, parse_qs, unquote
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from . import database, document, template
+from .commands import parse_condition
+from .env import USER_DB_PATH, TEMPLATE_EXT, PROG_NAME, __version__
+from .prefs import DEFAULT_Q_NB, SERVER_PORT, SERVER_RENDER_WORKERS
+from .prefs import SERVER_DB_CONNECTIONS
+from .errors import MeminiError, NoSuchTableError, NotFoundError
+
+HOST = '127.0.0.1'
+ODT_MIMETYPE = 'application/vnd.oasis.opendocument.text'
+CHUNK_SIZE = 64 * 1024
+
+
+class HTTPError(Exception):
+    """Error to report to the client, along with the HTTP status code."""
+    def __init__(self, status, message):
+        self.status = status
+        super().__init__(message)
+
+
+class Server(ThreadingHTTPServer):
+    """
+    Serve the requests in threads, only to local clients.
+
+    The database is accessed through a pool of connections, so that requests
+    reading it are served in parallel. Documents are rendered by a bounded
+    pool of workers.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=SERVER_PORT, db_path=USER_DB_PATH,
+                 workers=SERVER_RENDER_WORKERS,
+                 connections=SERVER_DB_CONNECTIONS, quiet=False):
+        super().__init__((HOST, port), Handler)
+        self.quiet = quiet
+        self.pool = database.Pool(db_path, size=connections)
+        self.renderers = ThreadPoolExecutor(max_workers=workers)
+
+    def server_close(self):
+        super().server_close()
+        self.renderers.shutdown()
+        self.pool.close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = f'{PROG_NAME}/{__version__}'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_document(self, name, doc):
+        """Stream the document (a BytesIO object) by chunks."""
+        self.send_response(200)
+        self.send_header('Content-Type', ODT_MIMETYPE)
+        self.send_header('Content-Length', str(doc.getbuffer().nbytes))
+        self.send_header('Content-Disposition',
+                         f'attachment; filename="{name}.{TEMPLATE_EXT}"')
+        self.end_headers()
+        doc.seek(0)
+        shutil.copyfileobj(doc, self.wfile, CHUNK_SIZE)
+
+    def _body(self):
+        """Return the JSON object sent by the client (or an empty dict)."""
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            raise HTTPError(400, f'Invalid JSON: {e}')
+        if not isinstance(body, dict):
+            raise HTTPError(400, 'A JSON object is expected.')
+        return body
+
+    def _route(self, method):
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        if method == 'GET' and parts == ['tables']:
+            return self._list_tables, ()
+        if parts[:1] == ['tables'] and len(parts) == 2 and method == 'GET':
+            return self._show, (parts[1], parse_qs(url.query))
+        if parts[:1] == ['tables'] and len(parts) == 3 and method == 'POST' \
+                and parts[2] in ['draw', 'generate']:
+            action = {'draw': self._draw, 'generate': self._generate}
+            return action[parts[2]], (parts[1], self._body())
+        raise HTTPError(404, f'Unknown route: {method} {url.path}')
+
+    def _handle(self, method):
+        try:
+            action, args = self._route(method)
+            action(*args)
+        except HTTPError as e:
+            self._send_json({'error': str(e)}, status=e.status)
+        except (NoSuchTableError, NotFoundError) as e:
+            self._send_json({'error': str(e)}, status=404)
+        except MeminiError as e:
+            self._send_json({'error': str(e)}, status=400)
+        except Exception as e:
+            self.log_error('%s', traceback.format_exc())
+            self._send_json({'error': f'Internal error: '
+                             f'{type(e).__name__}: {e}'}, status=500)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _list_tables(self):
+        with self.server.pool.session():
+            tables = database.list_tables()
+        self._send_json({'tables': tables})
+
+    def _show(self, name, query):
+        def last(key, convert=str):
+            try:
+                return convert(query[key][-1]) if key in query else None
+            except ValueError:
+                raise HTTPError(400, f'Invalid value for {key}: '
+                                f'{query[key][-1]}')
+        where = [parse_condition(c) for c in query.get('where', [])]
+        cols = last('cols')
+        if cols is not None:
+            cols = [c.strip() for c in cols.split(',')]
+        with self.server.pool.session():
+            cursor = database.iter_table(
+                name, cols=cols, where=where or None,
+                sort=last('sort', int) or False, collation=last('collate'),
+                limit=last('limit', int), offset=last('offset', int))
+            headers = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        self._send_json({'headers': headers, 'rows': rows})
+
+    def _draw_rows(self, name, body):
+        nb = body.get('nb', DEFAULT_Q_NB)
+        if not isinstance(nb, int) or nb < 1:
+            raise HTTPError(400, 'nb must be a positive integer.')
+        if body.get('review') and body.get('oldest_first'):
+            raise HTTPError(400, 'review and oldest_first cannot be used '
+                            'together.')
+        with self.server.pool.session(write=True):
+            return database.draw_rows(
+                name, nb, review=bool(body.get('review')),
+                oldest_prevail=bool(body.get('oldest_first')))
+
+    def _draw(self, name, body):
+        self._send_json({'rows': self._draw_rows(name, body)})
+
+    def _generate(self, name, body):
+        tpl_name = body.get('template') or name
+        if not template.exists(tpl_name):
+            raise NotFoundError(f'Cannot find template file: {tpl_name}')
+        rows = self._draw_rows(name, body)
+        doc = self.server.renderers.submit(document.render, rows, tpl_name,
+                                           scheme=body.get('scheme')).result()
+        self._send_document(name, doc)
+
+
+def serve(port=SERVER_PORT, workers=SERVER_RENDER_WORKERS,
+          connections=SERVER_DB_CONNECTIONS, ready=None):
+    """
+    Run the server until interrupted. ready, if given, is called with the
+    server's address once it listens.
+    """
+    with Server(port=port, workers=workers,
+                connections=connections) as server:
+        if ready is not None:
+            ready(server.server_address)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
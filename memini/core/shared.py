@@ -19,20 +19,70 @@
 # along with Memini; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
-import os
-
-from .env import USER_LOCAL_SHARE, USER_DB_PATH
-
+import contextvars
+from contextlib import contextmanager
 
 MINI_COL_NB = 2
 MAXI_COL_NB = 4
 
+# Tables used by Memini itself are hidden from the user's tables
+INTERNAL_PREFIX = '_memini_'
+HISTORY_TABLE = f'{INTERNAL_PREFIX}history'
+SCHEDULE_TABLE = f'{INTERNAL_PREFIX}schedule'
+# Side tables refer to users' tables' rows via (table_name, row_id) columns
+SIDE_TABLES = [HISTORY_TABLE, SCHEDULE_TABLE]
+# Full-text index of the users' tables' rows, and numbers of the tables in it
+SEARCH_TABLE = f'{INTERNAL_PREFIX}fts'
+SEARCH_TABLES_TABLE = f'{INTERNAL_PREFIX}fts_tables'
+TRIGRAM_TABLE = f'{INTERNAL_PREFIX}fts_trigram'
+# Snapshots (views of users' tables, see database.snapshot_table())
+SNAPSHOTS_TABLE = f'{INTERNAL_PREFIX}snapshots'
+# Numbers of rows and widths of columns of the tables (see stats.py)
+STATS_TABLE = f'{INTERNAL_PREFIX}stats'
+
+
+# Name of the database holding the unqualified tables (see split_name())
+MAIN_DB = 'main'
+
+
+def split_name(name):
+    """
+    Return the database's name and the table's name of a qualified table's
+    name, like 'class5b.verbs'. Unqualified names refer to the main database.
+    """
+    db_name, _, table_name = name.rpartition('.')
+    return (db_name or MAIN_DB, table_name)
 
-def init():
-    global db
 
-    os.makedirs(USER_LOCAL_SHARE, mode=0o770, exist_ok=True)
-    if not os.path.isfile(USER_DB_PATH):
-        open(USER_DB_PATH, 'a').close()
+# Cursor used by the database functions in the current context (each thread
+# and each asyncio task has its own); db is used if none has been set
+_current = contextvars.ContextVar('memini_cursor', default=None)
+
+
+@contextmanager
+def using(cursor):
+    """
+    Make the database functions use cursor inside the with block, in the
+    current thread (or asyncio task) only.
+    """
+    token = _current.set(cursor)
+    try:
+        yield cursor
+    finally:
+        _current.reset(token)
+
+
+def get_db():
+    """Return the cursor to use in the current context."""
+    cursor = _current.get()
+    return db if cursor is None else cursor
+
+
+def init():
+    global db, shell, batch
 
-    db = None  # Will be initialized in main script
+    db = None  # Cursor used when none has been set with using()
+    # True while "memini shell" or "memini batch" keep db open between
+    # commands
+    shell = False
+    batch = False  # True while "memini batch" runs commands in a transaction
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+import os
+import time
+import shlex
+
+import click
+
+try:
+    import readline
+except ImportError:  # e.g. on Windows
+    readline = None
+
+from . import database, shared, template, terminal
+from .env import PROG_NAME, USER_SHELL_HISTORY_PATH
+from .prefs import SHELL_HISTORY_LENGTH
+
+PROMPT = f'{PROG_NAME.lower()}> '
+QUIT_COMMANDS = ['exit', 'quit']
+
+
+def candidates(group, words):
+    """
+    Return the possible completions of the next word of a command line whose
+    first complete words are words.
+    """
+    if not words:
+        return sorted(list(group.commands) + QUIT_COMMANDS)
+    if words[0] == 'list':
+        return ['sweepstakes', 'tables', 'templates'] if len(words) == 1 \
+            else []
+    return database.list_tables()
+
+
+def _completer(group):
+    """Return a readline completer of the commands of group."""
+    matches = []
+
+    def complete(text, state):
+        if state == 0:
+            line = readline.get_line_buffer()[:readline.get_begidx()]
+            matches[:] = [c for c in candidates(group, line.split())
+                          if c.startswith(text)]
+        return matches[state] if state < len(matches) else None
+
+    return complete
+
+
+def execute(group, line):
+    """
+    Run the command line (without the program's name) through the click
+    group, as if it had been typed in a terminal, but keep running whatever
+    happens. Return False if the command failed.
+    """
+    try:
+        args = shlex.split(line)
+    except ValueError as e:
+        click.echo(f'Error: {e}')
+        return False
+    if not args:
+        return True
+    try:
+        group.main(args=args, prog_name=PROG_NAME.lower(),
+                   standalone_mode=False)
+    except click.ClickException as e:
+        e.show()
+        return False
+    except click.Abort:
+        click.echo('Aborted!')
+        return False
+    except SystemExit as e:
+        return not e.code  # Errors have already been reported
+    except Exception as e:
+        click.echo(f'Error: unexpected {type(e).__name__}: {e}', err=True)
+        return False
+    return True
+
+
+def _batch_commands(lines):
+    """
+    Yield the (line number, command line) of the commands of a batch file's
+    lines: blank lines and comments (starting with #) are skipped, and so is
+    the program's name if the command starts with it.
+    """
+    for i, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        words = line.split(maxsplit=1)
+        if words[0] == PROG_NAME.lower():
+            line = words[1] if len(words) > 1 else ''
+        yield (i, line)
+
+
+def _rollback(savepoint, templates):
+    """
+    Roll back to the savepoint, and remove the templates that have been
+    created since then (templates are the ones that existed at that time).
+    """
+    db = shared.get_db()
+    db.execute(f'ROLLBACK TO SAVEPOINT {savepoint};')
+    # Rolling back schema changes makes cached columns obsolete
+    database.clear_caches()
+    for name in set(template.list_()) - templates:
+        template.remove(os.path.splitext(name)[0])
+
+
+def batch(group, lines, stop_on_error=True):
+    """
+    Run the commands read from lines inside one transaction (the database
+    connection must be kept open), each one inside its own savepoint.
+
+    If a command fails, its changes are rolled back; then, if stop_on_error
+    is True, the changes of all previous commands are rolled back too and no
+    more command is run. Rolling back also removes the templates created
+    in the meantime (but does not restore removed or renamed ones).
+
+    Return the list of (line number, command line, success, duration in
+    seconds) of the commands that have been run.
+    """
+    db = shared.get_db()
+    results = []
+    batch_templates = set(template.list_())
+    db.execute('SAVEPOINT batch;')
+    try:
+        for i, line in _batch_commands(lines):
+            templates = set(template.list_())
+            db.execute('SAVEPOINT command;')
+            start = time.perf_counter()
+            ok = execute(group, line)
+            duration = time.perf_counter() - start
+            if not ok:
+                _rollback('command', templates)
+            db.execute('RELEASE SAVEPOINT command;')
+            results.append((i, line, ok, duration))
+            if not ok and stop_on_error:
+                _rollback('batch', batch_templates)
+                break
+    except BaseException:
+        # Interrupted: nothing must be saved
+        _rollback('batch', batch_templates)
+        raise
+    finally:
+        db.execute('RELEASE SAVEPOINT batch;')
+    return results
+
+
+def batch_summary(results, stop_on_error=True):
+    """Return the text summing up the results of batch()."""
+    failed = [r for r in results if not r[2]]
+    total = sum(r[3] for r in results)
+    table = terminal.tabulate(
+        [('line', 'command', 'status', 'time')]
+        + [(str(i), line, 'ok' if ok else 'FAILED',
+            f'{duration * 1000:.1f} ms')
+           for i, line, ok, duration in results])
+    if failed and stop_on_error:
+        conclusion = f'Stopped at line {failed[0][0]}: no change has been ' \
+            f'saved.'
+    else:
+        conclusion = f'{len(results) - len(failed)} command(s) succeeded, ' \
+            f'{len(failed)} failed (and their changes have been ignored).'
+    return f'{table}\nTotal: {total * 1000:.1f} ms. {conclusion}'
+
+
+def loop(group, read=input):
+    """Read and execute command lines until the user quits."""
+    if readline is not None:
+        if os.path.isfile(USER_SHELL_HISTORY_PATH):
+            readline.read_history_file(USER_SHELL_HISTORY_PATH)
+        readline.set_history_length(SHELL_HISTORY_LENGTH)
+        readline.set_completer_delims(' \t\n')
+        readline.set_completer(_completer(group))
+        readline.parse_and_bind('tab: complete')
+    click.echo(f'Type a {PROG_NAME} command (without "{PROG_NAME.lower()}"),'
+               f' "--help" to list them or "exit" to quit.')
+    try:
+        while True:
+            try:
+                line = read(PROMPT)
+            except EOFError:
+                click.echo()
+                break
+            except KeyboardInterrupt:
+                click.echo()
+                continue
+            if line.strip() in QUIT_COMMANDS:
+                break
+            execute(group, line)
+    finally:
+        if readline is not None:
+            os.makedirs(os.path.dirname(USER_SHELL_HISTORY_PATH),
+                        exist_ok=True)
+            readline.write_history_file(USER_SHELL_HISTORY_PATH)
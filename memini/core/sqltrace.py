@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+Opt-in tracing of the SQL statements (global option --trace-sql).
+
+While tracing is on, database.connect() opens TracingConnection objects.
+Their cursors time each statement (including the time spent fetching its
+rows) and count its rows; sqlite's progress handler counts the virtual
+machine steps it takes, and its trace callback the statements actually run
+(triggers' ones included). At each commit, rollback and when closing, the
+statements are appended as JSON lines to the trace file, along with their
+query plan if they have been slow. summary() reads this file back.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import itertools
+import threading
+
+from .env import USER_SQL_TRACE_PATH
+from .prefs import SQL_SLOW_MS, SQL_PROGRESS_STEPS
+
+_enabled = False
+_run = None  # Identifies the current command's run
+_command = None  # Name of the command the statements are attributed to
+_runs = itertools.count(1)
+_file_lock = threading.Lock()
+
+# Only the plans of these statements can be explained
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+
+def enable(command):
+    """
+    Trace the statements of the connections opened from now on, attributing
+    them to command (until enable() is called again).
+    """
+    global _enabled, _run, _command
+    _enabled = True
+    _run = f'{os.getpid()}-{time.time():.0f}-{next(_runs)}'
+    _command = command
+
+
+def disable():
+    """Stop tracing the connections opened from now on."""
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+class TracingConnection(sqlite3.Connection):
+    """A sqlite3 connection recording the statements run by its cursors."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.records = []
+        self.active = None  # Record of the statement being run or fetched
+        self.set_trace_callback(self._traced)
+        self.set_progress_handler(self._progress, SQL_PROGRESS_STEPS)
+
+    def _traced(self, sql):
+        if self.active is not None:
+            self.active['statements'] += 1
+
+    def _progress(self):
+        if self.active is not None:
+            self.active['steps'] += SQL_PROGRESS_STEPS
+        return 0  # Do not interrupt the statement
+
+    def record(self, sql, params):
+        """Start recording a new statement and return its record."""
+        record = {'run': _run, 'command': _command, 'sql': sql,
+                  'params': params, 'seconds': 0, 'rows': 0, 'steps': 0,
+                  'statements': 0, 'time': round(time.time(), 6)}
+        self.records.append(record)
+        return record
+
+    def resume(self, record):
+        """
+        Make record the active one (until pause() is called); return what
+        pause() needs.
+        """
+        previous, self.active = self.active, record
+        return previous, time.perf_counter()
+
+    def pause(self, record, previous, start):
+        record['seconds'] += time.perf_counter() - start
+        self.active = previous
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TracingCursor)
+
+    # sqlite3's shortcuts do not call cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def _timed(self, name, method):
+        record = self.record(name, ())
+        state = self.resume(record)
+        try:
+            method()
+        finally:
+            self.pause(record, *state)
+        self.flush()
+
+    def commit(self):
+        self._timed('COMMIT', super().commit)
+
+    def rollback(self):
+        self._timed('ROLLBACK', super().rollback)
+
+    def close(self):
+        self.flush()
+        super().close()
+
+    def _plan(self, sql, params):
+        """Return the query plan of the statement, if it can be explained."""
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        previous, self.active = self.active, None
+        try:
+            cursor = sqlite3.Cursor(self)  # Not traced
+            return [row[3] for row in
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+        except (sqlite3.Error, ValueError):  # e.g. the table is gone
+            return None
+        finally:
+            self.active = previous
+
+    def flush(self):
+        """
+        Append the recorded statements to the trace file, with the query
+        plan of the slow ones, and forget them.
+        """
+        records, self.records = self.records, []
+        lines = []
+        for record in records:
+            params = record.pop('params')
+            record['ms'] = round(record.pop('seconds') * 1000, 3)
+            record['plan'] = self._plan(record['sql'], params) \
+                if record['ms'] >= SQL_SLOW_MS else None
+            lines.append(json.dumps(record) + '\n')
+        if lines:
+            os.makedirs(os.path.dirname(USER_SQL_TRACE_PATH), exist_ok=True)
+            with _file_lock, open(USER_SQL_TRACE_PATH, 'a') as f:
+                f.writelines(lines)
+
+
+class TracingCursor(sqlite3.Cursor):
+    """A sqlite3 cursor timing its statements and counting their rows."""
+    _record = None
+
+    def _execute(self, method, sql, params, *args):
+        self._record = record = self.connection.record(sql, params)
+        state = self.connection.resume(record)
+        try:
+            method(*args)
+        finally:
+            self.connection.pause(record, *state)
+        if self.description is None:
+            record['rows'] = max(self.rowcount, 0)
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._execute(super().execute, sql, parameters,
+                             sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        first = seq_of_parameters[0] if seq_of_parameters else ()
+        return self._execute(super().executemany, sql, first,
+                             sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._execute(super().executescript, sql_script, (),
+                             sql_script)
+
+    def _fetch(self, method, *args):
+        record = self._record
+        if record is None:
+            return method(*args)
+        state = self.connection.resume(record)
+        try:
+            return method(*args)
+        finally:
+            self.connection.pause(record, *state)
+
+    def __next__(self):
+        row = self._fetch(super().__next__)  # StopIteration at the end
+        self._record['rows'] += 1
+        return row
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is not None:
+            self._record['rows'] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(super().fetchmany,
+                           self.arraysize if size is None else size)
+        if self._record is not None:
+            self._record['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        if self._record is not None:
+            self._record['rows'] += len(rows)
+        return rows
+
+
+def _normalize(sql):
+    """Replace the literals by ? and collapse the blanks of a statement."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    return ' '.join(sql.split())
+
+
+def _read(path):
+    """Yield the records of the trace file (skipping damaged lines)."""
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:  # e.g. a line cut by a crash
+                continue
+
+
+def clear():
+    """Delete the trace file."""
+    if os.path.isfile(USER_SQL_TRACE_PATH):
+        os.remove(USER_SQL_TRACE_PATH)
+
+
+def summary(command=None):
+    """
+    Summarise the trace file: return, for each command (the slowest first,
+    only the one named command if it is not None), a dict telling how many
+    times it has been run, how many statements it ran and how long they
+    took, along with the statistics of its statements (the slowest first).
+    Statements only differing by their literals are counted together.
+    """
+    commands = {}
+    for record in _read(USER_SQL_TRACE_PATH):
+        if command is not None and record['command'] != command:
+            continue
+        cmd = commands.setdefault(record['command'],
+                                  {'command': record['command'], 'runs': set(),
+                                   'statements': 0, 'ms': 0, 'stats': {}})
+        cmd['runs'].add(record['run'])
+        cmd['statements'] += 1
+        cmd['ms'] += record['ms']
+        sql = _normalize(record['sql'])
+        stats = cmd['stats'].setdefault(sql, {'sql': sql, 'calls': 0,
+                                              'ms': 0, 'max_ms': 0,
+                                              'rows': 0, 'steps': 0,
+                                              'plan': None})
+        stats['calls'] += 1
+        stats['ms'] += record['ms']
+        stats['max_ms'] = max(stats['max_ms'], record['ms'])
+        stats['rows'] += record['rows']
+        stats['steps'] += record['steps']
+        if record['plan'] is not None:
+            stats['plan'] = record['plan']
+    result = []
+    for cmd in sorted(commands.values(), key=lambda c: c['ms'], reverse=True):
+        cmd['runs'] = len(cmd['runs'])
+        cmd['stats'] = sorted(cmd['stats'].values(), key=lambda s: s['ms'],
+                              reverse=True)
+        result.append(cmd)
+    return result
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+Statistics of the users' tables, kept up to date by triggers: the numbers of
+rows and of free rows (never drawn, or reset: their timestamp is 0), and the
+length of the longest cell of each column. Each database has its own
+catalog, since triggers cannot write to another database.
+
+A table's statistics are computed the first time they are needed, and then
+maintained. Deleting or shortening the longest cell of a column makes its
+width unknown (NULL), rather than scanning the table at once: it is computed
+again the next time it is needed.
+"""
+
+from contextlib import contextmanager
+
+from . import shared
+from .shared import INTERNAL_PREFIX, MAXI_COL_NB, STATS_TABLE, split_name
+
+_WIDTHS = [f'width{i + 1}' for i in range(MAXI_COL_NB)]
+_EVENTS = ['insert', 'delete', 'update']
+
+
+def _catalog(name):
+    """Return the catalog of the database of table name."""
+    return f'{split_name(name)[0]}.{STATS_TABLE}'
+
+
+def _catalog_exists(name):
+    db = shared.get_db()
+    return db.execute(f'SELECT 1 FROM {split_name(name)[0]}.sqlite_master '
+                      f'WHERE type=\'table\' AND name = ?;',
+                      (STATS_TABLE, )).fetchone() is not None
+
+
+def _trigger(name, event):
+    db_name, table_name = split_name(name)
+    return f'{db_name}.{INTERNAL_PREFIX}stats_{table_name}_{event}'
+
+
+def _length(row, title):
+    return f'IFNULL(LENGTH({row}.{title}), 0)'
+
+
+def _add_triggers(name, col_titles):
+    """Make the changes of the rows of table name update its statistics."""
+    db = shared.get_db()
+    table_name = split_name(name)[1]
+    where = f'WHERE name = \'{table_name}\''
+    widths = list(zip(_WIDTHS, col_titles))
+    grow = ''.join(f', {w} = MAX({w}, {_length("new", t)})'
+                   for w, t in widths)
+    shrink = ''.join(f', {w} = CASE WHEN {_length("old", t)} < {w} '
+                     f'THEN {w} END' for w, t in widths)
+    change = ''.join(f', {w} = CASE WHEN {_length("new", t)} >= {w} '
+                     f'THEN {_length("new", t)} '
+                     f'WHEN {_length("old", t)} < {w} THEN {w} END'
+                     for w, t in widths)
+    db.execute(f'CREATE TRIGGER {_trigger(name, "insert")} '
+               f'AFTER INSERT ON {table_name} BEGIN '
+               f'UPDATE {STATS_TABLE} SET rows_nb = rows_nb + 1, '
+               f'free_nb = free_nb + (new.timestamp IS 0){grow} {where}; '
+               f'END;')
+    db.execute(f'CREATE TRIGGER {_trigger(name, "delete")} '
+               f'AFTER DELETE ON {table_name} BEGIN '
+               f'UPDATE {STATS_TABLE} SET rows_nb = rows_nb - 1, '
+               f'free_nb = free_nb - (old.timestamp IS 0){shrink} {where}; '
+               f'END;')
+    db.execute(f'CREATE TRIGGER {_trigger(name, "update")} '
+               f'AFTER UPDATE ON {table_name} BEGIN '
+               f'UPDATE {STATS_TABLE} SET free_nb = free_nb '
+               f'+ (new.timestamp IS 0) - (old.timestamp IS 0){change} '
+               f'{where}; END;')
+
+
+def _drop_triggers(name):
+    db = shared.get_db()
+    for event in _EVENTS:
+        db.execute(f'DROP TRIGGER IF EXISTS {_trigger(name, event)};')
+
+
+def created(name, col_titles):
+    """
+    Compute the statistics of the new table name (possibly holding rows
+    already), and keep them up to date.
+    """
+    db = shared.get_db()
+    widths = _WIDTHS[:len(col_titles)]
+    db.execute(f'CREATE TABLE IF NOT EXISTS {_catalog(name)} '
+               f'(name TEXT PRIMARY KEY, rows_nb INTEGER NOT NULL, '
+               f'free_nb INTEGER NOT NULL, '
+               f'{", ".join(f"{w} INTEGER" for w in _WIDTHS)});')
+    lengths = ''.join(f', IFNULL(MAX(LENGTH({t})), 0)' for t in col_titles)
+    db.execute(f'INSERT OR REPLACE INTO {_catalog(name)} '
+               f'(name, rows_nb, free_nb, {", ".join(widths)}) '
+               f'SELECT ?, COUNT(*), IFNULL(SUM(timestamp IS 0), 0){lengths} '
+               f'FROM {name};', (split_name(name)[1], ))
+    _drop_triggers(name)
+    _add_triggers(name, col_titles)
+
+
+def dropped(name):
+    """Forget the statistics of the dropped table name."""
+    if _catalog_exists(name):
+        shared.get_db().execute(f'DELETE FROM {_catalog(name)} '
+                                f'WHERE name = ?;', (split_name(name)[1], ))
+
+
+def renamed(name, new_name, col_titles):
+    """Report the new name of table name (renamed as new_name)."""
+    if not _catalog_exists(name):
+        return
+    db = shared.get_db()
+    _drop_triggers(name)
+    if db.execute(f'UPDATE {_catalog(name)} SET name = ? WHERE name = ?;',
+                  (split_name(new_name)[1], split_name(name)[1])).rowcount:
+        _add_triggers(new_name, col_titles)
+
+
+@contextmanager
+def appending(name, col_titles, added):
+    """
+    Update the statistics of table name with the ones of the rows appended
+    inside the with block, added (their number, the number of free ones and
+    the lengths of their longest cells, None if unknown), rather than row
+    by row, by the triggers.
+    """
+    db = shared.get_db()
+    table_name = split_name(name)[1]
+    if not _catalog_exists(name) \
+            or db.execute(f'SELECT 1 FROM {_catalog(name)} WHERE name = ?;',
+                          (table_name, )).fetchone() is None:
+        # The statistics will be computed when they are first needed
+        yield
+        return
+    _drop_triggers(name)
+    try:
+        yield
+        # Only rows that were actually appended are counted
+        rows_nb, free_nb, widths = added
+        grow = ''.join(f', {w} = MAX({w}, ?)'
+                       for w in _WIDTHS[:len(col_titles)])
+        db.execute(f'UPDATE {_catalog(name)} SET rows_nb = rows_nb + ?, '
+                   f'free_nb = free_nb + ?{grow} WHERE name = ?;',
+                   (rows_nb, free_nb, *widths, table_name))
+    finally:
+        _add_triggers(name, col_titles)
+
+
+def get(name, col_titles, compute=True):
+    """
+    Return the number of rows, the number of free rows and the widths of the
+    columns of table name. The unknown widths are computed, unless compute
+    is False (then they are None).
+    """
+    db = shared.get_db()
+    table_name = split_name(name)[1]
+    widths = _WIDTHS[:len(col_titles)]
+    cmd = f'SELECT rows_nb, free_nb, {", ".join(widths)} ' \
+        f'FROM {_catalog(name)} WHERE name = ?;'
+    row = db.execute(cmd, (table_name, )).fetchone() \
+        if _catalog_exists(name) else None
+    if row is None:
+        created(name, col_titles)
+        row = db.execute(cmd, (table_name, )).fetchone()
+    unknown = [(w, t) for w, t, value in zip(widths, col_titles, row[2:])
+               if value is None]
+    if compute and unknown:
+        lengths = ', '.join(f'{w} = (SELECT IFNULL(MAX(LENGTH({t})), 0) '
+                            f'FROM {name})' for w, t in unknown)
+        db.execute(f'UPDATE {_catalog(name)} SET {lengths} WHERE name = ?;',
+                   (table_name, ))
+        row = db.execute(cmd, (table_name, )).fetchone()
+    return row[0], row[1], list(row[2:])
@@ -20,33 +20,57 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
 import os
+import gzip
 import json
-import shutil
-
 import datetime
+import tempfile
 from glob import glob
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
+from . import profiling
 from .env import USER_SWEEPSTAKES_PATH
-from .prefs import SWEEPSTAKES_MAX
+from .prefs import SWEEPSTAKES_MAX, ENCODING
 from .errors import NoSuchSweepstakeError
 
 
-def _serialize(rows):
-    return {i: list(row) for i, row in enumerate(rows)}
+# Sweepstakes were formerly stored as indented, index-keyed, JSON dicts
+LEGACY_EXT = '.json'
+EXT = '.json.gz'
+
+
+def _serialize(table_name, rows):
+    """Turn a sweepstake into compact, gzip-compressed, JSON."""
+    data = json.dumps([table_name, rows], ensure_ascii=False,
+                      separators=(',', ':'))
+    return gzip.compress(data.encode(ENCODING))
 
 
 def _deserialize(data):
+    """Turn compressed data back into the table's name and the rows."""
+    table_name, rows = json.loads(gzip.decompress(data).decode(ENCODING))
+    return [(table_name, )] + [tuple(row) for row in rows]
+
+
+def _deserialize_legacy(data):
+    """Turn a legacy sweepstake's dict back into the table's name and rows."""
     return [tuple(v) for v in data.values()]
 
 
 def _new_sweepstake():
     dt = str(datetime.datetime.now().replace(microsecond=0)).replace(' ', '@')
-    return os.path.join(USER_SWEEPSTAKES_PATH, f'1_{dt}.json')
+    return os.path.join(USER_SWEEPSTAKES_PATH, f'1_{dt}{EXT}')
 
 
 def _get_sweepstakes():
     return sorted(
-        [f for f in glob(os.path.join(USER_SWEEPSTAKES_PATH, '*.json'))])
+        [f for ext in [LEGACY_EXT, EXT]
+         for f in glob(os.path.join(USER_SWEEPSTAKES_PATH, f'*{ext}'))])
 
 
 def list_sweepstakes():
@@ -55,11 +79,49 @@ def list_sweepstakes():
 
 def _get_sweepstake_name(sw_id=1):
     for name in list_sweepstakes():
-        if name.startswith(f'{sw_id}_') and name.endswith('.json'):
+        if name.startswith(f'{sw_id}_'):
             return os.path.join(USER_SWEEPSTAKES_PATH, name)
     raise NoSuchSweepstakeError(sw_id=sw_id)
 
 
+@contextmanager
+def _lock():
+    """
+    Hold an exclusive (advisory) lock on the sweepstakes directory, so that
+    concurrent processes do not rotate and write sweepstakes simultaneously.
+    """
+    os.makedirs(USER_SWEEPSTAKES_PATH, exist_ok=True)
+    with open(os.path.join(USER_SWEEPSTAKES_PATH, '.lock'), 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_atomically(path, data):
+    """
+    Write data to a temporary file first, then move it to path, so that no
+    partially written sweepstake can ever be read.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
 def _rotate_sweepstakes():
     for f in reversed(sorted(_get_sweepstakes())):
         b = os.path.basename(f)
@@ -69,16 +131,21 @@ def _rotate_sweepstakes():
         else:
             new_name = os.path.join(USER_SWEEPSTAKES_PATH,
                                     str(f_id + 1) + f"_{b.split('_')[1]}")
-            shutil.move(f, new_name)
+            os.replace(f, new_name)
 
 
+@profiling.span('sweepstakes.store')
 def store_sweepstake(table_name, rows):
-    _rotate_sweepstakes()
-    with open(_new_sweepstake(), 'w') as f:
-        json.dump(_serialize([(table_name, )] + rows), f, indent=4)
-        f.write('\n')
+    with _lock():
+        with profiling.span('sweepstakes.rotate'):
+            _rotate_sweepstakes()
+        _write_atomically(_new_sweepstake(), _serialize(table_name, rows))
 
 
 def load_sweepstake(sw_id=1):
-    with open(_get_sweepstake_name(sw_id), 'r') as f:
-        return _deserialize(json.load(f))
+    name = _get_sweepstake_name(sw_id)
+    if name.endswith(LEGACY_EXT):
+        with open(name, 'r') as f:
+            return _deserialize_legacy(json.load(f))
+    with open(name, 'rb') as f:
+        return _deserialize(f.read())
@@ -68,6 +68,7 @@ def create(table_name):
     with open(CONTENTXML_PATH, 'w', encoding=ENCODING) as f:
         f.write(_prepare_content(table_name))
     zipped = shutil.make_archive(table_name, 'zip', TEMPLATE_DIR)
+    os.makedirs(USER_TEMPLATES_PATH, exist_ok=True)
     shutil.move(zipped, path(table_name))
     os.remove(CONTENTXML_PATH)
 
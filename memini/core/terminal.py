@@ -23,6 +23,8 @@ import shutil
 from textwrap import wrap
 from itertools import zip_longest
 
+import click
+
 from .prefs import TERMINAL_SIZE_FALLBACK
 
 
@@ -96,28 +98,52 @@ def _expand_rows(rows, widths):
     return result
 
 
-def tabulate(rows, vsep=None, hsep=None, isep=None):
-    """Tabulate the given rows. First row is assumed to contain the headers."""
+def tabulate_lines(rows, widths, vsep=None, hsep=None, isep=None):
+    """
+    Tabulate the given rows, line by line. First row is assumed to contain
+    the headers. rows may be any iterable, only one row at a time is
+    processed. widths are the lengths of the longest texts of each column.
+    """
     if vsep is None:
         vsep = '|'
     if hsep is None:
         hsep = '-'
     if isep is None:
         isep = '+'
-    cols = []
-    for i, _ in enumerate(rows[0]):
-        cols.append([rows[j][i] for j in range(len(rows))])
-    widths = []
-    for col in cols:
-        widths.append(max({len(text) for text in col}) + 2)
-    widths = _allocate_widths(widths)
-    rows = _expand_rows(rows, widths)
-    headers = vsep.join([_hcenter(text, width)
-                         for (text, width) in zip(rows[0], widths)])
-    ruler = isep.join([hsep * w for w in widths])
-    content = []
-    for r in rows[1:]:
-        content.append(vsep.join([_hcenter(text, width)
-                                  for (text, width) in zip(r, widths)]))
-    table = [headers, ruler, *content]
-    return '\n'.join(table)
+    widths = _allocate_widths([w + 2 for w in widths])
+    rows = iter(rows)
+    headers = _expand_rows([next(rows)], widths)
+    yield vsep.join([_hcenter(text, width)
+                     for (text, width) in zip(headers[0], widths)])
+    yield isep.join([hsep * w for w in widths])
+    for row in headers[1:]:
+        yield vsep.join([_hcenter(text, width)
+                         for (text, width) in zip(row, widths)])
+    for row in rows:
+        for r in _expand_rows([row], widths):
+            yield vsep.join([_hcenter(text, width)
+                             for (text, width) in zip(r, widths)])
+
+
+def tabulate(rows, vsep=None, hsep=None, isep=None):
+    """Tabulate the given rows. First row is assumed to contain the headers."""
+    widths = [max({len(text) for text in col}) for col in zip(*rows)]
+    return '\n'.join(tabulate_lines(rows, widths, vsep=vsep, hsep=hsep,
+                                    isep=isep))
+
+
+def fits(lines_nb):
+    """Tell if lines_nb lines can be displayed at once in the terminal."""
+    return lines_nb <= shutil.get_terminal_size(TERMINAL_SIZE_FALLBACK).lines
+
+
+def echo_lines(lines, pager=False):
+    """
+    Print lines one by one, to standard output or through a pager (if pager
+    is True).
+    """
+    if pager:
+        click.echo_via_pager(f'{line}\n' for line in lines)
+    else:
+        for line in lines:
+            print(line)
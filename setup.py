@@ -15,7 +15,7 @@ setup(
     long_description=readme,
     name='memini',
     version='0.1.0',
-    python_requires='==3.*,>=3.6.0',
+    python_requires='==3.*,>=3.7.0',
     author='Nicolas Hainaux',
     author_email='nh.techn@gmail.com',
     entry_points={"console_scripts": ["memini = memini:run"]},
@@ -39,3 +39,11 @@ def testdb():
     # like RENAME...
     shared.db.execute('ROLLBACK TO SAVEPOINT starttest;')
     testdb_conn.close()
+
+
+@pytest.fixture(autouse=True)
+def databases(tmp_path, mocker):
+    """Keep the attached databases of the tests out of the user's files."""
+    path = tmp_path / 'databases'
+    mocker.patch('memini.core.database.USER_DATABASES_PATH', str(path))
+    return path
@@ -19,10 +19,14 @@
 # along with Memini; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import re
+import random
+
 import pytest
 
 from memini.core.prefs import ENCODING
 from memini.core.parser import parse_pattern, parse_line, parse_file
+from memini.core.parser import line_parser
 from memini.core.errors import MissingSeparatorError
 from memini.core.errors import LineDoesNotMatchError
 from memini.core.errors import EmptyFileError
@@ -105,3 +109,77 @@ def test_parse_empty_file(mocker):
     assert str(excinfo.value) == 'The provided file seems empty, could not '\
         'find a single line to parse.'
     m.assert_called_once_with('empty_file.txt', encoding=ENCODING)
+
+
+def test_line_parser():
+    for fast in [True, False]:
+        parse = line_parser('<Latin>:<Français>', fast=fast)
+        assert parse('ambitio, onis, f. : ambition') \
+            == ('ambitio, onis, f.', 'ambition')
+        assert parse('a : b : c') == ('a', 'b : c')
+        assert parse('acies, ei, f ligne de bataille') is None
+        parse = line_parser('« <a> » - <b> ;', fast=fast)
+        assert parse('« x » - » - y ;') == ('x', '» - y')
+        assert parse('« x » - y') is None
+        parse = line_parser('ab<a>-<b>ba', fast=fast)
+        assert parse('ab-ba') == ('', '')
+        assert parse('aba') is None
+        # Like the reference, [ and ] make a character class
+        parse = line_parser('[<a>] - <b>', fast=fast)
+        assert parse('[x] - y') is None
+        assert parse('. - y') == ('y', )
+
+
+def test_parse_file_fast_and_reference(mocker):
+    content = """gaudium,  i, n. : joie
+
+jungo,  is, ere, junxi, junctum joindre
+nosco,  is, ere, novi, notum : apprendre : pf. savoir
+"""
+    mocker.patch('builtins.open', mocker.mock_open(read_data=content))
+    assert parse_file('f.txt', '<Latin>:<Français>') \
+        == parse_file('f.txt', '<Latin>:<Français>', fast=False) \
+        == ([('gaudium,  i, n.', 'joie'),
+             ('nosco,  is, ere, novi, notum', 'apprendre : pf. savoir')],
+            ['jungo,  is, ere, junxi, junctum joindre'])
+
+
+def _outcome(parse, *args):
+    """Return the result of parse, or the type of the error it raised."""
+    try:
+        return parse(*args)
+    except LineDoesNotMatchError:
+        return None
+    except Exception as e:  # e.g. a pattern like <a>|<b> leaves a group out
+        return type(e)
+
+
+def test_line_parser_fuzz():
+    # The fast parser must give exactly the results of the reference regex
+    rnd = random.Random(43)
+    sep_chars = [':', ' ', '-', ';', ',', 'é', 'ab', '<', '>', '«', '—',
+                 '.', '|', '(', '\n', '\t']
+    field_chars = sep_chars + ['x', 'y', 'Ω', '語', '  ']
+
+    def text(chars, nb):
+        return ''.join(rnd.choice(chars) for _ in range(nb))
+
+    for _ in range(3000):
+        tags = rnd.randint(1, 4)
+        texts = [text(sep_chars, rnd.randint(0, 2))] \
+            + [text(sep_chars, rnd.randint(1, 3)) for _ in range(tags - 1)] \
+            + [text(sep_chars, rnd.randint(0, 2))]
+        pattern = texts[0] + ''.join(f'<t{i}>' + t
+                                     for i, t in enumerate(texts[1:]))
+        try:
+            parse = line_parser(pattern)
+        except (MissingSeparatorError, re.error):  # Like the reference
+            continue
+        lines = [text(field_chars, rnd.randint(0, 12)) for _ in range(3)]
+        # Lines built after the pattern, with separators in the fields too
+        lines += [texts[0] + ''.join(text(field_chars, rnd.randint(0, 6))
+                                     + t for t in texts[1:])
+                  for _ in range(5)]
+        for line in lines:
+            assert _outcome(parse, line) \
+                == _outcome(parse_line, pattern, line), (pattern, line)
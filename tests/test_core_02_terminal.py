@@ -107,3 +107,30 @@ def test_tabulate(testdb):
         " id | col1 |   col2  \n"\
         "----+------+---------\n"\
         "  1 |      | arrivée "
+
+
+def test_tabulate_lines():
+    def rows():
+        yield ('id', 'col1', 'col2')
+        yield ('1', 'adventus,  us, m.', 'arrivée')
+        yield ('2', 'aqua , ae, f', 'eau')
+    lines = terminal.tabulate_lines(rows(), [2, 17, 7])
+    assert next(lines) == " id |        col1       |   col2  "
+    assert list(lines) == ["----+-------------------+---------",
+                           "  1 | adventus,  us, m. | arrivée ",
+                           "  2 |    aqua , ae, f   |   eau   "]
+
+
+def test_fits(mocker):
+    TSize = namedtuple('TSize', 'columns lines')
+    mocker.patch('shutil.get_terminal_size', return_value=TSize(80, 24))
+    assert terminal.fits(24)
+    assert not terminal.fits(25)
+
+
+def test_echo_lines(capsys, mocker):
+    terminal.echo_lines(iter(['line 1', 'line 2']))
+    assert capsys.readouterr().out == 'line 1\nline 2\n'
+    m = mocker.patch('click.echo_via_pager')
+    terminal.echo_lines(iter(['line 1', 'line 2']), pager=True)
+    assert list(m.call_args[0][0]) == ['line 1\n', 'line 2\n']
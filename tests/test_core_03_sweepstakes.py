@@ -20,13 +20,17 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
 import os
+import sys
 import datetime
+import subprocess
 
 import pytest
 
-from memini.core.env import USER_SWEEPSTAKES_PATH
+from memini.core.env import USER_SWEEPSTAKES_PATH, TESTS_DIR
+from memini.core.prefs import SWEEPSTAKES_MAX
 from memini.core.errors import NoSuchSweepstakeError
 from memini.core.sweepstakes import _serialize, _deserialize
+from memini.core.sweepstakes import _deserialize_legacy
 from memini.core.sweepstakes import _new_sweepstake, _get_sweepstakes
 from memini.core.sweepstakes import list_sweepstakes
 from memini.core.sweepstakes import _get_sweepstake_name
@@ -70,16 +74,20 @@ def test_serialization():
     data = [('adventus,  us, m.', 'arrivée'),
             ('candidus,  a, um', 'blanc'),
             ('sol, solis, m', 'soleil')]
-    assert _serialize(data) == {
-        0: ['adventus,  us, m.', 'arrivée'],
-        1: ['candidus,  a, um', 'blanc'],
-        2: ['sol, solis, m', 'soleil']
-        }
-    assert _deserialize(_serialize(data)) == data
+    assert _deserialize(_serialize('table1', data)) == [('table1', )] + data
+
+
+def test_legacy_deserialization():
+    data = {'0': ['table1'],
+            '1': ['adventus,  us, m.', 'arrivée'],
+            '2': ['candidus,  a, um', 'blanc']}
+    assert _deserialize_legacy(data) == [('table1', ),
+                                         ('adventus,  us, m.', 'arrivée'),
+                                         ('candidus,  a, um', 'blanc')]
 
 
 def test_new_sweepstake(mocker, sw1):
-    assert _new_sweepstake() == sw1
+    assert _new_sweepstake() == sw1 + '.gz'
 
 
 def test_get_sweepstakes(fs, sweepstakes):
@@ -137,3 +145,40 @@ def test_store_load_sweepstakes(fs):
     fs.create_dir(USER_SWEEPSTAKES_PATH)
     store_sweepstake('table1', data)
     assert load_sweepstake() == [('table1', )] + data
+    # Sweepstakes stored in the legacy format can still be loaded
+    fs.create_file(os.path.join(USER_SWEEPSTAKES_PATH,
+                                '2_2020-07-01@15:13:22.json'),
+                   contents='{"0": ["table2"], "1": ["do", "did, done"]}')
+    assert load_sweepstake(2) == [('table2', ), ('do', 'did, done')]
+    assert list_sweepstakes() == ['1_2020-07-02@15:13:22.json.gz',
+                                  '2_2020-07-01@15:13:22.json']
+
+
+def test_concurrent_store_sweepstakes(tmp_path):
+    # Several processes store sweepstakes at the same time: none is lost
+    script = 'import sys\n'\
+        'from memini.core.sweepstakes import store_sweepstake\n'\
+        'for i in range(3):\n'\
+        '    store_sweepstake(\'table1\', [(sys.argv[1], str(i))])\n'
+    env = dict(os.environ, XDG_DATA_HOME=str(tmp_path),
+               PYTHONPATH=os.path.dirname(TESTS_DIR))
+    processes_nb = SWEEPSTAKES_MAX // 3
+    processes = [subprocess.Popen([sys.executable, '-c', script, str(n)],
+                                  env=env)
+                 for n in range(processes_nb)]
+    assert all(p.wait() == 0 for p in processes)
+    sw_dir = tmp_path / 'sweepstakes'
+    names = sorted(os.listdir(sw_dir))
+    assert '.lock' in names
+    names = [n for n in names if n.endswith('.json.gz')]
+    assert sorted(int(n.split('_')[0]) for n in names) \
+        == list(range(1, processes_nb * 3 + 1))
+    drawn = []
+    for name in names:
+        with open(sw_dir / name, 'rb') as f:
+            data = _deserialize(f.read())
+        assert data[0] == ('table1', )
+        drawn.append(data[1])
+    assert sorted(drawn) == sorted((str(n), str(i))
+                                   for n in range(processes_nb)
+                                   for i in range(3))
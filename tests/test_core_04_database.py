@@ -19,13 +19,17 @@
 # along with Memini; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import shutil
 import sqlite3
+import threading
 
 import pytest
 
-from memini.core.env import USER_SWEEPSTAKES_PATH
-from memini.core import shared
-from memini.core.database import Manager
+from memini.core.env import USER_SWEEPSTAKES_PATH, TEST_DB_PATH
+from memini.core import shared, stats
+from memini.core.shared import HISTORY_TABLE, SCHEDULE_TABLE
+from memini.core.history import record
+from memini.core.database import Manager, Pool, connect
 from memini.core.database import list_tables, table_exists
 from memini.core.database import _assert_table_exists, _assert_row_exists
 from memini.core.database import rename_table, get_table, table_to_text
@@ -35,14 +39,19 @@ from memini.core.database import get_rows_nb, copy_table, sort_table
 from memini.core.database import remove_rows, update_table, merge_tables
 from memini.core.database import _timestamp, _reset, _full_reset
 from memini.core.database import _intspan2sqllist, _original_name
+from memini.core.database import forget_rows, iter_table, get_widths
+from memini.core.database import clear_caches, get_tables_cols
+from memini.core.database import snapshot_table, list_databases
+from memini.core.database import get_stats, export_table
 from memini.core.errors import NoSuchTableError
 from memini.core.errors import NoSuchRowError, NoSuchColumnError
 from memini.core.errors import ColumnsDoNotMatchError
 from memini.core.errors import TooManyRowsRequiredError
-from memini.core.errors import DestinationExistsError
+from memini.core.errors import DestinationExistsError, CannotAttachError
+from memini.core.errors import InvalidTableNameError
 
 
-def test_Manager():
+def test_Manager(tmp_path):
     with Manager(':memory:') as db:
         cmd = """CREATE TABLE test1
                  (id INTEGER PRIMARY KEY, col1 INTEGER, col2 INTEGER)"""
@@ -52,12 +61,95 @@ def test_Manager():
     with pytest.raises(sqlite3.ProgrammingError) as excinfo:
         db.execute('SELECT 1 FROM test1;')
     assert str(excinfo.value) == 'Cannot operate on a closed database.'
+    # Missing directories are created
+    path = tmp_path / 'memini' / 'data.db'
+    with Manager(str(path)) as db:
+        db.execute('SELECT 1;')
+    assert path.is_file()
+
+
+def test_using(testdb):
+    default = shared.db
+    other = sqlite3.connect(':memory:').cursor()
+    seen = []
+    with shared.using(other):
+        assert shared.get_db() is other
+        # Other threads are not concerned
+        thread = threading.Thread(target=lambda: seen.append(shared.get_db()))
+        thread.start()
+        thread.join()
+    assert shared.get_db() is default
+    assert seen == [default]
+
+
+def test_Pool(tmp_path, mocker):
+    mocker.patch('memini.core.sweepstakes.USER_SWEEPSTAKES_PATH',
+                 str(tmp_path / 'sweepstakes'))
+    path = str(tmp_path / 'data.db')
+    shutil.copyfile(TEST_DB_PATH, path)
+    pool = Pool(path, size=2)
+    with pool.session():
+        assert list_tables() == ['table1', 'table2']
+    with pytest.raises(NoSuchTableError):
+        with pool.session(write=True):
+            rename_table('table1', 'table3')
+            remove_table('table4')
+    # The failed session has been rolled back
+    with pool.session():
+        assert list_tables() == ['table1', 'table2']
+    # Concurrent writers wait for each other
+    errors = []
+
+    def draw():
+        try:
+            with pool.session(write=True):
+                draw_rows('table2', 1)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=draw) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(pool._all) <= 2
+    pool.close()
+    with sqlite3.connect(path) as conn:
+        assert conn.execute(f'SELECT COUNT(*) FROM {HISTORY_TABLE};') \
+            .fetchone() == (8, )
+
+
+def test_Pool_failed_connection(tmp_path, mocker):
+    path = str(tmp_path / 'data.db')
+    shutil.copyfile(TEST_DB_PATH, path)
+    pool = Pool(path, size=1)
+    failures = [sqlite3.OperationalError('unable to open')]
+
+    def flaky_connect(path, **kwargs):
+        if failures:
+            raise failures.pop()
+        return connect(path, **kwargs)
+    mocker.patch('memini.core.database.connect', side_effect=flaky_connect)
+    with pytest.raises(sqlite3.OperationalError):
+        with pool.session():
+            pass
+    # The failed attempt did not keep the only slot
+    assert pool._slots.acquire(timeout=1)
+    pool._slots.release()
+    with pool.session():
+        assert list_tables() == ['table1', 'table2']
+    pool.close()
 
 
 def test_list_tables(testdb):
     assert list_tables() == ['table1', 'table2']
 
 
+def test_list_tables_hides_internal_tables(testdb):
+    record('table1', [1])
+    assert list_tables() == ['table1', 'table2']
+
+
 def test_table_exists(testdb):
     assert table_exists('table1')
     assert not table_exists('TABLE1')
@@ -83,6 +175,74 @@ def test_get_cols(testdb):
     assert get_cols('table1', include_id=True) == ['id', 'col1', 'col2']
     assert get_cols('table2', include_id=True) == ['id', 'col1', 'col2',
                                                    'col3']
+    # Cached titles are updated whenever the schema changes
+    shared.db.execute('ALTER TABLE table1 RENAME COLUMN col2 TO col3;')
+    assert get_cols('table1') == ['col1', 'col3']
+    with pytest.raises(NoSuchTableError):
+        get_cols('table3')
+
+
+def test_clear_caches(testdb):
+    # Rolling back restores the schema's version number...
+    shared.db.execute('SAVEPOINT test;')
+    shared.db.execute('ALTER TABLE table1 RENAME COLUMN col2 TO col3;')
+    assert get_cols('table1') == ['col1', 'col3']
+    shared.db.execute('ROLLBACK TO SAVEPOINT test;')
+    shared.db.execute('ALTER TABLE table1 RENAME COLUMN col2 TO col4;')
+    # ...so the cache must then be cleared explicitly
+    clear_caches()
+    assert get_cols('table1') == ['col1', 'col4']
+
+
+def _computed_stats(name):
+    """Compute the statistics of table name from its rows."""
+    lengths = ', '.join(f'IFNULL(MAX(LENGTH({t})), 0)'
+                        for t in get_cols(name))
+    row = shared.db.execute(f'SELECT COUNT(*), '
+                            f'IFNULL(SUM(timestamp IS 0), 0), {lengths} '
+                            f'FROM {name};').fetchone()
+    return row[0], row[1], list(row[2:])
+
+
+def test_get_stats(testdb, fs):
+    fs.create_dir(USER_SWEEPSTAKES_PATH)
+    assert get_stats('table1') == (4, 4, [17, 7]) == _computed_stats('table1')
+    insert_rows('table1', [('ignis, is, m', 'feu')])
+    assert get_stats('table1') == (5, 5, [17, 7])
+    update_table('table1', 1, ['adventus, us, m', 'arrivée'])
+    assert get_stats('table1') == (5, 5, [16, 7]) == _computed_stats('table1')
+    remove_row('table1', 4)
+    assert get_stats('table1') == (4, 4, [16, 7]) == _computed_stats('table1')
+    draw_rows('table1', 3)
+    assert get_stats('table1') == (4, 1, [16, 7]) == _computed_stats('table1')
+    draw_rows('table1', 2, oldest_prevail=True)
+    assert get_stats('table1') == _computed_stats('table1')
+    snapshot_table('table1', 'copy1')
+    assert get_stats('copy1') == get_stats('table1')
+    merge_tables(['table1'], 'copy1')
+    assert get_stats('copy1') == (8, 4, [16, 7]) == _computed_stats('copy1')
+    assert get_stats('table1') == _computed_stats('table1')
+    sort_table('copy1', 2)
+    rename_table('copy1', 'copy2')
+    assert get_stats('copy2') == (8, 4, [16, 7]) == _computed_stats('copy2')
+    remove_rows('copy2', '1-8')
+    assert get_stats('copy2') == (0, 0, [0, 0])
+    remove_table('copy2')
+    assert shared.db.execute('SELECT name FROM _memini_stats;').fetchall() \
+        == [('table1', )]
+    with pytest.raises(NoSuchTableError):
+        get_stats('copy2')
+
+
+def test_get_stats_after_failed_append(testdb):
+    assert get_stats('table1') == (4, 4, [17, 7])
+    with pytest.raises(RuntimeError):
+        with stats.appending('table1', ['col1', 'col2'], (1, 1, [30, 3])):
+            raise RuntimeError
+    assert get_stats('table1') == (4, 4, [17, 7]) == _computed_stats('table1')
+    # The triggers keep the statistics up to date again
+    insert_rows('table1', [('ignis, is, m', 'feu')])
+    assert get_stats('table1') == (5, 5, [17, 7]) == _computed_stats('table1')
 
 
 def test_get_rows_nb(testdb):
@@ -115,6 +275,59 @@ def test_get_table(testdb):
             ('3', 'do', 'did, done', 'faire')]
 
 
+def test_iter_table(testdb):
+    assert list(iter_table('table2', limit=2, offset=1)) \
+        == [(2, 'break', 'broke, broken', 'casser'),
+            (3, 'do', 'did, done', 'faire')]
+    assert list(iter_table('table2', sort=3, offset=3)) \
+        == [(3, 'do', 'did, done', 'faire')]
+    assert len(list(iter_table('table2'))) == 4
+    with pytest.raises(NoSuchColumnError):
+        iter_table('table2', sort=4)
+    with pytest.raises(NoSuchTableError):
+        iter_table('table3')
+
+
+def test_iter_table_selection(testdb):
+    assert list(iter_table('table2', cols=['col3', 1],
+                           where=[('col2', '~', 'ke')])) \
+        == [(2, 'casser', 'break')]
+    assert list(iter_table('table2', cols=[1],
+                           where=[('col1', '=~', '^b'), (3, '=', 'casser')])) \
+        == [(2, 'break')]
+    assert list(iter_table('table2', cols=['col1'],
+                           where=[('col2', '=', 'did')])) == []
+    # Non-text cells are matched as text
+    assert list(iter_table('table2', cols=[1],
+                           where=[('id', '=~', '^[13]$')])) \
+        == [(1, 'begin'), (3, 'do')]
+    assert list(iter_table('table2', cols=[1], sort=1, id_as_text=True,
+                           limit=1)) == [('1', 'begin')]
+    insert_rows('table1', [('Étoile', 'star'), ('épée', 'sword')])
+    assert [r[2] for r in iter_table('table1', sort=1)] \
+        == ['arrivée', 'eau', 'blanc', 'soleil', 'star', 'sword']
+    assert [r[2] for r in iter_table('table1', sort=1, collation='nocase')] \
+        == ['arrivée', 'eau', 'blanc', 'soleil', 'star', 'sword']
+    assert [r[2] for r in iter_table('table1', sort=1, collation='unicode')] \
+        == ['arrivée', 'eau', 'blanc', 'sword', 'star', 'soleil']
+    with pytest.raises(NoSuchColumnError) as excinfo:
+        iter_table('table2', cols=['col4'])
+    assert str(excinfo.value) == 'Cannot find a column named "col4" in ' \
+        '"table2"'
+    with pytest.raises(NoSuchColumnError):
+        iter_table('table2', where=[(7, '=', 'do')])
+
+
+def test_get_widths(testdb):
+    assert get_widths('table2') == [1, 5, 13, 9]
+    assert get_widths('table2', limit=2, offset=2) == [1, 4, 11, 6]
+    assert get_widths('table2', sort=3, limit=1) == [1, 5, 13, 6]
+    assert get_widths('table2', cols=['col3'], where=[(1, '~', 'e')]) \
+        == [1, 9]
+    create_table('table3', ['col1', 'col2'])
+    assert get_widths('table3') == [0, 0, 0]
+
+
 def test_table_to_text(testdb):
     assert table_to_text('table1', '<Latin> : <Français>') \
         == """adventus,  us, m. : arrivée
@@ -135,6 +348,18 @@ do, did, done : faire
 give, gave, given : donner"""
 
 
+def test_export_table(testdb):
+    assert list(export_table('table1', '<Latin> {=} <Français>',
+                             chunk_size=3)) == \
+        ['adventus,  us, m. {=} arrivée\naqua , ae, f {=} eau\n'
+         'candidus,  a, um {=} blanc\n',
+         'sol, solis, m {=} soleil\n']
+    create_table('table3', ['col1', 'col2'])
+    assert list(export_table('table3', '<col1>:<col2>')) == []
+    with pytest.raises(ColumnsDoNotMatchError):
+        export_table('table1', '<Latin>')
+
+
 def test_rename_table(testdb):
     table1_content = table_to_text('table1', '<Latin> : <Français>')
     rename_table('table1', 'table4')
@@ -158,6 +383,123 @@ def test_copy_table(testdb):
         'already exists. Please rename or remove it before using this name.'
 
 
+def _kind(name):
+    """Return 'table' or 'view'."""
+    return shared.db.execute('SELECT type FROM sqlite_master WHERE name = ?;',
+                             (name, )).fetchone()[0]
+
+
+def test_snapshot_table(testdb, fs):
+    fs.create_dir(USER_SWEEPSTAKES_PATH)
+    table1 = get_table('table1')
+    snapshot_table('table1', 'copy1')
+    snapshot_table('copy1', 'copy2')
+    assert list_tables() == ['table1', 'table2', 'copy1', 'copy2']
+    assert get_tables_cols(['copy1']) == {'copy1': ['col1', 'col2']}
+    assert get_table('copy1') == get_table('copy2') == table1
+    assert _kind('copy1') == _kind('copy2') == 'view'
+    assert shared.db.execute('SELECT * FROM _memini_snapshots;').fetchall() \
+        == [('copy1', 'table1'), ('copy2', 'table1')]
+    with pytest.raises(DestinationExistsError):
+        snapshot_table('table2', 'copy1')
+    with pytest.raises(NoSuchTableError):
+        snapshot_table('table3', 'copy3')
+    # Changing a snapshot turns it into a table
+    draw_rows('copy1', 2, oldest_prevail=True)
+    assert _kind('copy1') == 'table'
+    assert _kind('copy2') == 'view'
+    assert get_table('table1') == table1
+    assert shared.db.execute('SELECT COUNT(*) FROM copy1 '
+                             'WHERE timestamp != 0;').fetchone()[0] == 2
+    assert shared.db.execute('SELECT COUNT(*) FROM table1 '
+                             'WHERE timestamp != 0;').fetchone()[0] == 0
+    # Changing the source turns its snapshots into tables first
+    sort_table('table1', 2)
+    assert _kind('copy2') == 'table'
+    assert get_table('copy2') == table1
+    assert get_table('table1') != table1
+    assert shared.db.execute('SELECT * FROM _memini_snapshots;').fetchall() \
+        == []
+    # Removing a snapshot leaves its source unchanged
+    snapshot_table('table2', 'copy3')
+    snapshot_table('table2', 'copy4')
+    remove_table('copy3')
+    assert list_tables() == ['table2', 'copy1', 'copy2', 'table1', 'copy4']
+    assert _kind('copy4') == 'view'
+    rename_table('copy4', 'copy5')
+    assert _kind('copy5') == 'table'
+    assert get_table('copy5') == get_table('table2')
+    snapshot_table('table2', 'copy6')
+    remove_table('table2')
+    assert get_table('copy6') == get_table('copy5')
+    assert _kind('copy6') == 'table'
+
+
+def test_invalid_table_names(testdb, databases):
+    with pytest.raises(InvalidTableNameError) as excinfo:
+        create_table('class6.all', ['col1'])
+    assert str(excinfo.value) == 'Cannot name a table "class6.all": SQLite '\
+        'rejects it (near "all": syntax error)'
+    # No database has been created
+    assert list_databases() == []
+    with pytest.raises(InvalidTableNameError):
+        copy_table('table1', 'if')
+    with pytest.raises(InvalidTableNameError):
+        rename_table('table1', 'select')
+    with pytest.raises(InvalidTableNameError):
+        snapshot_table('table1', 'my-copy')
+    assert list_tables() == ['table1', 'table2']
+    create_table('élèves', ['nom'])
+    assert table_exists('élèves')
+
+
+def test_attached_databases(testdb, databases):
+    assert list_databases() == []
+    assert not table_exists('class5b.verbs')
+    assert not databases.exists()
+    create_table('class5b.verbs', ['infinitive', 'past'],
+                 content=[('go', 'went'), ('be', 'was'), ('do', 'did')])
+    assert (databases / 'class5b.db').is_file()
+    assert list_databases() == ['class5b']
+    assert list_tables() == ['table1', 'table2', 'class5b.verbs']
+    assert table_exists('class5b.verbs')
+    assert not table_exists('verbs')
+    assert get_cols('class5b.verbs') == ['infinitive', 'past']
+    assert get_tables_cols(['table1', 'class5b.verbs', 'class5b.nope']) \
+        == {'table1': ['col1', 'col2'],
+            'class5b.verbs': ['infinitive', 'past']}
+    sort_table('class5b.verbs', 1)
+    remove_row('class5b.verbs', 3)
+    assert get_table('class5b.verbs') == [('1', 'be', 'was'),
+                                          ('2', 'do', 'did')]
+    # Views cannot show another database's tables
+    snapshot_table('class5b.verbs', 'class5b.copy')
+    assert shared.db.execute('SELECT type FROM class5b.sqlite_master '
+                             'WHERE name = \'copy\';').fetchone()[0] == 'view'
+    snapshot_table('class5b.copy', 'verbs')
+    assert _kind('verbs') == 'table'
+    merge_tables(['class5b.verbs'], 'verbs')
+    assert get_rows_nb('verbs') == 4
+    assert get_rows_nb('class5b.copy') == 2
+    rename_table('class5b.copy', 'class6a.verbs')
+    assert list_tables() == ['table1', 'table2', 'verbs', 'class5b.verbs',
+                             'class6a.verbs']
+    assert get_table('class6a.verbs') == get_table('class5b.verbs')
+    remove_table('class5b.verbs')
+    assert list_tables() == ['table1', 'table2', 'verbs', 'class6a.verbs']
+    with pytest.raises(NoSuchTableError):
+        get_cols('class7.verbs')
+    assert not (databases / 'class7.db').exists()
+    with pytest.raises(CannotAttachError) as excinfo:
+        create_table('temp.verbs', ['infinitive', 'past'])
+    assert str(excinfo.value) == 'Cannot use the database "temp": this is '\
+        'not a valid name'
+    with pytest.raises(CannotAttachError) as excinfo:
+        for i in range(10):
+            create_table(f'class{i}.verbs', ['infinitive', 'past'])
+    assert 'too many attached databases' in str(excinfo.value)
+
+
 def test_update_table(testdb):
     update_table('table1', 3, ['spes, ei f', 'espoir'])
     assert get_table('table1') == \
@@ -278,6 +620,44 @@ def test_merge_tables(testdb):
             ]
 
 
+def test_get_tables_cols(testdb):
+    assert get_tables_cols(['table2', 'table1', 'table3']) \
+        == {'table1': ['col1', 'col2'], 'table2': ['col1', 'col2', 'col3']}
+    assert get_tables_cols([]) == {}
+
+
+def test_merge_several_tables(testdb, mocker):
+    create_table('table3', ['col3', 'col4'], [('spes, ei f', 'espoir')])
+    create_table('table4', ['A', 'B'], [('amor,  oris, m.', 'amour')])
+    merge_tables(['table3', 'table1', 'table3'], 'table4')
+    assert get_table('table4') \
+        == [('1', 'amor,  oris, m.', 'amour'),
+            ('2', 'spes, ei f', 'espoir'),
+            ('3', 'adventus,  us, m.', 'arrivée'),
+            ('4', 'aqua , ae, f', 'eau'),
+            ('5', 'candidus,  a, um', 'blanc'),
+            ('6', 'sol, solis, m', 'soleil'),
+            ('7', 'spes, ei f', 'espoir')]
+    with pytest.raises(NoSuchTableError) as excinfo:
+        merge_tables(['table1', 'table5'], 'table4')
+    assert str(excinfo.value) == 'Cannot find a table named "table5"'
+    with pytest.raises(ColumnsDoNotMatchError):
+        merge_tables(['table1', 'table2'], 'table4')
+    assert get_rows_nb('table4') == 7
+    # The merged rows are free
+    assert shared.db.execute('SELECT COUNT(*) FROM table4 '
+                             'WHERE timestamp = 0;').fetchone()[0] == 7
+    assert get_stats('table4')[:2] == (7, 7)
+    # Split in several statements
+    mocker.patch('memini.core.database._MAX_COMPOUND_SELECT', 2)
+    create_table('table5', ['A', 'B'])
+    merge_tables(['table1', 'table3', 'table1'], 'table5')
+    assert [row[1] for row in get_table('table5')] \
+        == ['adventus,  us, m.', 'aqua , ae, f', 'candidus,  a, um',
+            'sol, solis, m', 'spes, ei f', 'adventus,  us, m.',
+            'aqua , ae, f', 'candidus,  a, um', 'sol, solis, m']
+
+
 def test_remove_row(testdb):
     with pytest.raises(NoSuchTableError) as excinfo:
         remove_row('table3', 2)
@@ -364,3 +744,92 @@ def test_draw_rows(testdb, fs):
     _timestamp('table1', 3)
     result = draw_rows('table1', 2, oldest_prevail=True)
     assert ('sol, solis, m', 'soleil') in result
+
+
+def test_draw_rows_oldest_first(testdb, fs):
+    fs.create_dir(USER_SWEEPSTAKES_PATH)
+    # Timestamps are kept when ids are reset
+    remove_rows('table2', '4')
+    first = draw_rows('table2', 2, oldest_prevail=True)
+    second = draw_rows('table2', 1, oldest_prevail=True)
+    # All rows are drawn before any of them is drawn again
+    assert sorted(first + second) == sorted(r[1:] for r in get_table('table2'))
+    stamped = shared.db.execute('SELECT COUNT(DISTINCT timestamp) FROM table2 '
+                                'WHERE timestamp != 0;').fetchone()[0]
+    assert stamped == 2
+    third = draw_rows('table2', 2, oldest_prevail=True)
+    assert all(row in third for row in first)
+    plan = shared.db.execute('EXPLAIN QUERY PLAN SELECT COUNT(*) FROM table2 '
+                             'WHERE timestamp=0;').fetchall()
+    assert '_memini_table2_timestamp' in plan[0][-1]
+
+
+def test_draw_rows_without_timestamps(testdb, fs):
+    fs.create_dir(USER_SWEEPSTAKES_PATH)
+    shared.db.execute('UPDATE table1 SET timestamp = NULL;')
+    drawn = draw_rows('table1', 3, oldest_prevail=True)
+    assert len(drawn) == 3
+    drawn += draw_rows('table1', 2, oldest_prevail=True)
+    assert len(drawn) == 5
+    assert shared.db.execute('SELECT COUNT(*) FROM table1 '
+                             'WHERE timestamp IS NULL;').fetchone()[0] == 0
+    assert get_stats('table1')[:2] == _computed_stats('table1')[:2]
+
+
+def test_draw_rows_records_history(testdb, fs):
+    fs.create_dir(USER_SWEEPSTAKES_PATH)
+    result = draw_rows('table1', 3)
+    drawn = shared.db.execute(f'SELECT row_id FROM {HISTORY_TABLE} '
+                              f'WHERE table_name = \'table1\';').fetchall()
+    assert len(drawn) == 3
+    contents = {row[0]: row[1] for row in get_table('table1')}
+    assert sorted(contents[str(d[0])] for d in drawn) \
+        == sorted(r[0] for r in result)
+
+
+def _history(table_name):
+    return shared.db.execute(f'SELECT row_id FROM {HISTORY_TABLE} '
+                             f'WHERE table_name = ? ORDER BY row_id;',
+                             (table_name, )).fetchall()
+
+
+def test_history_follows_tables_changes(testdb):
+    record('table1', [1, 2, 3, 4])
+    record('table2', [4])
+    rename_table('table1', 'table3')
+    assert _history('table1') == []
+    assert _history('table3') == [(1, ), (2, ), (3, ), (4, )]
+    remove_rows('table3', '2')
+    assert _history('table3') == [(1, ), (2, ), (3, )]
+    remove_table('table3')
+    assert _history('table3') == []
+    # Sorting changes the ids: "break" (2) becomes 1 and "give" (4) becomes 3
+    assert _history('table2') == [(4, )]
+    record('table2', [2])
+    sort_table('table2', 3)
+    assert get_table('table2')[0] == ('1', 'break', 'broke, broken', 'casser')
+    assert get_table('table2')[2] == ('3', 'give', 'gave, given', 'donner')
+    assert _history('table2') == [(1, ), (3, )]
+
+
+def test_draw_rows_review(testdb, fs):
+    fs.create_dir(USER_SWEEPSTAKES_PATH)
+    first = draw_rows('table1', 2, review=True)
+    second = draw_rows('table1', 2, review=True)
+    # Rows never reviewed are drawn before the ones reviewed recently
+    assert sorted(first + second) == sorted(r[1:] for r in get_table('table1'))
+    with pytest.raises(TooManyRowsRequiredError):
+        draw_rows('table1', 5, review=True)
+
+
+def test_forget_rows(testdb):
+    with pytest.raises(NoSuchRowError) as excinfo:
+        forget_rows('table1', '3-5')
+    assert str(excinfo.value) == 'Cannot find a row number 5 in "table1"'
+    forget_rows('table1', '2-3')
+    assert shared.db.execute(f'SELECT row_id FROM {SCHEDULE_TABLE} '
+                             f'ORDER BY row_id;').fetchall() == [(2, ), (3, )]
+    # Renumbering keeps the schedule's (table_name, row_id) unique
+    remove_rows('table1', '1')
+    assert shared.db.execute(f'SELECT row_id FROM {SCHEDULE_TABLE} '
+                             f'ORDER BY row_id;').fetchall() == [(1, ), (2, )]
@@ -19,6 +19,9 @@
 # along with Memini; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import os
+import shutil
+
 import pytest
 from unittest.mock import patch
 
@@ -30,6 +33,7 @@ from memini.core.errors import ColumnsDoNotMatchError
 from memini.core.errors import CommandCancelledError, NotFoundError
 from memini.core.document import _default_scheme, _parse_scheme
 from memini.core.document import _process_data, generate, edit
+from memini.core.document import _load_template
 
 
 def test_default_scheme():
@@ -171,6 +175,17 @@ def test_generate(mocker):
     mock_edit.assert_called_with(table1_odt)
 
 
+def test_load_template(tmp_path):
+    path = str(tmp_path / f'table1.{TEMPLATE_EXT}')
+    shutil.copyfile(TEST_TEMPLATE1_PATH, path)
+    compiled = _load_template(path)
+    assert _load_template(path) is compiled
+    # A modified template is compiled again
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert _load_template(path) is not compiled
+
+
 def test_generate_to_existing_destination(fs, mocker):
     fs.create_file('some_dest.odt')
     m = mocker.patch('memini.core.terminal.ask_yes_no', return_value=False)
@@ -29,9 +29,10 @@ from memini.core import template
 from memini.core import commands
 from memini.core import database
 from memini.core import sweepstakes
+from memini.core.history import record
 from memini.core.errors import NoSuchTableError, DestinationExistsError
 from memini.core.errors import NotFoundError, CommandError, MergeError
-from memini.core.errors import ColumnsDoNotMatchError
+from memini.core.errors import ColumnsDoNotMatchError, CommandCancelledError
 
 
 @pytest.fixture
@@ -47,6 +48,13 @@ def test_list_(testdb, capsys, fs, sw):
     commands.list_('tables')
     captured = capsys.readouterr()
     assert captured.out == 'table1\ntable2\n'
+    commands.list_('tables', sizes=True)
+    captured = capsys.readouterr()
+    assert captured.out == \
+        '  table | rows | free rows \n'\
+        '--------+------+-----------\n'\
+        ' table1 |   4  |     4     \n'\
+        ' table2 |   4  |     4     \n'
     commands.list_('templates')
     captured = capsys.readouterr()
     assert captured.out == 'template1.odt\ntemplate2.odt\n'
@@ -65,6 +73,20 @@ def test_list_(testdb, capsys, fs, sw):
         'keywords. I will not try to list "foo".'
 
 
+def test_parse_condition():
+    assert commands.parse_condition('col2~ke') == ('col2', '~', 'ke')
+    assert commands.parse_condition('col1=~^a.*s$') \
+        == ('col1', '=~', '^a.*s$')
+    with pytest.raises(CommandError) as excinfo:
+        commands.parse_condition('col2')
+    assert str(excinfo.value).startswith('Cannot understand the condition')
+    with pytest.raises(CommandError) as excinfo:
+        commands.parse_condition('col1=~(')
+    assert str(excinfo.value) == 'Invalid regular expression "(" in the '\
+        'condition "col1=~(": missing ), unterminated subpattern at '\
+        'position 0.'
+
+
 def test_rename(testdb, fs, mocker):
     m = mocker.patch('memini.core.database.rename_table')
     fs.create_file(template.path('table1'))
@@ -159,6 +181,37 @@ def test_show(testdb, capsys):
         "  4 |  give |  gave, given  |   donner  \n"
 
 
+def test_show_window(testdb, capsys, mocker):
+    commands.show('table2', sort=3, limit=2, offset=1)
+    captured = capsys.readouterr()
+    assert captured.out == \
+        " id |  col1 |     col2     |    col3   \n"\
+        "----+-------+--------------+-----------\n"\
+        "  1 | begin | began, begun | commencer \n"\
+        "  4 |  give |  gave, given |   donner  \n"
+    m = mocker.patch('memini.core.terminal.echo_lines')
+    commands.show('table2', pager=True)
+    assert m.call_args[1] == {'pager': True}
+    mocker.patch('sys.stdout.isatty', return_value=True)
+    mocker.patch('memini.core.terminal.fits', return_value=False)
+    commands.show('table2')
+    assert m.call_args[1] == {'pager': True}
+
+
+def test_show_selection(testdb, capsys):
+    commands.show('table2', where=['col2~ke', 'col3=~^c'], cols=['col1'])
+    captured = capsys.readouterr()
+    assert captured.out == \
+        " id |  col1 \n"\
+        "----+-------\n"\
+        "  2 | break \n"
+    with pytest.raises(CommandError) as excinfo:
+        commands.show('table2', where=['col2 ke'])
+    assert str(excinfo.value) == 'Cannot understand the condition ' \
+        '"col2 ke". A condition should look like COLUMN=TEXT, COLUMN~TEXT ' \
+        'or COLUMN=~REGEX.'
+
+
 def test_update(testdb, capsys):
     commands.update('table2', '  2 | take | took, taken |   prendre  ')
     commands.show('table2')
@@ -186,6 +239,29 @@ def test_dump(testdb, capsys, fs):
         "('sol, solis, m', 'soleil')\n"
 
 
+def test_history(testdb, capsys):
+    record('table1', [1, 2])
+    commands.history()
+    captured = capsys.readouterr()
+    lines = captured.out.split('\n')
+    assert lines[0] == '  table | rows | drawn rows | coverage | draws |'\
+        '      last drawn     '
+    assert lines[2].startswith(' table1 |   4  |      2     |  50.0 %  |'
+                               '   1   | 2')
+    assert lines[3] == ' table2 |   4  |      0     |   0.0 %  |   0   |'\
+        '          -          '
+    commands.history('table1')
+    captured = capsys.readouterr()
+    lines = captured.out.split('\n')
+    assert lines[0] == ' id |        col1       |   col2  | drawn |'\
+        '      last drawn     '
+    assert lines[4] == '  3 |  candidus,  a, um |  blanc  |   0   |'\
+        '          -          '
+    with pytest.raises(NoSuchTableError) as excinfo:
+        commands.history('table3')
+    assert str(excinfo.value) == 'Cannot find a table named "table3"'
+
+
 def test_duplicate(testdb, fs, capsys):
     fs.create_file(template.path('table1'))
     commands.duplicate('table1', 'table3')
@@ -200,6 +276,12 @@ def test_duplicate(testdb, fs, capsys):
     assert table1_content == table3_content
 
 
+def test_forgot(mocker):
+    m = mocker.patch('memini.core.database.forget_rows')
+    commands.forgot('table2', '2,3')
+    m.assert_called_with('table2', '2,3')
+
+
 def test_remove(mocker):
     m = mocker.patch('memini.core.database.remove_rows')
     commands.remove('table2', '2,3')
@@ -282,6 +364,39 @@ def test_create(testdb, capsys, mocker):
         ' 11 |    anima,  ae, f.    |      coeur, âme     \n'
 
 
+def test_export(testdb, capsys, tmp_path):
+    commands.export('table1', '<Latin>:<Français>')
+    captured = capsys.readouterr()
+    assert captured.out == 'adventus,  us, m.:arrivée\n'\
+        'aqua , ae, f:eau\n'\
+        'candidus,  a, um:blanc\n'\
+        'sol, solis, m:soleil\n'
+    f = tmp_path / 'table1.txt'
+    commands.export('table1', '<Latin>:<Français>', str(f))
+    assert f.read_text(encoding='utf-8') == captured.out
+    with pytest.raises(NoSuchTableError):
+        commands.export('table3', '<Latin>:<Français>', str(tmp_path / 'x'))
+    assert not (tmp_path / 'x').exists()
+
+
+def test_export_existing_file(testdb, tmp_path, mocker):
+    f = tmp_path / 'table1.txt'
+    f.write_text('keep me\n', encoding='utf-8')
+    m = mocker.patch('memini.core.terminal.ask_yes_no', return_value=False)
+    with pytest.raises(CommandCancelledError):
+        commands.export('table1', '<Latin>:<Français>', str(f))
+    m.assert_called_once()
+    assert f.read_text(encoding='utf-8') == 'keep me\n'
+    m.return_value = True
+    commands.export('table1', '<Latin>:<Français>', str(f))
+    assert f.read_text(encoding='utf-8').startswith('adventus')
+    m.reset_mock()
+    f.write_text('keep me\n', encoding='utf-8')
+    commands.export('table1', '<Latin>:<Français>', str(f), force=True)
+    m.assert_not_called()
+    assert f.read_text(encoding='utf-8').startswith('adventus')
+
+
 def test_create_with_parse_errors(testdb, capsys, mocker):
     m = mocker.patch('memini.core.template.create')
     f = os.path.join(TESTS_DATADIR, 'latin_parse_err.txt')
@@ -523,4 +638,5 @@ def test_generate(mocker):
     m = mocker.patch('memini.core.document.generate')
     commands.generate('table1', 4)
     m.assert_called_with('table1', nb=4, scheme=None, force=False, output=None,
-                         tpl=None, edit_after=True, use_previous=False)
+                         tpl=None, edit_after=True, use_previous=False,
+                         review=False, oldest_prevail=False)
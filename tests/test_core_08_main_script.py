@@ -19,15 +19,18 @@
 # along with Memini; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import os
+import sys
 import sqlite3
+import subprocess
 
 from click.testing import CliRunner
 
 from memini.core.prefs import DEFAULT_Q_NB
-from memini.core.env import TEST_DB_PATH
+from memini.core.env import TEST_DB_PATH, TESTS_DIR
 from memini import run, list_, parse, delete, remove, create, add, show
 from memini import rename, generate, edit, duplicate, dump, sort, update
-from memini import merge
+from memini import merge, history, forgot, search, similar, export
 
 
 class TDBManager:
@@ -59,6 +62,23 @@ def test_run():
     assert result.exit_code == 0
 
 
+def test_import_is_light(tmp_path):
+    # Importing memini (i.e. starting any command) neither imports the modules
+    # only some commands need nor creates the user's directories
+    share = tmp_path / 'share'
+    script = 'import sys\n'\
+        'import memini\n'\
+        'heavy = {"relatorio", "blessed", "intspan", "toml"}\n'\
+        'print(sorted(heavy.intersection(sys.modules)))\n'
+    env = dict(os.environ, XDG_DATA_HOME=str(share),
+               PYTHONPATH=os.path.dirname(TESTS_DIR))
+    result = subprocess.run([sys.executable, '-c', script], env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0
+    assert result.stdout == '[]\n'
+    assert not share.exists()
+
+
 def test_list_(mocker):
     mocker.patch('memini.core.database.Manager', return_value=TDBManager())
     runner = CliRunner()
@@ -95,6 +115,14 @@ def test_remove(mocker):
     assert result.exit_code == 1
 
 
+def test_forgot(mocker):
+    mocker.patch('memini.core.database.Manager', return_value=TDBManager())
+    runner = CliRunner()
+    result = runner.invoke(forgot, ['table1', '5'])
+    assert result.output.startswith('Error: ')
+    assert result.exit_code == 1
+
+
 def test_create(mocker, fs):
     fs.create_file('empty_file.txt')
     mocker.patch('memini.core.database.Manager', return_value=TDBManager())
@@ -129,6 +157,13 @@ def test_show(mocker):
         '  3 |  candidus,  a, um |  blanc  \n'\
         '  2 |    aqua , ae, f   |   eau   \n'\
         '  4 |   sol, solis, m   |  soleil \n'
+    result = runner.invoke(show, ['table1', '-c', '2, 1', '-w', 'col1~us',
+                                  '--sort', '1', '--collate', 'unicode'])
+    assert result.output == \
+        ' id |   col2  |        col1       \n'\
+        '----+---------+-------------------\n'\
+        '  1 | arrivée | adventus,  us, m. \n'\
+        '  3 |  blanc  |  candidus,  a, um \n'
 
 
 def test_sort(mocker):
@@ -155,6 +190,69 @@ def test_dump(mocker):
     assert result.exit_code == 1
 
 
+def test_history(mocker):
+    mocker.patch('memini.core.database.Manager', return_value=TDBManager())
+    runner = CliRunner()
+    result = runner.invoke(history, ['table3'])
+    assert result.output.startswith('Error: ')
+    assert result.exit_code == 1
+    result = runner.invoke(history, ['table1', '--last', '0'])
+    assert result.exit_code == 2
+
+
+def test_search(mocker):
+    mocker.patch('memini.core.database.Manager', return_value=TDBManager())
+    runner = CliRunner()
+    result = runner.invoke(search, ['SOLE'])
+    assert result.exit_code == 0
+    assert [cell.strip() for cell in result.output.splitlines()[2]
+            .split('|')[:2]] == ['table1', '4']
+    assert 'sol, solis, m | soleil' in result.output
+    mocker.patch('memini.core.database.Manager', return_value=TDBManager())
+    result = runner.invoke(search, ['sole', '-t', 'table2'])
+    assert result.output == 'Error: No row matches "sole".\n'
+    assert result.exit_code == 1
+    mocker.patch('memini.core.database.Manager', return_value=TDBManager())
+    result = runner.invoke(search, ['solel'])
+    assert result.output == 'Error: No row matches "solel". '\
+        'Did you mean "soleil"?\n'
+    result = runner.invoke(search, ['sole', '--limit', '0'])
+    assert result.exit_code == 2
+
+
+def test_similar(mocker):
+    mocker.patch('memini.core.database.Manager', return_value=TDBManager())
+    runner = CliRunner()
+    result = runner.invoke(similar, ['solel'])
+    assert result.exit_code == 0
+    assert [cell.strip() for cell in result.output.splitlines()[2]
+            .split('|')[:3]] == ['91 %', 'table1', '4']
+    mocker.patch('memini.core.database.Manager', return_value=TDBManager())
+    result = runner.invoke(similar, ['solel', '-t', 'table2'])
+    assert result.output == 'Error: No row looks like "solel".\n'
+    assert result.exit_code == 1
+    mocker.patch('memini.core.database.Manager', return_value=TDBManager())
+    result = runner.invoke(similar, [])
+    assert result.output == 'Error: No rows look alike.\n'
+
+
+def test_export(mocker, fs):
+    mocker.patch('memini.core.database.Manager', return_value=TDBManager())
+    runner = CliRunner()
+    fs.create_file('exists.txt', contents='keep me\n')
+    mocker.patch('memini.core.terminal.ask_yes_no', return_value=False)
+    result = runner.invoke(export, ['table1', '<A>:<B>', 'exists.txt'])
+    assert result.output.startswith('Info: ')
+    assert result.exit_code == 0
+    with open('exists.txt') as f:
+        assert f.read() == 'keep me\n'
+
+    me = mocker.patch('memini.core.commands.export')
+    result = runner.invoke(export, ['table1', '<A>:<B>', 'exists.txt', '-f'])
+    me.assert_called_with('table1', '<A>:<B>', 'exists.txt', force=True)
+    assert result.exit_code == 0
+
+
 def test_rename(mocker):
     mocker.patch('memini.core.database.Manager', return_value=TDBManager())
     runner = CliRunner()
@@ -209,5 +307,16 @@ def test_generate(mocker, fs):
     result = runner.invoke(generate, ['--use-previous'])
     mg.assert_called_with('1', nb=DEFAULT_Q_NB, scheme=None,
                           output=None, force=False, tpl=None,
-                          edit=True, use_previous=True)
+                          edit=True, use_previous=True, review=False,
+                          oldest_prevail=False)
     assert result.exit_code == 0
+
+    result = runner.invoke(generate, ['table1', '--oldest-first'])
+    mg.assert_called_with('table1', nb=DEFAULT_Q_NB, scheme=None,
+                          output=None, force=False, tpl=None,
+                          edit=True, use_previous=False, review=False,
+                          oldest_prevail=True)
+    result = runner.invoke(generate, ['table1', '--oldest-first', '-r'])
+    assert result.output == 'Error: Options --review and --oldest-first '\
+        'cannot be used together.\n'
+    assert result.exit_code == 1
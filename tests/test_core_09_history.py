@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+from memini.core import shared
+from memini.core.shared import HISTORY_TABLE
+from memini.core.history import record, summary, rows_stats, _since
+from memini.core.history import _create
+
+
+def _fake_draw(table_name, ids, drawn_at):
+    _create()
+    shared.db.executemany(f'INSERT INTO {HISTORY_TABLE} '
+                          f'(table_name, row_id, drawn_at) VALUES (?, ?, ?);',
+                          [(table_name, id_, drawn_at) for id_ in ids])
+
+
+def test_record(testdb):
+    record('table1', [1, 3])
+    record('table2', [2])
+    assert shared.db.execute(f'SELECT table_name, row_id FROM {HISTORY_TABLE} '
+                             f'ORDER BY table_name, row_id;').fetchall() \
+        == [('table1', 1), ('table1', 3), ('table2', 2)]
+    dates = shared.db.execute(f'SELECT DISTINCT drawn_at FROM {HISTORY_TABLE} '
+                              f'WHERE table_name = \'table1\';').fetchall()
+    assert len(dates) == 1
+
+
+def test_since(testdb):
+    assert _since('table1') == ''
+    _fake_draw('table1', [1, 2], '2020-09-01 10:00:00.000')
+    _fake_draw('table1', [2, 3], '2020-09-08 10:00:00.000')
+    _fake_draw('table1', [3, 4], '2020-09-15 10:00:00.000')
+    assert _since('table1', last=1) == '2020-09-15 10:00:00.000'
+    assert _since('table1', last=2) == '2020-09-08 10:00:00.000'
+    assert _since('table1', last=4) == ''
+
+
+def test_summary(testdb):
+    assert summary('table1') == (0, 0, None)
+    _fake_draw('table1', [1, 2], '2020-09-01 10:00:00.000')
+    _fake_draw('table1', [2, 3], '2020-09-08 10:00:00.000')
+    _fake_draw('table2', [1, 2, 3], '2020-09-09 10:00:00.000')
+    assert summary('table1') == (3, 2, '2020-09-08 10:00:00.000')
+    assert summary('table1', last=1) == (2, 1, '2020-09-08 10:00:00.000')
+    assert summary('table2') == (3, 1, '2020-09-09 10:00:00.000')
+
+
+def test_rows_stats(testdb):
+    _fake_draw('table1', [1, 2], '2020-09-01 10:00:00.000')
+    _fake_draw('table1', [2, 3], '2020-09-08 10:00:00.000')
+    assert rows_stats('table1', ['col1', 'col2']).fetchall() \
+        == [(1, 'adventus,  us, m.', 'arrivée', 1, '2020-09-01 10:00:00.000'),
+            (2, 'aqua , ae, f', 'eau', 2, '2020-09-08 10:00:00.000'),
+            (3, 'candidus,  a, um', 'blanc', 1, '2020-09-08 10:00:00.000'),
+            (4, 'sol, solis, m', 'soleil', 0, None)]
+    assert rows_stats('table1', ['col1'], last=1).fetchall() \
+        == [(1, 'adventus,  us, m.', 0, None),
+            (2, 'aqua , ae, f', 1, '2020-09-08 10:00:00.000'),
+            (3, 'candidus,  a, um', 1, '2020-09-08 10:00:00.000'),
+            (4, 'sol, solis, m', 0, None)]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+from memini.core import shared
+from memini.core.shared import SCHEDULE_TABLE
+from memini.core.prefs import REVIEW_FIRST_INTERVAL, REVIEW_EASE
+from memini.core.prefs import REVIEW_EASE_PENALTY
+from memini.core.schedule import _create, _due_ids, _new_ids
+from memini.core.schedule import draw_due, reviewed, forgotten
+
+COLS = ['col1', 'col2']
+
+
+def _schedule_of(table_name):
+    return shared.db.execute(f'SELECT row_id, interval, ease, reviews '
+                             f'FROM {SCHEDULE_TABLE} WHERE table_name = ? '
+                             f'ORDER BY row_id;', (table_name, )).fetchall()
+
+
+def _set_due(table_name, id_, days_from_now):
+    shared.db.execute(f'UPDATE {SCHEDULE_TABLE} '
+                      f'SET due = julianday(\'now\') + ? '
+                      f'WHERE table_name = ? AND row_id = ?;',
+                      (days_from_now, table_name, id_))
+
+
+def test_reviewed(testdb):
+    reviewed('table1', [1, 2])
+    assert _schedule_of('table1') \
+        == [(1, REVIEW_FIRST_INTERVAL, REVIEW_EASE, 1),
+            (2, REVIEW_FIRST_INTERVAL, REVIEW_EASE, 1)]
+    reviewed('table1', [2])
+    assert _schedule_of('table1')[1] \
+        == (2, REVIEW_FIRST_INTERVAL * REVIEW_EASE, REVIEW_EASE, 2)
+    assert _due_ids('table1', 4) == []
+    assert _due_ids('table1', 4, overdue=False) == [1, 2]
+
+
+def test_forgotten(testdb):
+    reviewed('table1', [1, 2])
+    forgotten('table1', [2, 3])
+    assert _schedule_of('table1') \
+        == [(1, REVIEW_FIRST_INTERVAL, REVIEW_EASE, 1),
+            (2, 0, REVIEW_EASE - REVIEW_EASE_PENALTY, 1),
+            (3, 0, REVIEW_EASE - REVIEW_EASE_PENALTY, 0)]
+    assert sorted(_due_ids('table1', 4)) == [2, 3]
+
+
+def test_new_ids(testdb):
+    _create()
+    assert sorted(_new_ids('table1', 4)) == [1, 2, 3, 4]
+    reviewed('table1', [1, 3])
+    assert sorted(_new_ids('table1', 4)) == [2, 4]
+    assert len(_new_ids('table1', 1)) == 1
+
+
+def test_draw_due(testdb):
+    reviewed('table1', [1, 2, 3, 4])
+    _set_due('table1', 1, 3)
+    _set_due('table1', 2, -2)
+    _set_due('table1', 3, 1)
+    _set_due('table1', 4, -1)
+    # Overdue rows first, then the ones due soon
+    drawn = draw_due('table1', COLS, 3)
+    assert sorted(drawn) == [(2, 'aqua , ae, f', 'eau'),
+                             (3, 'candidus,  a, um', 'blanc'),
+                             (4, 'sol, solis, m', 'soleil')]
+    assert [r[3] for r in _schedule_of('table1')] == [1, 2, 2, 2]
+    # Rows never reviewed come before the ones not due yet
+    shared.db.execute(f'DELETE FROM {SCHEDULE_TABLE} WHERE row_id = 2;')
+    drawn = draw_due('table1', COLS, 1)
+    assert drawn == [(2, 'aqua , ae, f', 'eau')]
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+import shutil
+import sqlite3
+
+import pytest
+
+from click.testing import CliRunner
+
+from memini import run, batch as batch_cmd
+from memini.core.env import TEST_DB_PATH
+from memini.core import shared
+from memini.core import shell
+from memini.core.database import Manager
+from memini.core.errors import NoSuchColumnError
+from memini.core.shell import candidates, execute, loop, batch
+from memini.core.shell import batch_summary, _batch_commands
+
+
+@pytest.fixture
+def in_shell(tmp_path, mocker):
+    # The shell commits after each command, so it works on a copy of the
+    # test database
+    path = tmp_path / 'data.db'
+    shutil.copyfile(TEST_DB_PATH, path)
+    conn = sqlite3.connect(str(path))
+    mocker.patch('memini.core.shell.readline', None)
+    shared.db = conn.cursor()
+    shared.shell = True
+    yield str(path)
+    shared.shell = False
+    conn.close()
+
+
+def test_candidates(testdb):
+    assert candidates(run, [])[:3] == ['add', 'batch', 'create']
+    assert {'shell', 'exit', 'quit'}.issubset(candidates(run, []))
+    assert candidates(run, ['list']) == ['sweepstakes', 'tables', 'templates']
+    assert candidates(run, ['list', 'tables']) == []
+    assert candidates(run, ['show']) == ['table1', 'table2']
+
+
+def test_execute(in_shell, capsys, mocker):
+    m = mocker.patch('memini.core.database.Manager')
+    execute(run, 'show table1 -c col2 -l 1')
+    execute(run, 'show table3')
+    execute(run, 'show table1 --bogus')
+    execute(run, 'show "table1')
+    execute(run, '   ')
+    captured = capsys.readouterr()
+    assert captured.out == \
+        ' id |   col2  \n'\
+        '----+---------\n'\
+        '  1 | arrivée \n'\
+        'Error: Cannot find a table named "table3"\n'\
+        'Error: No closing quotation\n'
+    assert 'no such option: --bogus' in captured.err
+    # The shell's connection is used, none is opened
+    m.assert_not_called()
+
+
+def test_execute_commits(in_shell):
+    execute(run, 'sort table1 -n 2')
+    with sqlite3.connect(in_shell) as conn:
+        assert conn.execute('SELECT col2 FROM table1 WHERE id = 1;') \
+            .fetchone() == ('arrivée', )
+        assert conn.execute('SELECT col2 FROM table1 WHERE id = 2;') \
+            .fetchone() == ('blanc', )
+
+
+def test_execute_unexpected_error(in_shell, capsys, mocker):
+    def sort(name, col_nb):
+        shared.db.execute('DELETE FROM table1;')
+        raise sqlite3.OperationalError('disk I/O error')
+    mocker.patch('memini.core.commands.sort', side_effect=sort)
+    assert not execute(run, 'sort table1 -n 2')
+    captured = capsys.readouterr()
+    assert captured.err == \
+        'Error: unexpected OperationalError: disk I/O error\n'
+    # The changes of the failed command are rolled back
+    assert shared.db.execute('SELECT COUNT(*) FROM table1;').fetchone() \
+        == (4, )
+
+
+def test_execute_reported_error(in_shell, capsys, mocker):
+    def sort(name, col_nb):
+        shared.db.execute('DELETE FROM table1;')
+        raise NoSuchColumnError(col_nb, name)
+    mocker.patch('memini.core.commands.sort', side_effect=sort)
+    assert not execute(run, 'sort table1 -n 3')
+    assert capsys.readouterr().out == \
+        'Error: Cannot find a column number 3 in "table1"\n'
+    # The changes of the failed command are not committed by the next one
+    assert execute(run, 'remove table2 4')
+    with sqlite3.connect(in_shell) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM table1;').fetchone() \
+            == (4, )
+
+
+def test_loop_goes_on_after_unexpected_error(in_shell, capsys, mocker):
+    mocker.patch('memini.core.commands.sort', side_effect=ValueError('oops'))
+    lines = iter(['sort table1 -n 2', 'list tables', 'quit'])
+    loop(run, read=lambda prompt: next(lines))
+    captured = capsys.readouterr()
+    assert captured.out.endswith('table1\ntable2\n')
+    assert 'unexpected ValueError: oops' in captured.err
+
+
+def test_loop(in_shell, capsys):
+    lines = iter(['list tables', 'shell', 'quit', 'list tables'])
+    loop(run, read=lambda prompt: next(lines))
+    captured = capsys.readouterr()
+    assert captured.out.endswith('table1\ntable2\nWarning: The shell '
+                                 'cannot be started from the shell or a '
+                                 'batch.\n')
+
+    def read(prompt):
+        raise EOFError
+    loop(run, read=read)
+    assert shell.readline is None
+
+
+def _col2(table_name):
+    return [r[0] for r in shared.db.execute(f'SELECT col2 FROM {table_name} '
+                                            f'ORDER BY id;')]
+
+
+def test_batch_commands():
+    lines = ['# comment', '', 'memini show table1', '  list tables  ',
+             'memini']
+    assert list(_batch_commands(lines)) \
+        == [(3, 'show table1'), (4, 'list tables'), (5, '')]
+
+
+def test_batch(in_shell, mocker):
+    shared.batch = True
+    mocker.patch('memini.core.template.list_', return_value=[])
+    lines = ['sort table1 -n 2', 'show nothere', 'sort table2 -n 3']
+    results = batch(run, lines)
+    assert [r[:3] for r in results] == [(1, 'sort table1 -n 2', True),
+                                        (2, 'show nothere', False)]
+    assert _col2('table1') == ['arrivée', 'eau', 'blanc', 'soleil']
+    results = batch(run, lines, stop_on_error=False)
+    assert [r[2] for r in results] == [True, False, True]
+    assert _col2('table1') == ['arrivée', 'blanc', 'eau', 'soleil']
+    assert _col2('table2') == ['broke, broken', 'began, begun',
+                               'gave, given', 'did, done']
+    shared.batch = False
+
+
+def test_batch_unexpected_error(in_shell, mocker, capsys):
+    shared.batch = True
+    mocker.patch('memini.core.template.list_', return_value=[])
+    mocker.patch('memini.core.commands.show',
+                 side_effect=sqlite3.OperationalError('boom'))
+    lines = ['sort table1 -n 2', 'show table1', 'sort table2 -n 3']
+    results = batch(run, lines)
+    assert [r[:3] for r in results] == [(1, 'sort table1 -n 2', True),
+                                        (2, 'show table1', False)]
+    assert _col2('table1') == ['arrivée', 'eau', 'blanc', 'soleil']
+    assert 'unexpected OperationalError: boom' in capsys.readouterr().err
+    # Interrupted batches save nothing either
+    calls = []
+
+    def interrupted(group, line):
+        calls.append(line)
+        if len(calls) > 1:
+            raise KeyboardInterrupt
+        return execute(group, line)
+    mocker.patch('memini.core.shell.execute', side_effect=interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        batch(run, lines)
+    assert _col2('table1') == ['arrivée', 'eau', 'blanc', 'soleil']
+    # The batch's savepoint has been released
+    with pytest.raises(sqlite3.OperationalError):
+        shared.db.execute('RELEASE SAVEPOINT batch;')
+    shared.batch = False
+
+
+def test_batch_removes_new_templates(in_shell, mocker):
+    shared.batch = True
+    mocker.patch('memini.core.template.list_',
+                 side_effect=[['table1.odt'], ['table1.odt'],
+                              ['table1.odt', 'table3.odt'],
+                              ['table1.odt']])
+    m = mocker.patch('memini.core.template.remove')
+    batch(run, ['show nothere'])
+    m.assert_called_once_with('table3')
+    shared.batch = False
+
+
+def test_batch_summary():
+    results = [(1, 'sort table1', True, 0.0012), (3, 'show t', False, 0.01)]
+    assert batch_summary(results) == \
+        ' line |   command   | status |   time  \n'\
+        '------+-------------+--------+---------\n'\
+        '   1  | sort table1 |   ok   |  1.2 ms \n'\
+        '   3  |    show t   | FAILED | 10.0 ms \n'\
+        'Total: 11.2 ms. Stopped at line 3: no change has been saved.'
+    assert batch_summary(results, stop_on_error=False).endswith(
+        'Total: 11.2 ms. 1 command(s) succeeded, 1 failed (and their '
+        'changes have been ignored).')
+
+
+def test_batch_cmd(tmp_path, mocker):
+    path = tmp_path / 'data.db'
+    shutil.copyfile(TEST_DB_PATH, path)
+    mocker.patch('memini.core.template.list_', return_value=[])
+    mocker.patch('memini.core.database.Manager',
+                 return_value=Manager(str(path)))
+    runner = CliRunner()
+    result = runner.invoke(batch_cmd, ['-'], input='sort table1 -n 2\n')
+    assert result.exit_code == 0
+    assert result.output.endswith('1 command(s) succeeded, 0 failed (and '
+                                  'their changes have been ignored).\n')
+    with sqlite3.connect(str(path)) as conn:
+        assert conn.execute('SELECT col2 FROM table1 WHERE id = 2;') \
+            .fetchone() == ('blanc', )
+    assert not shared.shell and not shared.batch
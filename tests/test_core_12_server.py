@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+import json
+import shutil
+import sqlite3
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen, Request
+
+import pytest
+
+from memini.core.env import TEST_DB_PATH, TEST_TEMPLATE1_PATH
+from memini.core.server import Server, ODT_MIMETYPE
+
+
+@pytest.fixture
+def server(tmp_path, mocker):
+    mocker.patch('memini.core.sweepstakes.USER_SWEEPSTAKES_PATH',
+                 str(tmp_path / 'sweepstakes'))
+    path = tmp_path / 'data.db'
+    shutil.copyfile(TEST_DB_PATH, path)
+    server = Server(port=0, db_path=str(path), quiet=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    host, port = server.server_address
+    yield f'http://{host}:{port}', str(path)
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def _get(url):
+    with urlopen(url) as response:
+        return json.loads(response.read())
+
+
+def _post(url, data=None):
+    body = b'' if data is None else json.dumps(data).encode()
+    return urlopen(Request(url, data=body, method='POST'))
+
+
+def _error(call, *args):
+    with pytest.raises(HTTPError) as excinfo:
+        call(*args)
+    return excinfo.value.code, json.loads(excinfo.value.read())['error']
+
+
+def test_listen_locally(server):
+    url, _ = server
+    assert url.startswith('http://127.0.0.1:')
+
+
+def test_list_tables(server):
+    url, _ = server
+    assert _get(f'{url}/tables') == {'tables': ['table1', 'table2']}
+    assert _error(_get, f'{url}/stuff') == (404, 'Unknown route: GET /stuff')
+
+
+def test_show(server):
+    url, _ = server
+    assert _get(f'{url}/tables/table2?cols=col1&sort=3&limit=2') \
+        == {'headers': ['id', 'col1'], 'rows': [[2, 'break'], [1, 'begin']]}
+    assert _get(f'{url}/tables/table2?where=col2~ke&where=col3%3Dcasser') \
+        == {'headers': ['id', 'col1', 'col2', 'col3'],
+            'rows': [[2, 'break', 'broke, broken', 'casser']]}
+    assert _error(_get, f'{url}/tables/table3') \
+        == (404, 'Cannot find a table named "table3"')
+    assert _error(_get, f'{url}/tables/table2?limit=a') \
+        == (400, 'Invalid value for limit: a')
+    assert _error(_get, f'{url}/tables/table2?where=col1%3D~(')[0] == 400
+
+
+def test_draw(server):
+    url, path = server
+    with _post(f'{url}/tables/table1/draw', {'nb': 2}) as response:
+        rows = json.loads(response.read())['rows']
+    assert len(rows) == 2
+    assert all(len(row) == 2 for row in rows)
+    # The drawn rows have been timestamped, and this has been committed
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM table1 WHERE timestamp '
+                            '!= 0;').fetchone() == (2, )
+    assert _error(_post, f'{url}/tables/table1/draw', {'nb': 0}) \
+        == (400, 'nb must be a positive integer.')
+    assert _error(_post, f'{url}/tables/table1/draw', [1]) \
+        == (400, 'A JSON object is expected.')
+    assert _error(_post, f'{url}/tables/table1/draw',
+                  {'review': True, 'oldest_first': True}) \
+        == (400, 'review and oldest_first cannot be used together.')
+
+
+def test_unexpected_error(server, mocker):
+    url, _ = server
+    mocker.patch('memini.core.database.list_tables',
+                 side_effect=sqlite3.OperationalError('disk I/O error'))
+    assert _error(_get, f'{url}/tables') \
+        == (500, 'Internal error: OperationalError: disk I/O error')
+
+
+def test_generate(server, mocker):
+    url, _ = server
+    mocker.patch('memini.core.template.path',
+                 return_value=TEST_TEMPLATE1_PATH)
+    mocker.patch('memini.core.template.exists', return_value=True)
+    with _post(f'{url}/tables/table1/generate', {'nb': 3}) as response:
+        assert response.headers['Content-Type'] == ODT_MIMETYPE
+        assert response.headers['Content-Disposition'] \
+            == 'attachment; filename="table1.odt"'
+        assert response.read(2) == b'PK'
+    assert _error(_post, f'{url}/tables/table1/generate',
+                  {'nb': 3, 'scheme': '___2'}) \
+        == (400, 'The provided scheme (___2) does not have the same number '
+            'of columns as the table (2).')
+    mocker.patch('memini.core.template.exists', return_value=False)
+    assert _error(_post, f'{url}/tables/table1/generate') \
+        == (404, 'Cannot find template file: table1')
+
+
+def test_concurrent_generate(server, mocker):
+    url, path = server
+    mocker.patch('memini.core.template.path',
+                 return_value=TEST_TEMPLATE1_PATH)
+    mocker.patch('memini.core.template.exists', return_value=True)
+    results = []
+
+    def generate():
+        with _post(f'{url}/tables/table1/generate', {'nb': 1}) as response:
+            results.append(response.read(2))
+    threads = [threading.Thread(target=generate) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [b'PK'] * 8
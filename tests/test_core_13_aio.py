@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+
+import shutil
+import asyncio
+
+import pytest
+
+from memini.aio import Memini
+from memini.core import shared
+from memini.core.env import TEST_DB_PATH, TEST_TEMPLATE1_PATH
+from memini.core.errors import NoSuchTableError, NotFoundError
+
+
+@pytest.fixture
+def db_path(tmp_path, mocker):
+    mocker.patch('memini.core.sweepstakes.USER_SWEEPSTAKES_PATH',
+                 str(tmp_path / 'sweepstakes'))
+    path = tmp_path / 'data.db'
+    shutil.copyfile(TEST_DB_PATH, path)
+    return str(path)
+
+
+def test_memini(db_path):
+    async def use():
+        async with Memini(db_path=db_path) as memini:
+            tables = await memini.list_tables()
+            table = await memini.get_table('table1', include_headers=True,
+                                           sort=2)
+            rows = await memini.draw_rows('table2', 2)
+            with pytest.raises(NoSuchTableError):
+                await memini.get_table('table3')
+            nb = await memini.run(lambda: shared.get_db().execute(
+                'SELECT COUNT(*) FROM table2 WHERE timestamp != 0;')
+                .fetchone()[0])
+        return tables, table, rows, nb
+    shared.db = None
+    tables, table, rows, nb = asyncio.run(use())
+    assert tables == ['table1', 'table2']
+    assert table == [('id', 'col1', 'col2'),
+                     ('1', 'adventus,  us, m.', 'arrivée'),
+                     ('3', 'candidus,  a, um', 'blanc'),
+                     ('2', 'aqua , ae, f', 'eau'),
+                     ('4', 'sol, solis, m', 'soleil')]
+    assert len(rows) == 2 and all(len(row) == 3 for row in rows)
+    assert nb == 2
+    # The global cursor has not been used
+    assert shared.db is None
+
+
+def test_generate(db_path, mocker):
+    mocker.patch('memini.core.template.path',
+                 return_value=TEST_TEMPLATE1_PATH)
+    mocker.patch('memini.core.template.exists', return_value=True)
+
+    async def generate():
+        async with Memini(db_path=db_path) as memini:
+            return await asyncio.gather(
+                *[memini.generate('table1', nb=2) for _ in range(6)])
+    docs = asyncio.run(generate())
+    assert len(docs) == 6
+    assert all(doc.startswith(b'PK') for doc in docs)
+
+    mocker.patch('memini.core.template.exists', return_value=False)
+
+    async def no_template():
+        async with Memini(db_path=db_path) as memini:
+            await memini.generate('table1', nb=2)
+    with pytest.raises(NotFoundError):
+        asyncio.run(no_template())
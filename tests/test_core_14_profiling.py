@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import io
+import json
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+from memini import run
+from memini.core import profiling
+from memini.core.env import TEST_DB_PATH
+
+
+@pytest.fixture
+def off(mocker):
+    mocker.patch('memini.core.profiling._recording', False)
+    mocker.patch('memini.core.profiling._timings_target', None)
+    mocker.patch('memini.core.profiling._records', [])
+
+
+@profiling.span('decorated')
+def decorated(x):
+    return x * 2
+
+
+def test_span_does_nothing_when_off(off):
+    with profiling.span('stage'):
+        pass
+    assert decorated(2) == 4
+    assert profiling._records == []
+
+
+def test_span_records_nested_stages(off, capsys):
+    stop = profiling.start()
+    with profiling.span('outer'):
+        with profiling.span('inner'):
+            pass
+        decorated(1)
+    stop()
+    assert [(name, depth) for name, depth, _ in profiling._records] \
+        == [('outer', 0), ('inner', 1), ('decorated', 1)]
+    assert all(duration >= 0 for _, _, duration in profiling._records)
+    assert not profiling._recording
+    lines = capsys.readouterr().err.splitlines()
+    assert lines[0].split() == ['Stage', 'ms', '%']
+    assert lines[1].startswith('outer ')
+    assert lines[2].startswith('  inner ')
+    assert lines[3].startswith('  decorated ')
+    assert lines[4].startswith('total ')
+    assert lines[4].endswith('100.0')
+
+
+def test_span_records_when_the_block_raises(off, capsys):
+    stop = profiling.start()
+    with pytest.raises(ValueError):
+        with profiling.span('failing'):
+            raise ValueError
+    with profiling.span('next'):
+        pass
+    stop()
+    assert [(name, depth) for name, depth, _ in profiling._records] \
+        == [('failing', 0), ('next', 0)]
+
+
+def test_recording(off, capsys):
+    with profiling.recording() as records:
+        decorated(1)
+    decorated(2)
+    assert [record[:2] for record in records] == [['decorated', 0]]
+    assert not profiling._recording
+    assert capsys.readouterr().err == ''
+
+
+def test_breakdown():
+    assert profiling.breakdown([['a', 0, 0.5], ['b', 1, 0.25],
+                                ['running', 0, None]], 1) \
+        == 'Stage        ms      %\n'\
+        'a         500.0   50.0\n'\
+        '  b       250.0   25.0\n'\
+        'total    1000.0  100.0\n'
+
+
+def test_start_dumps_cprofile_statistics(off, tmp_path, capsys):
+    dump = tmp_path / 'memini.prof'
+    stop = profiling.start(dump_path=str(dump))
+    decorated(3)
+    stop()
+    assert dump.exists()
+    assert f'cProfile statistics written to {dump}' \
+        in capsys.readouterr().err
+
+
+def test_timings_lines(off, mocker, tmp_path):
+    target = tmp_path / 'timings.jsonl'
+    mocker.patch('memini.core.profiling._timings_target', str(target))
+    with profiling.span('outer'):
+        decorated(1)
+    lines = [json.loads(line) for line in target.read_text().splitlines()]
+    assert [(d['span'], d['depth']) for d in lines] \
+        == [('decorated', 1), ('outer', 0)]
+    assert all(d['ms'] >= 0 for d in lines)
+    assert profiling._records == []  # not recorded when --profile is off
+
+
+def test_timings_lines_to_stderr(off, mocker, capsys):
+    mocker.patch('memini.core.profiling._timings_target', '-')
+    decorated(1)
+    assert json.loads(capsys.readouterr().err)['span'] == 'decorated'
+
+
+def test_profile_option(off, mocker, tmp_path):
+    mocker.patch('memini.core.sweepstakes.USER_SWEEPSTAKES_PATH',
+                 str(tmp_path))
+    db = tmp_path / 'data.db'
+    shutil.copyfile(TEST_DB_PATH, db)
+    mocker.patch('memini.USER_DB_PATH', str(db))
+    mocker.patch('memini.core.document.render',
+                 return_value=io.BytesIO(b'document'))
+    mocker.patch('memini.core.document.edit')
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        result = runner.invoke(run, ['--profile', 'generate', 'table1',
+                                     '-n', '2'])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0].split() == ['Stage', 'ms', '%']
+    stages = [line.split()[0] for line in lines[1:]]
+    assert stages == ['draw_rows', 'sweepstakes.store', 'sweepstakes.rotate',
+                      'history.record', 'write', 'total']
+    result = runner.invoke(run, ['--help'])
+    assert '--profile-output' in result.output
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import json
+import shutil
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+from memini import run
+from memini.core import sqltrace, database
+from memini.core.env import TEST_DB_PATH
+
+
+@pytest.fixture
+def trace(mocker, tmp_path):
+    path = tmp_path / 'trace' / 'sql_trace.jsonl'
+    mocker.patch('memini.core.sqltrace.USER_SQL_TRACE_PATH', str(path))
+    mocker.patch('memini.core.sqltrace._enabled', False)
+    mocker.patch('memini.core.sqltrace._run', None)
+    mocker.patch('memini.core.sqltrace._command', None)
+    return path
+
+
+def _records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_connect(trace):
+    conn = database.connect(':memory:')
+    assert type(conn) is sqlite3.Connection
+    conn.close()
+    sqltrace.enable('test')
+    conn = database.connect(':memory:')
+    assert isinstance(conn, sqltrace.TracingConnection)
+    assert isinstance(conn.cursor(), sqltrace.TracingCursor)
+    conn.close()
+    sqltrace.disable()
+    assert not sqltrace.enabled()
+
+
+def test_tracing(trace, mocker):
+    mocker.patch('memini.core.sqltrace.SQL_SLOW_MS', 0)
+    sqltrace.enable('test')
+    conn = sqlite3.connect(':memory:', factory=sqltrace.TracingConnection)
+    cursor = conn.cursor()
+    cursor.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, word TEXT);')
+    cursor.executemany('INSERT INTO t (word) VALUES (?);',
+                       (w for w in [('a', ), ('b', ), ('c', )]))
+    cursor.execute('CREATE TABLE log (word TEXT);')
+    cursor.execute('CREATE TRIGGER t_log AFTER UPDATE ON t BEGIN '
+                   'INSERT INTO log VALUES (new.word); END;')
+    cursor.execute('UPDATE t SET word = word || ? WHERE id < 3;', ('!', ))
+    assert [row for row in cursor.execute('SELECT word FROM t;')] \
+        == [('a!', ), ('b!', ), ('c', )]
+    assert cursor.execute('SELECT word FROM t WHERE id=?;', (1, ))\
+        .fetchone() == ('a!', )
+    assert conn.execute('SELECT COUNT(*) FROM log;').fetchall() == [(2, )]
+    conn.commit()
+    records = _records(trace)
+    assert [(r['sql'], r['rows']) for r in records] == [
+        ('CREATE TABLE t (id INTEGER PRIMARY KEY, word TEXT);', 0),
+        ('INSERT INTO t (word) VALUES (?);', 3),
+        ('CREATE TABLE log (word TEXT);', 0),
+        ('CREATE TRIGGER t_log AFTER UPDATE ON t BEGIN '
+         'INSERT INTO log VALUES (new.word); END;', 0),
+        ('UPDATE t SET word = word || ? WHERE id < 3;', 2),
+        ('SELECT word FROM t;', 3),
+        ('SELECT word FROM t WHERE id=?;', 1),
+        ('SELECT COUNT(*) FROM log;', 1),
+        ('COMMIT', 0)]
+    assert all(r['command'] == 'test' for r in records)
+    assert len({r['run'] for r in records}) == 1
+    assert all(r['ms'] >= 0 and r['steps'] >= 0 for r in records)
+    # The trigger's statements are run by the UPDATE statement
+    assert records[4]['statements'] > 1
+    assert records[0]['plan'] is None
+    assert records[5]['plan'] == ['SCAN t']
+    assert records[6]['plan'] == ['SEARCH t USING INTEGER PRIMARY KEY '
+                                  '(rowid=?)']
+    # Statements are only written once
+    conn.execute('SELECT 1;')
+    conn.close()
+    assert [r['sql'] for r in _records(trace)][-2:] \
+        == ['COMMIT', 'SELECT 1;']
+
+
+def test_slow_statements_only_get_a_plan(trace, mocker):
+    mocker.patch('memini.core.sqltrace.SQL_SLOW_MS', 10 ** 6)
+    sqltrace.enable('test')
+    conn = database.connect(':memory:')
+    conn.execute('SELECT 1;')
+    conn.rollback()
+    conn.close()
+    assert [(r['sql'], r['plan']) for r in _records(trace)] \
+        == [('SELECT 1;', None), ('ROLLBACK', None)]
+
+
+def test_normalize():
+    assert sqltrace._normalize("SELECT * FROM table1\n  WHERE id IN "
+                               "(1, 2.5) AND col1='it''s';") \
+        == 'SELECT * FROM table1 WHERE id IN (?, ?) AND col1=?;'
+
+
+def test_summary(trace):
+    trace.parent.mkdir()
+    lines = [
+        {'run': 'r1', 'command': 'show', 'sql': 'SELECT 1;', 'ms': 1,
+         'rows': 1, 'steps': 0, 'plan': None},
+        {'run': 'r2', 'command': 'show', 'sql': 'SELECT 2;', 'ms': 2,
+         'rows': 1, 'steps': 100, 'plan': ['SCAN CONSTANT ROW']},
+        {'run': 'r3', 'command': 'add', 'sql': 'COMMIT', 'ms': 4,
+         'rows': 0, 'steps': 0, 'plan': None},
+        {'run': 'r2', 'command': 'show', 'sql': 'COMMIT', 'ms': 0.5,
+         'rows': 0, 'steps': 0, 'plan': None}]
+    trace.write_text('\n'.join(json.dumps(line) for line in lines)
+                     + '\n{"run": "r4", "comm\n')
+    summary = sqltrace.summary()
+    assert [(c['command'], c['runs'], c['statements'], c['ms'])
+            for c in summary] == [('add', 1, 1, 4), ('show', 2, 3, 3.5)]
+    assert summary[1]['stats'] == [
+        {'sql': 'SELECT ?;', 'calls': 2, 'ms': 3, 'max_ms': 2, 'rows': 2,
+         'steps': 100, 'plan': ['SCAN CONSTANT ROW']},
+        {'sql': 'COMMIT', 'calls': 1, 'ms': 0.5, 'max_ms': 0.5, 'rows': 0,
+         'steps': 0, 'plan': None}]
+    assert [c['command'] for c in sqltrace.summary(command='show')] \
+        == ['show']
+    sqltrace.clear()
+    assert not trace.exists()
+    sqltrace.clear()
+    with pytest.raises(FileNotFoundError):
+        sqltrace.summary()
+
+
+def test_trace_sql_option(trace, mocker, tmp_path):
+    db = tmp_path / 'data.db'
+    shutil.copyfile(TEST_DB_PATH, db)
+    mocker.patch('memini.USER_DB_PATH', str(db))
+    mocker.patch('memini.core.sqltrace.SQL_SLOW_MS', 0)
+    runner = CliRunner()
+    result = runner.invoke(run, ['--trace-sql', 'list', 'tables'])
+    assert result.output == 'table1\ntable2\n'
+    assert not sqltrace.enabled()
+    assert {r['command'] for r in _records(trace)} == {'list'}
+    result = runner.invoke(run, ['debug', 'sql', '--top', '1'])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0].startswith('list: 1 run(s), ')
+    assert lines[1].split('|')[1].strip() == 'statement'
+    assert lines[3].split('|')[1].strip().startswith('SELECT name FROM')
+    assert lines[-2] == '#1 query plan: SCAN main.sqlite_master'
+    result = runner.invoke(run, ['debug', 'sql', '-c', 'show'])
+    assert result.output == 'Error: No SQL statement has been traced for '\
+        'command "show".\n'
+    assert result.exit_code == 1
+    runner.invoke(run, ['debug', 'sql', '--clear'])
+    assert not trace.exists()
+    result = runner.invoke(run, ['debug', 'sql'])
+    assert result.output.startswith('Error: No SQL statement has been '
+                                    'traced yet.')
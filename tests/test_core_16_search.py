@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+# Memini is a simple project that creates vocabulary grids to train.
+# Copyright 2019 Nicolas Hainaux <nh.techn@gmail.com>
+
+# This file is part of Memini.
+
+# Memini is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+
+# Memini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Memini; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import pytest
+
+from memini.core.env import USER_SWEEPSTAKES_PATH
+from memini.core import shared, search, database
+from memini.core.shared import SEARCH_TABLE, TRIGRAM_TABLE
+from memini.core.errors import NoSuchTableError, CommandError
+
+
+def _index(index=SEARCH_TABLE):
+    """Return the whole index, as (table name, row id, cells...) tuples."""
+    return sorted(
+        tuple(c for c in row if c is not None) for row in shared.db.execute(
+            f'SELECT t.name, f.rowid & {search.ROW_MASK}, f.c1, f.c2, f.c3, '
+            f'f.c4 FROM {index} AS f JOIN _memini_fts_tables AS t '
+            f'ON t.id = f.rowid >> {search.ROW_BITS};'))
+
+
+def _rows(name):
+    return sorted((name, ) + row for row in shared.db.execute(
+        f'SELECT {", ".join(database.get_cols(name, include_id=True))} '
+        f'FROM {name};'))
+
+
+def _check_index():
+    rows = sorted(sum([_rows(name) for name in database.list_tables()], []))
+    assert _index() == rows
+    assert _index(TRIGRAM_TABLE) == rows
+
+
+def test_query():
+    assert search._query('amb') == '"amb"*'
+    assert search._query(' candidus,  a "um" ') == '"candidus"* "a"* "um"*'
+    assert search._query('-- ') == ''
+
+
+def test_fold():
+    assert search.fold('Élève, ÆTHER') == 'eleve, æther'
+    assert search.similarity('arrivée', 'ARRIVEE') == 1
+    assert search.similarity('abcd', 'abce') == 0.75
+    assert search.similarity('abc', 'xyz') == 0
+
+
+def test_trigram_query():
+    assert search._trigram_query(search._trigrams('Été')) \
+        == '"ete" OR "été"'
+    assert search._trigram_query(search._trigrams('a"b c')) \
+        == '"""b " OR "a""b" OR "b c"'
+    assert search._trigram_query(search._trigrams('ab')) == ''
+
+
+def test_best_part():
+    assert search._best_part('amicita', 'amicitia,  ae, f.') \
+        == (pytest.approx(14 / 15), 'amicitia')
+    assert search._best_part('ae f', 'amicitia,  ae, f.') \
+        == (pytest.approx(8 / 9), 'ae, f')
+    assert search._best_part('soleil', 'soleil') == (1, 'soleil')
+
+
+def test_search_rows(testdb):
+    assert not search.exists()
+    assert database.search_rows('arrivee') \
+        == [('table1', 1, 'adventus,  us, m.', 'arrivée')]
+    assert search.exists()
+    assert database.list_tables() == ['table1', 'table2']
+    _check_index()
+    assert database.search_rows('SOL') == [('table1', 4, 'sol, solis, m',
+                                            'soleil')]
+    assert database.search_rows('giv don') \
+        == [('table2', 4, 'give', 'gave, given', 'donner')]
+    assert database.search_rows('so mmen') == []
+    assert database.search_rows('') == []
+    # Best matches first
+    assert sorted(row[:2] for row in database.search_rows('b')) \
+        == [('table1', 3), ('table2', 1), ('table2', 2)]
+    assert sorted(row[:2] for row in
+                  database.search_rows('b', tables=['table2'])) \
+        == [('table2', 1), ('table2', 2)]
+    assert len(database.search_rows('b', limit=1)) == 1
+    with pytest.raises(NoSuchTableError):
+        database.search_rows('b', tables=['table3'])
+
+
+def test_index_follows_changes(testdb, fs):
+    fs.create_dir(USER_SWEEPSTAKES_PATH)
+    database.search_rows('eau')
+    database.insert_rows('table1', [('flumen, inis, n', 'fleuve')])
+    database.update_table('table2', 3, ['do', 'did, done', 'fabriquer'])
+    database.remove_rows('table1', '2')
+    database.draw_rows('table2', 2)  # Only changes the timestamps
+    _check_index()
+    assert database.search_rows('fleu') == [('table1', 4, 'flumen, inis, n',
+                                             'fleuve')]
+    assert database.search_rows('fabr')[0][:2] == ('table2', 3)
+    assert database.search_rows('faire') == []
+    database.sort_table('table1', 2)
+    _check_index()
+    database.rename_table('table1', 'latin')
+    database.create_table('table1', ['A', 'B'], content=[('x', 'soleil')])
+    _check_index()
+    assert sorted(row[:2] for row in database.search_rows('soleil')) \
+        == [('latin', 4), ('table1', 1)]
+    database.copy_table('table2', 'table3')
+    database.merge_tables('table3', 'table2')
+    _check_index()
+    database.remove_table('table3')
+    _check_index()
+    assert sorted(database.search_rows('done')) == [
+        ('table2', 3, 'do', 'did, done', 'fabriquer'),
+        ('table2', 7, 'do', 'did, done', 'fabriquer')]
+    # The index may be rebuilt at will
+    database.search_rows('x', rebuild=True)
+    _check_index()
+
+
+def test_index_follows_snapshots(testdb):
+    database.search_rows('eau')
+    database.snapshot_table('table1', 'copy1')
+    database.snapshot_table('table1', 'copy2')
+    _check_index()
+    assert sorted(row[0] for row in database.search_rows('eau')) \
+        == ['copy1', 'copy2', 'table1']
+    database.update_table('copy1', 2, ['aqua, ae, f', 'l\'eau'])
+    database.insert_rows('table1', [('flumen, inis, n', 'fleuve')])
+    _check_index()
+    assert [row[0] for row in database.search_rows('fleuve')] == ['table1']
+    database.snapshot_table('table1', 'copy3')
+    database.remove_table('copy3')
+    database.search_rows('x', rebuild=True)
+    database.snapshot_table('copy2', 'copy4')
+    database.rename_table('copy4', 'copy5')
+    _check_index()
+
+
+def test_no_index_no_triggers(testdb):
+    database.create_table('table3', ['A', 'B'], content=[('x', 'y')])
+    database.rename_table('table3', 'table4')
+    database.remove_table('table4')
+    assert not search.exists()
+    assert shared.db.execute('SELECT COUNT(*) FROM sqlite_master '
+                             'WHERE type = \'trigger\';').fetchone()[0] == 0
+
+
+def test_similar_rows(testdb):
+    assert database.similar_rows('solel') \
+        == [(pytest.approx(10 / 11), 'soleil',
+             'table1', 4, 'sol, solis, m', 'soleil')]
+    assert [row[1:4] for row in database.similar_rows('ARIVEE')] \
+        == [('arrivée', 'table1', 1)]
+    assert [row[1:4] for row in database.similar_rows('broken gave')] \
+        == []
+    assert [row[1:4] for row in database.similar_rows('gave givn')] \
+        == [('gave, given', 'table2', 4)]
+    assert database.similar_rows('solel', tables=['table2']) == []
+    assert database.similar_rows('so') == []
+    database.insert_rows('table2', [('sun', 'sol, solis', 'soleil')])
+    assert sorted(row[2:4] for row in database.similar_rows('solel')) \
+        == [('table1', 4), ('table2', 5)]
+    assert len(database.similar_rows('solel', limit=1)) == 1
+    with pytest.raises(NoSuchTableError):
+        database.similar_rows('solel', tables=['table3'])
+
+
+def test_near_duplicates(testdb):
+    assert database.near_duplicates() == []
+    database.create_table('table3', ['A', 'B'],
+                          content=[('adventus, us, m', 'arrivee'),
+                                   ('brake', 'casser'),
+                                   ('aqua, ae', 'eau')])
+    database.insert_rows('table2', [('begin', 'began, begun', 'commencé')])
+    assert [(round(ratio, 2), row1[:2], row2[:2])
+            for ratio, row1, row2 in database.near_duplicates()] \
+        == [(0.98, ('table2', 1), ('table2', 5)),
+            (0.96, ('table1', 1), ('table3', 1)),
+            (0.88, ('table1', 2), ('table3', 3))]
+    assert [(row1[:2], row2[:2]) for _, row1, row2
+            in database.near_duplicates(tables=['table1', 'table2'])] \
+        == [(('table2', 1), ('table2', 5))]
+    assert shared.db.execute('SELECT COUNT(*) FROM sqlite_temp_master;')\
+        .fetchone()[0] == 0
+
+
+def test_attached_tables_cannot_be_searched(testdb):
+    database.create_table('class5b.verbs', ['infinitive', 'past'],
+                          content=[('be', 'was'), ('eat', 'ate')])
+    assert database.search_rows('eat') == []
+    for search_func in (database.search_rows, database.similar_rows):
+        with pytest.raises(CommandError) as excinfo:
+            search_func('be', tables=['table1', 'class5b.verbs'])
+        assert str(excinfo.value) == 'Tables of attached databases ' \
+            '("class5b.verbs") cannot be searched.'
+    with pytest.raises(CommandError):
+        database.near_duplicates(tables=['class5b.verbs'])